@@ -1,7 +1,6 @@
 # app.py
 
 import os
-import json
 import logging
 import streamlit as st
 import pandas as pd
@@ -11,23 +10,44 @@ from pathlib import Path
 
 # 导入您的模块
 from portfolio.portfolio import Portfolio
-from storage.storage import Storage
+from storage.storage import create_storage
+from storage.signal_store import SignalStore
 from data.data_fetcher import DataFetcher
+from data.universe_store import UniverseStore
 from factories.strategy_factory import StrategyFactory
 from combined_strategy.combined_strategy import CombinedStrategy
-from backtest.backtester import Backtester
+from backtest.panel_backtester import PanelBacktester
+from backtest.event_backtester import EventBacktester
+from backtest.price_panel import PricePanel
+from backtest.result_store import BacktestResult
+from orders import TransactionLog
+from portfolio.equity_curve import EquityCurve
 from utils.logger import setup_logger
-from config.config import STRATEGY_CONFIGS, INITIAL_CASH, PORTFOLIO_FILE, LOG_FILE, BACKTRACE_FILE, TRANSACTION_COST_RATE, SLIPPAGE_RATE
+from utils.metrics import metrics
+from utils.log_reader import LogIndex, LEVELS, tail_lines
+from config.config import STRATEGY_CONFIGS, INITIAL_CASH, LOG_FILE, BACKTRACE_FILE, TRANSACTION_COST_RATE, SLIPPAGE_RATE, SHARED_PRICE_STORE_NAME, METRICS_PROMETHEUS_FILE, METRICS_JSONL_FILE, SYMBOL_UNIVERSE
 import config.config as config
 
 # 导入价格时序管理器
 from price_time_series_manager import PriceTimeSeriesManager
+from shared_price_store import SharedPriceStore
 
 # 设置日志
 setup_logger()
 
+@st.cache_resource(show_spinner=False)
+def shared_price_store():
+    # 挂载失败时抛出异常，cache_resource 不缓存异常，下次重跑时会再次尝试挂载
+    return SharedPriceStore.attach(SHARED_PRICE_STORE_NAME)
+
 # 初始化 PriceTimeSeriesManager
 price_manager = PriceTimeSeriesManager()
+if price_manager.shared_store is None:
+    # 行情进程已创建共享价格存储时只读挂载，否则使用进程内的价格时序
+    try:
+        price_manager.use_shared_store(shared_price_store())
+    except FileNotFoundError:
+        pass
 
 # 初始化 Session State
 if 'signals' not in st.session_state:
@@ -48,9 +68,40 @@ def all_stock_data(start_date, end_date):
     data_fetcher_instance = data_fetcher()
     return data_fetcher_instance.fetch_all_data(start_date=start_date, end_date=end_date)
 
+@st.cache_resource(show_spinner=False)
+def log_index():
+    return LogIndex(LOG_FILE)
+
+@st.cache_resource(show_spinner=False)
+def portfolio_equity_curve():
+    return EquityCurve(INITIAL_CASH)
+
+@st.cache_resource(ttl=3600*12, show_spinner=False)
+def valuation_panel(symbols: tuple, start_date: str, end_date: str):
+    # 估值使用不复权收盘价，与成交价可比
+    data = {}
+    for symbol in symbols:
+        try:
+            df = data_fetcher().cache.get(symbol, start_date, end_date, '')
+        except Exception as e:
+            logging.warning(f"获取股票 {symbol} 的估值价格失败：{e}")
+            continue
+        if df is not None and not df.empty:
+            data[symbol] = df
+    return PricePanel(data)
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def backtest_result(path: str, mtime: float):
+    # 以修改时间作为缓存键，重新回测后自动读取新结果
+    return BacktestResult.load(path)
+
+@st.cache_resource(show_spinner=False)
+def signal_store():
+    return SignalStore()
+
 @st.cache_resource(show_spinner=False)
 def portfolio_instance():
-    storage = Storage(filepath=PORTFOLIO_FILE)
+    storage = create_storage()
     portfolio = Portfolio(initial_cash=INITIAL_CASH, storage=storage, data_fetcher=data_fetcher(), simulate_costs=False)
     return portfolio
 
@@ -69,20 +120,26 @@ def perform_live_trading():
     # 创建占位符用于显示状态信息
     status_placeholder = st.empty()
     progress_bar = st.progress(0)
+    # 记录每个步骤的耗时，显示在设置页的性能诊断中
+    steps = metrics.stages('live.step')
 
     try:
         # 步骤 1: 获取数据
         status_placeholder.text("步骤 1/6: 获取所有股票数据...")
+        steps.start('1_fetch_data')
         data = all_stock_data(start_date="20220101", end_date=datetime.now().strftime("%Y%m%d"))
         st.info(f"获取到 {len(data)} 只股票的数据。")
         progress_bar.progress(16)
 
         # 步骤 2: 获取最新价格并更新 price_time_series
         status_placeholder.text("步骤 2/6: 更新最新价格...")
+        steps.start('2_update_prices')
+        current_prices = portfolio.data_fetcher.fetch_current_prices(list(data.keys()))
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if price_manager.writable:
+            price_manager.add_prices(timestamp, current_prices)
         for symbol in data.keys():
-            current_price = portfolio.data_fetcher.fetch_current_price(symbol)
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            price_manager.add_price(symbol, timestamp, current_price)
+            current_price = current_prices[symbol]
             portfolio.latest_prices[symbol] = current_price
             # 收集用于可视化的价格历史
             if symbol in portfolio.holdings:
@@ -113,6 +170,7 @@ def perform_live_trading():
 
         # 步骤 3: 初始化策略
         status_placeholder.text("步骤 3/6: 初始化组合策略...")
+        steps.start('3_init_strategies')
         strategies = [
             StrategyFactory.get_strategy(cfg['name'], weight=cfg.get('weight', 1.0), **cfg['params']) for cfg in STRATEGY_CONFIGS
         ]
@@ -124,7 +182,8 @@ def perform_live_trading():
 
         # 步骤 4: 生成交易信号
         status_placeholder.text("步骤 4/6: 生成交易信号...")
-        buy_trades, sell_trades = combined_strategy.decide_trade(data, portfolio, price_manager.get_all_series())
+        steps.start('4_decide_trade')
+        buy_trades, sell_trades = combined_strategy.decide_trade_vectorized(data, portfolio, price_manager.get_all_series())
         progress_bar.progress(66)
         st.session_state.log_messages.append(
             f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 交易信号生成完成，买入信号数量: {len(buy_trades)}, 卖出信号数量: {len(sell_trades)}。"
@@ -132,22 +191,23 @@ def perform_live_trading():
 
         # 步骤 5: 处理交易信号
         status_placeholder.text("步骤 5/6: 处理交易信号...")
+        steps.start('5_queue_signals')
         # 添加买入信号
         for trade in buy_trades:
             st.session_state.signals.append({
                 'type': 'buy',
-                'symbol': trade['symbol'],
-                'price': trade['price'],
-                'quantity': trade['quantity'],
+                'symbol': trade.symbol,
+                'price': trade.price,
+                'quantity': trade.quantity,
                 'time': datetime.now()
             })
         # 添加卖出信号
         for trade in sell_trades:
             st.session_state.signals.append({
                 'type': 'sell',
-                'symbol': trade['symbol'],
-                'price': trade['price'],
-                'quantity': trade['quantity'],
+                'symbol': trade.symbol,
+                'price': trade.price,
+                'quantity': trade.quantity,
                 'time': datetime.now()
             })
         progress_bar.progress(83)
@@ -156,7 +216,9 @@ def perform_live_trading():
         )
 
         # 步骤 6: 完成
+        steps.finish()
         status_placeholder.text("步骤 6/6: 实时交易完成。")
+        metrics.inc('live.runs', result='success')
         progress_bar.progress(100)
         st.session_state.log_messages.append(
             f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 实时交易完成。"
@@ -164,14 +226,21 @@ def perform_live_trading():
 
     except Exception as e:
         logging.error(f"实时交易过程中发生错误: {e}")
+        metrics.inc('live.runs', result='error')
         st.session_state.log_messages.append(
             f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 实时交易过程中发生错误: {e}"
         )
         status_placeholder.text("实时交易过程中发生错误。")
         progress_bar.empty()
     finally:
+        steps.finish()
         # 移除已有的占位符
         status_placeholder.empty()
+        if metrics.enabled:
+            try:
+                metrics.export_prometheus(METRICS_PROMETHEUS_FILE)
+            except OSError as e:
+                logging.warning(f"性能统计导出失败: {e}")
 
 # 投资组合页面
 with tab1:
@@ -184,10 +253,9 @@ with tab1:
         f = open(LOG_FILE, "a")
         f.truncate(0)
         f.close()
+        # 通过存储重置持仓，快照、日志和交易记录一并清空
         portfolio.reset_portfolio()
 
-        if os.path.exists(PORTFOLIO_FILE):
-            os.remove(PORTFOLIO_FILE)
         if os.path.exists(BACKTRACE_FILE):
             os.remove(BACKTRACE_FILE)
         st.rerun()
@@ -221,30 +289,40 @@ with tab1:
 
     # 显示详细交易记录
     st.subheader("交易记录")
-    transactions = portfolio.transactions
-    if transactions:
-        transactions_df = pd.DataFrame(transactions)
-        transactions_df['time'] = pd.to_datetime(transactions_df['time'])
-        transactions_df = transactions_df.sort_values(by='time', ascending=False)
-        st.dataframe(transactions_df)
+    # 只统计条数，不读取全部交易记录
+    n_transactions = portfolio.count_transactions()
+    if n_transactions:
+        col1, col2 = st.columns(2)
+        with col1:
+            symbol_filter = st.text_input("按股票代码筛选", value="", key="transaction_symbol_filter").strip()
+        with col2:
+            page_size = st.selectbox("显示条数", [100, 500, 1000], key="transaction_page_size")
+        # 只查询需要显示的最近交易记录
+        recent_transactions = portfolio.query_transactions(symbol=symbol_filter or None, limit=page_size)
+        if recent_transactions:
+            recent_df = pd.DataFrame(recent_transactions)
+            recent_df['time'] = pd.to_datetime(recent_df['time'])
+            st.dataframe(recent_df)
+        else:
+            st.write("没有符合条件的交易记录")
     else:
         st.write("暂无交易记录")
 
     # 可视化投资组合价值变化
     st.subheader("投资组合价值变化")
-    if not transactions:
+    if not n_transactions:
         st.write("暂无交易记录，无法绘制投资组合价值变化。")
     else:
-        transactions_df = transactions_df.sort_values(by='time')
-        transactions_df['portfolio_value'] = portfolio.initial_cash
-        for idx, row in transactions_df.iterrows():
-            if row['type'] == 'buy':
-                transactions_df.at[idx, 'portfolio_value'] -= row['price'] * row['quantity']
-            elif row['type'] == 'sell':
-                transactions_df.at[idx, 'portfolio_value'] += row['price'] * row['quantity']
+        transactions = portfolio.transactions
+        equity = portfolio_equity_curve()
+        equity.initial_cash = portfolio.initial_cash
+        records = transactions.records
+        start_date = pd.Timestamp(int(records['time'].min()), unit='s').strftime("%Y%m%d")
+        panel = valuation_panel(tuple(transactions.symbols), start_date, datetime.now().strftime("%Y%m%d"))
+        curve = equity.update(transactions, panel, latest_prices=portfolio.latest_prices)
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=transactions_df['time'], y=transactions_df['portfolio_value'],
-                                 mode='lines+markers', name='Portfolio Value'))
+        fig.add_trace(go.Scatter(x=curve.index, y=curve['total_value'], mode='lines', name='Portfolio Value'))
+        fig.add_trace(go.Scatter(x=curve.index, y=curve['cash'], mode='lines', name='Cash', line=dict(dash='dash')))
         st.plotly_chart(fig)
 
     # 新增部分：当前持仓收益可视化
@@ -275,10 +353,31 @@ with tab2:
     st.header("交易日志")
     log_file_path = Path(LOG_FILE)
     if log_file_path.exists():
-        with open(log_file_path, 'r', encoding='utf-8') as f:
-            logs = f.readlines()
-        # 显示最新的100条日志
-        recent_logs = logs[-100:]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            log_limit = st.selectbox("显示条数", [100, 500, 1000], key="log_limit")
+        with col2:
+            log_levels = st.multiselect("级别", list(LEVELS), key="log_levels")
+        with col3:
+            log_symbol = st.text_input("股票代码", value="", key="log_symbol").strip()
+        filter_by_date = st.checkbox("按日期筛选", key="log_filter_by_date")
+        log_start = log_end = None
+        if filter_by_date:
+            col1, col2 = st.columns(2)
+            with col1:
+                log_start = datetime.combine(st.date_input("开始日期", datetime.now(), key="log_start"), datetime.min.time())
+            with col2:
+                log_end = datetime.combine(st.date_input("结束日期", datetime.now(), key="log_end"), datetime.max.time())
+
+        if log_levels or log_symbol or filter_by_date:
+            # 有筛选条件时走偏移索引，只解析上次之后新增的日志
+            index = log_index()
+            index.update()
+            recent_logs = index.query(levels=log_levels or None, symbol=log_symbol or None,
+                                      start_time=log_start, end_time=log_end, limit=log_limit)
+        else:
+            # 只从文件末尾向前读取需要的行
+            recent_logs = tail_lines(str(log_file_path), log_limit)
         st.text_area("日志", ''.join(recent_logs), height=600)
     else:
         st.write("日志文件不存在。")
@@ -288,7 +387,19 @@ with tab3:
     st.header("实时交易")
     subtabs = st.tabs(["操作界面", "可视化界面"])
     with subtabs[0]:
-        if st.button("计算交易信号"):
+        # 后台服务（daemon.py）发布了新一批信号时，替换待处理信号队列
+        published = signal_store().read()
+        if published:
+            if published.get('run_id') != st.session_state.get('signal_run_id'):
+                st.session_state.signal_run_id = published.get('run_id')
+                st.session_state.signals = [
+                    dict(s, time=datetime.strptime(s['time'], "%Y-%m-%d %H:%M:%S")) for s in published.get('signals', [])
+                ]
+            st.caption(f"后台服务于 {published.get('generated_at')} 发布了第 {published.get('run_id')} 轮信号，"
+                       f"耗时 {published.get('duration', 0.0):.2f} 秒。")
+            if published.get('status') == 'error':
+                st.warning(f"后台服务最近一次运行失败（{published.get('failed_at')}）：{published.get('error')}")
+        if st.button("立即计算交易信号"):
             st.session_state.signals = []  # 清空之前的信号
             st.session_state.log_messages = []  # 清空之前的日志
             perform_live_trading()
@@ -417,6 +528,23 @@ with tab3:
         else:
             st.write("暂无价格更新记录。")
 
+@st.cache_resource(show_spinner=False)
+def universe_store_handle():
+    return UniverseStore(readonly=True)
+
+
+def universe_store() -> UniverseStore:
+    # 后台服务可能已写入新的日期，每次使用前重新读取索引
+    store = universe_store_handle()
+    store.reload()
+    return store
+
+# 回测可选的 bar 周期
+BAR_SIZE_LABELS = {'daily': '日线', 'weekly': '周线', 'monthly': '月线', '60': '60 分钟', '30': '30 分钟',
+                   '15': '15 分钟', '5': '5 分钟', '1': '1 分钟'}
+# 回测引擎：面板引擎在信号所在 bar 的收盘价成交，事件驱动引擎在该股票下一根 bar 的开盘价成交
+ENGINE_LABELS = {'panel': '面板（当根收盘成交）', 'event': '事件驱动（下一根开盘成交）'}
+
 # 回测页面
 with tab4:
     st.header("策略回测")
@@ -428,40 +556,79 @@ with tab4:
         start_date = st.date_input("开始日期", datetime(2022, 1, 1))
     with col2:
         end_date = st.date_input("结束日期", datetime.now())
+    # 分钟周期由本地积累的 1 分钟 bar 重采样，只覆盖开始积累之后的交易日
+    bar_size = st.selectbox("Bar 周期", list(BAR_SIZE_LABELS), format_func=BAR_SIZE_LABELS.get)
+    engine = st.selectbox("回测引擎", list(ENGINE_LABELS), format_func=ENGINE_LABELS.get)
 
+    # 全市场日线回测直接读取后台服务维护的全市场存储，不逐只下载
+    use_universe = SYMBOL_UNIVERSE == 'all' and bar_size == 'daily'
     if st.button("运行回测"):
-        with st.spinner("运行回测..."):
-            data_fetcher_instance = DataFetcher(
-                start_date=start_date.strftime("%Y%m%d"),
-                end_date=end_date.strftime("%Y%m%d")
-            )
-            data = data_fetcher_instance.fetch_all_data(start_date=start_date.strftime("%Y%m%d"), end_date=end_date.strftime("%Y%m%d"))
-
-            strategies = [
-                StrategyFactory.get_strategy(cfg['name'], weight=cfg.get('weight', 1.0), **cfg['params']) for cfg in STRATEGY_CONFIGS
-            ]
-            combined_strategy = CombinedStrategy(strategies)  # 不限制 top_n
-
-            backtester = Backtester(combined_strategy, data)
-            results = backtester.run_backtest()
-        st.success(f"回测完成，收益: {results['total_return']*100:.2f}%")
-        st.write("回测结果:", results)
-        st.rerun()
-
-    # 显示最新回测结果
+        if use_universe and len(universe_store()) == 0:
+            st.error("全市场存储为空，请先运行后台服务（python daemon.py）写入历史行情。")
+        else:
+            with st.spinner("运行回测..."):
+                strategies = [
+                    StrategyFactory.get_strategy(cfg['name'], weight=cfg.get('weight', 1.0), bar_size=bar_size, **cfg['params'])
+                    for cfg in STRATEGY_CONFIGS
+                ]
+                combined_strategy = CombinedStrategy(strategies)  # 不限制 top_n
+
+                if use_universe:
+                    engine_class = EventBacktester if engine == 'event' else PanelBacktester
+                    backtester = engine_class.from_universe(combined_strategy, universe_store(),
+                                                            start_date=start_date.strftime("%Y%m%d"),
+                                                            end_date=end_date.strftime("%Y%m%d"))
+                else:
+                    data_fetcher_instance = DataFetcher(
+                        start_date=start_date.strftime("%Y%m%d"),
+                        end_date=end_date.strftime("%Y%m%d"),
+                        period=bar_size
+                    )
+                    data = data_fetcher_instance.fetch_all_data(start_date=start_date.strftime("%Y%m%d"), end_date=end_date.strftime("%Y%m%d"))
+                    if engine == 'event':
+                        backtester = EventBacktester(combined_strategy, data, bar_size=bar_size)
+                    else:
+                        # 股票数不设上限，使用横截面批量决策
+                        backtester = PanelBacktester(combined_strategy, data, bar_size=bar_size, vectorized=True)
+                results = backtester.run_backtest()
+            st.success(f"回测完成，收益: {results['total_return']*100:.2f}%")
+            st.write("回测结果:", results)
+            st.rerun()
+
+    # 显示最新回测结果：构造时只读摘要头，净值、盈亏和成交记录按需解出
     st.subheader("最新回测结果")
-    backtest_result_path = Path(BACKTRACE_FILE)
-    if backtest_result_path.exists():
-        with open(backtest_result_path, 'r') as f:
-            backtest_results = json.load(f)
-        st.write(f"**初始资金**: ￥{backtest_results['initial_cash']:,.2f}")
-        st.write(f"**最终组合价值**: ￥{backtest_results['final_portfolio_value']:,.2f}")
-        st.write(f"**总收益**: {backtest_results['total_return']*100:.2f}%")
+    result = backtest_result(BACKTRACE_FILE, os.path.getmtime(BACKTRACE_FILE)) if os.path.exists(BACKTRACE_FILE) else None
+    if result is not None:
+        summary = result.summary
+        st.write(f"**初始资金**: ￥{summary['initial_cash']:,.2f}")
+        st.write(f"**最终组合价值**: ￥{summary['final_portfolio_value']:,.2f}")
+        st.write(f"**Bar 周期**: {BAR_SIZE_LABELS.get(summary.get('bar_size', 'daily'))}")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("总收益", f"{summary['total_return']*100:.2f}%")
+        col1.metric("年化收益", f"{summary['annual_return']*100:.2f}%")
+        col2.metric("夏普比率", f"{summary['sharpe']:.2f}")
+        col2.metric("最大回撤", f"{summary['max_drawdown']*100:.2f}%")
+        col3.metric("年化换手率", f"{summary['annual_turnover']:.2f}")
+        col3.metric("胜率", f"{summary['win_rate']*100:.2f}%")
+        if summary.get('max_drawdown_start'):
+            st.write(f"**最大回撤区间**: {summary['max_drawdown_start']} 至 {summary['max_drawdown_end']}")
+
+        st.subheader("回测净值")
+        equity_df = result.equity
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=equity_df.index, y=equity_df['total_value'], mode='lines', name='Portfolio Value'))
+        fig.add_trace(go.Scatter(x=equity_df.index, y=equity_df['cash'], mode='lines', name='Cash', line=dict(dash='dash')))
+        st.plotly_chart(fig)
+
+        st.subheader("分股票盈亏")
+        st.dataframe(result.symbol_pnl)
+
         st.subheader("回测交易记录")
-        transactions_df = pd.DataFrame(backtest_results['transactions'])
-        transactions_df['time'] = pd.to_datetime(transactions_df['time'])
-        transactions_df = transactions_df.sort_values(by='time', ascending=False)
-        st.dataframe(transactions_df)
+        st.write(f"共 {summary['num_fills']} 笔成交")
+        page_size = st.selectbox("显示最近条数", [100, 500, 1000], key="backtest_page_size")
+        fills = result.fills
+        transactions_df = TransactionLog.from_records(fills.records[-page_size:], fills.symbols).to_frame()
+        st.dataframe(transactions_df.iloc[::-1])
     else:
         st.write("暂无回测结果。")
 
@@ -485,4 +652,43 @@ with tab5:
         portfolio.save_portfolio()
         config.INITIAL_CASH = new_initial_cash
         st.success(f"初始现金已更新为 ￥{new_initial_cash:,.2f}")
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+
+    # 性能诊断
+    st.subheader("性能诊断")
+    metrics.enabled = st.checkbox("启用性能统计", value=metrics.enabled, key="metrics_enabled")
+    metric_records = metrics.snapshot()
+    span_records = [r for r in metric_records if r['type'] == 'span']
+    counter_records = [r for r in metric_records if r['type'] == 'counter']
+    if span_records:
+        span_df = pd.DataFrame([{
+            '名称': r['name'],
+            '标签': ', '.join(f"{k}={v}" for k, v in r['labels'].items()),
+            '次数': r['count'],
+            '总耗时(秒)': r['total'],
+            '平均耗时(毫秒)': r['mean'] * 1000,
+            '最长耗时(毫秒)': r['max'] * 1000,
+        } for r in span_records]).sort_values(by='总耗时(秒)', ascending=False)
+        st.dataframe(span_df, hide_index=True)
+    else:
+        st.write("暂无耗时统计，运行一次实时交易或回测后查看。")
+    if counter_records:
+        st.dataframe(pd.DataFrame([{
+            '名称': r['name'],
+            '标签': ', '.join(f"{k}={v}" for k, v in r['labels'].items()),
+            '计数': r['value'],
+        } for r in counter_records]), hide_index=True)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("导出 Prometheus"):
+            metrics.export_prometheus(METRICS_PROMETHEUS_FILE)
+            st.success(f"已导出到 {METRICS_PROMETHEUS_FILE}")
+    with col2:
+        if st.button("追加到 JSONL"):
+            metrics.export_jsonl(METRICS_JSONL_FILE)
+            st.success(f"已追加到 {METRICS_JSONL_FILE}")
+    with col3:
+        if st.button("清空统计"):
+            metrics.reset()
+            st.rerun()
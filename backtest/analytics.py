@@ -0,0 +1,171 @@
+# backtest/analytics.py
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Mapping, Tuple
+from orders import BUY, SELL, TransactionLog
+from config.config import TRADING_DAYS_PER_YEAR, RISK_FREE_RATE
+
+
+def fifo_realized_pnl(fills: TransactionLog) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按先进先出计算每笔卖出的已实现盈亏。
+
+    把每只股票的买入按时间顺序看作一条“累计数量 → 累计成本”的分段线性曲线，
+    卖出消耗的成本就是该曲线在卖出前后累计卖出数量处的差值，全部股票拼接在同一条数轴上，
+    用一次 np.interp 完成，不需要逐笔维护买入批次。成本和收入都使用含交易成本的金额。
+
+    :param fills: 成交记录
+    :return: (每笔成交的已实现盈亏，买入为 NaN；每笔卖出消耗的买入成本，买入为 0)
+    """
+    records = fills.records
+    n = len(records)
+    pnl = np.full(n, np.nan)
+    consumed = np.zeros(n)
+    if n == 0:
+        return pnl, consumed
+
+    order = np.lexsort((records['time'], records['symbol']))
+    sides = records['side'][order]
+    symbols = records['symbol'][order]
+    quantities = records['quantity'][order]
+    amounts = records['amount'][order]
+    is_buy = sides == BUY
+    is_sell = sides == SELL
+
+    # 每只股票在公共数轴上的起点：之前所有股票的买入总量
+    n_symbols = int(symbols.max()) + 1
+    bought = np.bincount(symbols[is_buy], weights=quantities[is_buy], minlength=n_symbols)
+    offsets = np.concatenate([[0.0], np.cumsum(bought)[:-1]])
+
+    buy_quantity = np.cumsum(quantities[is_buy])
+    buy_cost = np.cumsum(amounts[is_buy])
+    knots_x = np.concatenate([[0.0], buy_quantity])
+    knots_y = np.concatenate([[0.0], buy_cost])
+
+    # 股票内的累计卖出数量；lexsort 后同一股票的记录连续
+    sell_quantity = np.where(is_sell, quantities, 0)
+    cumulative = np.cumsum(sell_quantity)
+    first = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+    group_start = np.repeat(cumulative[first] - sell_quantity[first], np.diff(np.r_[first, n]))
+    sold_after = cumulative - group_start + offsets[symbols]
+    sold_before = sold_after - sell_quantity
+
+    cost = np.interp(sold_after, knots_x, knots_y) - np.interp(sold_before, knots_x, knots_y)
+    cost = np.where(is_sell, cost, 0.0)
+    consumed[order] = cost
+    pnl[order] = np.where(is_sell, amounts - cost, np.nan)
+    return pnl, consumed
+
+
+def symbol_pnl(fills: TransactionLog, last_prices: Mapping[str, float]) -> pd.DataFrame:
+    """
+    按股票汇总盈亏。
+
+    :param fills: 成交记录
+    :param last_prices: 每只股票的最后价格，用于计算未平仓部分的浮动盈亏
+    :return: 以股票代码为索引的 DataFrame，列为 trades、bought、sold、position、realized_pnl、unrealized_pnl、total_pnl
+    """
+    columns = ['trades', 'bought', 'sold', 'position', 'realized_pnl', 'unrealized_pnl', 'total_pnl']
+    records = fills.records
+    if len(records) == 0:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name='symbol'), dtype=float)
+
+    n_symbols = len(fills.symbols)
+    symbols = records['symbol']
+    is_buy = records['side'] == BUY
+    realized, consumed = fifo_realized_pnl(fills)
+
+    def per_symbol(weights, mask=None):
+        if mask is None:
+            return np.bincount(symbols, weights=weights, minlength=n_symbols)
+        return np.bincount(symbols[mask], weights=weights[mask], minlength=n_symbols)
+
+    bought = per_symbol(records['amount'], is_buy)
+    sold = per_symbol(records['amount'], ~is_buy)
+    position = per_symbol(records['side'] * records['quantity']).round().astype(np.int64)
+    realized_pnl = per_symbol(np.nan_to_num(realized), ~is_buy)
+    open_cost = bought - per_symbol(consumed, ~is_buy)
+    prices = np.array([last_prices.get(symbol, np.nan) for symbol in fills.symbols], dtype=np.float64)
+    market_value = np.where(position != 0, position * np.nan_to_num(prices), 0.0)
+    unrealized_pnl = np.where(position != 0, market_value - open_cost, 0.0)
+
+    frame = pd.DataFrame({
+        'trades': np.bincount(symbols, minlength=n_symbols),
+        'bought': bought,
+        'sold': sold,
+        'position': position,
+        'realized_pnl': realized_pnl,
+        'unrealized_pnl': unrealized_pnl,
+        'total_pnl': realized_pnl + unrealized_pnl,
+    }, index=pd.Index(fills.symbols, name='symbol'))
+    return frame[frame['trades'] > 0].sort_values(by='total_pnl', ascending=False)
+
+
+def _format_time(time: pd.Timestamp) -> str:
+    """日线净值只显示日期，分钟 bar 的净值显示到分钟"""
+    return str(time.date()) if time == time.normalize() else time.strftime("%Y-%m-%d %H:%M")
+
+
+def analyze(equity: pd.DataFrame, fills: TransactionLog, initial_cash: float,
+            periods_per_year: float = TRADING_DAYS_PER_YEAR) -> Dict[str, float]:
+    """
+    根据每日净值和成交记录计算回测统计指标。
+
+    :param equity: 以日期为索引、包含 total_value 列的每日净值
+    :param fills: 成交记录
+    :param initial_cash: 初始资金
+    :param periods_per_year: 每年的净值记录数，日线为 TRADING_DAYS_PER_YEAR，分钟 bar 回测时按 bar 数计
+    :return: 包含 total_return、annual_return、annual_volatility、sharpe、max_drawdown、
+             max_drawdown_start、max_drawdown_end、turnover、annual_turnover、num_trades、
+             num_closed_trades、win_rate 的字典
+    """
+    values = equity['total_value'].to_numpy(dtype=np.float64)
+    n_days = len(values)
+    final_value = float(values[-1]) if n_days else float(initial_cash)
+    total_return = (final_value - initial_cash) / initial_cash
+
+    # 日收益率，第一天相对初始资金
+    returns = np.diff(values, prepend=initial_cash) / np.concatenate([[initial_cash], values[:-1]]) if n_days else np.zeros(0)
+    years = n_days / periods_per_year
+    annual_return = (final_value / initial_cash) ** (1 / years) - 1 if years > 0 and final_value > 0 else 0.0
+    volatility = float(returns.std(ddof=1)) if n_days > 1 else 0.0
+    excess = returns - RISK_FREE_RATE / periods_per_year
+    sharpe = float(excess.mean() / volatility * np.sqrt(periods_per_year)) if volatility > 0 else 0.0
+
+    # 最大回撤及其起止日期
+    max_drawdown, drawdown_start, drawdown_end = 0.0, None, None
+    if n_days:
+        peaks = np.maximum.accumulate(np.maximum(values, initial_cash))
+        drawdowns = values / peaks - 1
+        trough = int(np.argmin(drawdowns))
+        max_drawdown = float(drawdowns[trough])
+        if max_drawdown < 0:
+            # 峰值可能是初始资金，此时回撤从第一天算起
+            at_peak = np.flatnonzero(values[:trough + 1] >= peaks[trough])
+            peak = int(at_peak[-1]) if len(at_peak) else 0
+            drawdown_start = _format_time(equity.index[peak])
+            drawdown_end = _format_time(equity.index[trough])
+
+    records = fills.records
+    traded = float(records['amount'].sum())
+    average_value = float(values.mean()) if n_days else float(initial_cash)
+    turnover = traded / average_value if average_value > 0 else 0.0
+    realized, _ = fifo_realized_pnl(fills)
+    closed = realized[~np.isnan(realized)]
+
+    return {
+        'total_return': total_return,
+        'final_portfolio_value': final_value,
+        'annual_return': float(annual_return),
+        'annual_volatility': volatility * np.sqrt(periods_per_year),
+        'sharpe': sharpe,
+        'max_drawdown': max_drawdown,
+        'max_drawdown_start': drawdown_start,
+        'max_drawdown_end': drawdown_end,
+        'turnover': turnover,
+        'annual_turnover': turnover / years if years > 0 else 0.0,
+        'num_trades': len(records),
+        'num_closed_trades': len(closed),
+        'win_rate': float((closed > 0).mean()) if len(closed) else 0.0,
+    }
@@ -1,26 +1,39 @@
 # backtest/backtester.py
 
-import os
-import json
 import logging
 import pandas as pd
-from typing import Dict
-from portfolio.portfolio import Portfolio
+from typing import Dict, Optional
+from backtest.ledger import BacktestLedger
+from backtest.analytics import analyze, symbol_pnl
+from backtest.result_store import save_result
+from data.minute_bars import resample_data, bars_per_year, is_intraday
 from combined_strategy.combined_strategy import CombinedStrategy
 from price_time_series_manager import PriceTimeSeriesManager
 from datetime import datetime
 from config.config import BACKTRACE_FILE
 import config.config as config
+from utils.metrics import metrics
 
 class Backtester:
-    def __init__(self, strategy: CombinedStrategy, data: Dict[str, pd.DataFrame]):
+    def __init__(self, strategy: CombinedStrategy, data: Dict[str, pd.DataFrame], bar_size: Optional[str] = None):
+        """
+        :param strategy: 组合策略
+        :param data: 所有股票的数据字典，周期不能粗于 bar_size
+        :param bar_size: 回测的 bar 周期，默认使用策略的 bar 周期，data 会先重采样为该周期
+        """
         self.strategy = strategy
-        self.data = data
+        self.bar_size = bar_size or strategy.bar_size
+        self.data = resample_data(data, self.bar_size)
         self.results = {}
-        self.price_manager = PriceTimeSeriesManager()  # 初始化管理器
+        self.equity: Optional[pd.DataFrame] = None
+        # 使用独立的价格管理器，不与实盘或共享存储中的价格时序互相影响
+        self.price_manager = PriceTimeSeriesManager.create_local()
 
     def run_backtest(self):
-        portfolio = Portfolio(initial_cash=config.INITIAL_CASH, data_fetcher=None, simulate_costs=True)  # 启用交易成本模拟
+        if is_intraday(self.bar_size):
+            raise ValueError("逐日回测只支持日线及以上周期，分钟 bar 请使用 PanelBacktester")
+        # 回测使用内存账本，不读写实盘持仓文件
+        portfolio = BacktestLedger(list(self.data.keys()), initial_cash=config.INITIAL_CASH, simulate_costs=True)  # 启用交易成本模拟
 
         # 获取所有交易日期的排序列表
         all_dates = set()
@@ -28,10 +41,12 @@ class Backtester:
             all_dates.update(df['date'].dt.date)
         all_dates = sorted(list(all_dates))
 
+        phases = metrics.stages('backtest.phase')
         for current_date in all_dates:
             logging.info(f"回测日期: {current_date}")
 
             # 更新每只股票在当前日期的收盘价
+            phases.start('price_update')
             for symbol, df in self.data.items():
                 day_data = df[df['date'].dt.date == current_date]
                 if not day_data.empty:
@@ -57,34 +72,47 @@ class Backtester:
             current_price_series = self.price_manager.get_all_series()
 
             # 决定当天的买卖操作
+            phases.start('decide')
             trades_buy, trades_sell = self.strategy.decide_trade(self.data, portfolio, current_price_series)
 
             # 模拟买入
+            phases.start('execute')
             for trade in trades_buy:
-                price = trade['price']
-                quantity = trade['quantity']
-                portfolio.buy_stock(trade['symbol'], price, quantity, current_date.strftime("%Y-%m-%d %H:%M:%S"))
+                price = trade.price
+                quantity = trade.quantity
+                portfolio.buy_stock(trade.symbol, price, quantity, current_date.strftime("%Y-%m-%d %H:%M:%S"))
 
             # 模拟卖出
             for trade in trades_sell:
-                price = trade['price']
-                quantity = trade['quantity']
-                portfolio.sell_stock(trade['symbol'], price, quantity, current_date.strftime("%Y-%m-%d %H:%M:%S"))
+                price = trade.price
+                quantity = trade.quantity
+                portfolio.sell_stock(trade.symbol, price, quantity, current_date.strftime("%Y-%m-%d %H:%M:%S"))
+            portfolio.mark_to_market(current_date.strftime("%Y-%m-%d %H:%M:%S"))
+            phases.finish()
 
-        total_return = (portfolio.get_portfolio_value() - portfolio.initial_cash) / portfolio.initial_cash
-        logging.info(f"回测总收益: {total_return * 100:.2f}%")
-        self.results = {'total_return': total_return}
+        with metrics.span('backtest.phase', stage='finalize'):
+            return self._finalize(portfolio)
+
+    def _finalize(self, portfolio: BacktestLedger, save: bool = True) -> Dict:
+        """
+        根据净值计算统计指标并保存详细回测结果，年化按 bar 周期折算。
+
+        :param portfolio: 回测结束时的投资组合
+        :param save: 是否写入回测结果文件
+        :return: 回测结果字典，包含 total_return、sharpe、max_drawdown、turnover、win_rate 等指标
+        """
+        self.equity = portfolio.equity_frame()
+        self.results = analyze(self.equity, portfolio.fills, portfolio.initial_cash, bars_per_year(self.bar_size))
+        logging.info(f"回测总收益: {self.results['total_return'] * 100:.2f}%，夏普比率: {self.results['sharpe']:.2f}，"
+                     f"最大回撤: {self.results['max_drawdown'] * 100:.2f}%")
+        if not save:
+            return self.results
 
         # 保存详细结果
-        backtest_result = {
-            'total_return': total_return,
-            'initial_cash': portfolio.initial_cash,
-            'final_portfolio_value': portfolio.get_portfolio_value(),
-            'transactions': portfolio.transactions
-        }
-        backtest_result_path = BACKTRACE_FILE
-        with open(backtest_result_path, 'w') as f:
-            json.dump(backtest_result, f, indent=4)
+        pnl = symbol_pnl(portfolio.fills, portfolio.latest_prices)
+        summary = dict(self.results, initial_cash=portfolio.initial_cash, bar_size=self.bar_size,
+                       created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        save_result(BACKTRACE_FILE, summary, self.equity, portfolio.fills, pnl)
         logging.info("回测结果已保存。")
 
-        return self.results
\ No newline at end of file
+        return self.results
@@ -0,0 +1,348 @@
+# backtest/event_backtester.py
+
+import heapq
+import itertools
+import logging
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+from backtest.backtester import Backtester
+from backtest.ledger import BacktestLedger
+from combined_strategy.combined_strategy import CombinedStrategy
+from orders import BUY, SELL
+from price_time_series_manager import PriceRingBuffer, PriceTimeSeriesManager, Timestamp, to_epoch_seconds
+from config.config import EVENT_STREAM_CHUNK
+import config.config as config
+from utils.metrics import metrics
+
+# 事件类型，同一时刻的事件按此顺序处理：先收齐所有股票的 bar，再成交上一根 bar 的委托，最后根据信号下单
+BAR, FILL, SIGNAL, ORDER = 0, 1, 2, 3
+EVENT_NAMES = {BAR: 'bar', FILL: 'fill', SIGNAL: 'signal', ORDER: 'order'}
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+@dataclass(slots=True)
+class BarEvent:
+    """一只股票的一根 bar，time 为 bar 的时间（Unix 秒）"""
+    time: int
+    symbol: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+@dataclass(slots=True)
+class SignalEvent:
+    """子策略在一根 bar 收盘时给出的信号"""
+    time: int
+    symbol: str
+    strategy: int  # 子策略在组合策略中的下标
+    position: int  # 1 买入，-1 卖出
+    price: float
+
+
+@dataclass(slots=True)
+class OrderEvent:
+    """按信号确定数量后的市价委托，在该股票的下一根 bar 开盘成交"""
+    time: int
+    symbol: str
+    side: int  # BUY 或 SELL
+    quantity: int
+
+
+@dataclass(slots=True)
+class FillEvent:
+    """委托的成交，由账本按现金和持仓校验后记账"""
+    time: int
+    symbol: str
+    side: int
+    price: float
+    quantity: int
+
+
+def frame_bars(symbol: str, df: Optional[pd.DataFrame], chunk_size: int = EVENT_STREAM_CHUNK) -> Iterator[BarEvent]:
+    """
+    按时间顺序逐根产生一只股票的 bar，每次只把 chunk_size 行转换为事件，收盘价缺失的 bar 跳过。
+
+    :param symbol: 股票代码
+    :param df: 该股票的行情，包含 date 和 OHLCV 列
+    :param chunk_size: 每次转换的行数
+    """
+    if df is None or df.empty:
+        return
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values(by='date', kind='stable')
+    times = df['date'].values.astype('datetime64[s]').astype(np.int64)
+    columns = [df[field].to_numpy(dtype=np.float64) if field in df.columns else np.full(len(df), np.nan)
+               for field in BAR_FIELDS]
+    for lo in range(0, len(df), chunk_size):
+        hi = lo + chunk_size
+        for time, open_, high, low, close, volume in zip(times[lo:hi].tolist(), *(column[lo:hi].tolist() for column in columns)):
+            if close == close:
+                yield BarEvent(time, symbol, open_, high, low, close, volume)
+
+
+def universe_bars(store, symbols: Optional[Sequence[str]] = None, rows: slice = slice(None),
+                  chunk_size: int = EVENT_STREAM_CHUNK) -> Iterator[BarEvent]:
+    """
+    按 日期、股票 的顺序产生全市场存储（UniverseStore）中的 bar，停牌（收盘价缺失）的股票不产生 bar。
+    每次只从内存映射中读入约 chunk_size 根 bar 所在的日期行，整个区间不会同时载入内存。
+
+    :param store: UniverseStore
+    :param symbols: 股票代码，None 表示存储中的全部股票
+    :param rows: 日期行切片，见 UniverseStore.date_rows
+    :param chunk_size: 每次读入的 bar 数上限（至少一个日期）
+    """
+    columns = store.columns(symbols)
+    names = list(store.symbols) if symbols is None else list(symbols)
+    lo, hi, _ = rows.indices(len(store))
+    step = max(1, chunk_size // max(len(names), 1))
+    for start in range(lo, hi, step):
+        block_rows = slice(start, min(start + step, hi))
+        fields = [np.asarray(store.block(field, block_rows, columns), dtype=np.float64) for field in BAR_FIELDS]
+        # 行优先取下标，即先按日期、再按列号排列
+        r, c = np.nonzero(~np.isnan(fields[3]))
+        times = store.dates[block_rows][r].astype('datetime64[s]').astype(np.int64)
+        values = [field[r, c].tolist() for field in fields]
+        for time, j, open_, high, low, close, volume in zip(times.tolist(), c.tolist(), *values):
+            yield BarEvent(time, names[j], open_, high, low, close, volume)
+
+
+def minute_store_bars(store, symbol: str, start_date: Optional[str], end_date: Optional[str], bar_size: str,
+                      chunk_size: int = EVENT_STREAM_CHUNK) -> Iterator[BarEvent]:
+    """
+    产生分钟行情存储（MinuteBarStore）中一只股票指定区间、指定周期的 bar。
+    首次取下一根 bar 时才读取该股票的存储。
+
+    :param store: MinuteBarStore
+    :param symbol: 股票代码
+    :param start_date: 开始日期，格式 'YYYYMMDD'
+    :param end_date: 结束日期，格式 'YYYYMMDD'
+    :param bar_size: bar 周期
+    :param chunk_size: 每次转换的行数
+    """
+    yield from frame_bars(symbol, store.get(symbol, start_date, end_date, bar_size), chunk_size)
+
+
+class EventBacktester(Backtester):
+    """
+    事件驱动的回测引擎。
+
+    各股票的 bar 流按时间归并进一个最小堆（事件队列），堆中每个流只保留下一根 bar，
+    以及当前时刻派生出的信号、委托和成交事件，因此内存占用只与股票数有关，与总 bar 数无关。
+    交易日历不同、盘中时间不同的股票按实际时间交错处理。
+
+    同一时刻依次处理：bar（更新指标、价格，挂单在该股票的这根 bar 开盘成交）→ 成交 → 信号 → 委托。
+    委托在该股票的下一根 bar 以开盘价成交，而不是以发出信号的那根 bar 的收盘价成交；
+    仍按组合策略的规则确定数量、合并各子策略的委托，成交规则（含交易成本与滑点）与账本一致。
+    每个时刻的事件处理完后记录一次净值。
+    """
+
+    def __init__(self, strategy: CombinedStrategy, data: Optional[Mapping[str, pd.DataFrame]] = None,
+                 streams: Optional[Sequence[Iterable[BarEvent]]] = None, symbols: Optional[List[str]] = None,
+                 save_results: bool = True, start_time: Optional[Timestamp] = None, bar_size: Optional[str] = None,
+                 chunk_size: int = EVENT_STREAM_CHUNK):
+        """
+        :param strategy: 组合策略，子策略需支持增量计算（update）
+        :param data: 所有股票的数据字典，会先重采样为 bar_size；与 streams 二选一
+        :param streams: 已按时间排序的 bar 流，可以是生成器，回测时逐根读取
+        :param symbols: streams 中出现的全部股票代码，使用 streams 时必须提供
+        :param save_results: 是否将详细结果写入回测结果文件
+        :param start_time: 开始交易的时间，之前的 bar 只用于预热指标和价格时序，None 表示从第一根 bar 开始交易
+        :param bar_size: 回测的 bar 周期，默认使用策略的 bar 周期
+        :param chunk_size: 从 data 构建 bar 流时每次转换的行数
+        """
+        if (data is None) == (streams is None):
+            raise ValueError("data 和 streams 必须且只能提供一个")
+        if streams is not None:
+            if symbols is None:
+                raise ValueError("使用 bar 流回测时必须提供 symbols")
+            super().__init__(strategy, {}, bar_size)
+            self.symbols = list(symbols)
+        else:
+            super().__init__(strategy, data, bar_size)
+            self.symbols = list(self.data.keys())
+        self.streams = streams
+        self.save_results = save_results
+        self.start_time = to_epoch_seconds(start_time) if start_time is not None else None
+        self.chunk_size = chunk_size
+        self.portfolio: Optional[BacktestLedger] = None
+        self.event_counts: Dict[str, int] = {}
+        self._pending: Dict[str, List[OrderEvent]] = {}
+        self._series: Dict[str, PriceRingBuffer] = {}
+
+    @classmethod
+    def from_universe(cls, strategy: CombinedStrategy, store, symbols: Optional[List[str]] = None,
+                      start_date: Optional[str] = None, end_date: Optional[str] = None, warmup_bars: int = 0,
+                      chunk_size: int = EVENT_STREAM_CHUNK, **kwargs) -> 'EventBacktester':
+        """
+        在全市场存储（UniverseStore）上回测，bar 直接从内存映射中流式读取。
+
+        :param strategy: 组合策略
+        :param store: UniverseStore
+        :param symbols: 股票代码，None 表示存储中的全部股票
+        :param start_date: 开始交易的日期，格式 'YYYYMMDD'
+        :param end_date: 结束日期，格式 'YYYYMMDD'
+        :param warmup_bars: 开始日期之前用于预热的日期数
+        :param chunk_size: 每次读入的 bar 数上限
+        :param kwargs: 传给构造函数的其他参数，如 save_results
+        """
+        rows = store.date_rows(start_date, end_date)
+        trading_rows = rows
+        rows = slice(max(0, rows.start - warmup_bars), rows.stop)
+        if start_date is not None and trading_rows.start < trading_rows.stop:
+            kwargs.setdefault('start_time', store.dates[trading_rows.start])
+        names = list(store.symbols) if symbols is None else list(symbols)
+        return cls(strategy, streams=[universe_bars(store, symbols, rows, chunk_size)], symbols=names, bar_size='daily', **kwargs)
+
+    @classmethod
+    def from_minute_store(cls, strategy: CombinedStrategy, store, symbols: List[str], start_date: Optional[str] = None,
+                          end_date: Optional[str] = None, bar_size: Optional[str] = None,
+                          chunk_size: int = EVENT_STREAM_CHUNK, **kwargs) -> 'EventBacktester':
+        """
+        在分钟行情存储（MinuteBarStore）上回测，每只股票一个 bar 流。
+
+        :param strategy: 组合策略
+        :param store: MinuteBarStore
+        :param symbols: 股票代码
+        :param start_date: 开始日期，格式 'YYYYMMDD'
+        :param end_date: 结束日期，格式 'YYYYMMDD'
+        :param bar_size: bar 周期，默认使用策略的 bar 周期
+        :param chunk_size: 每次转换的行数
+        :param kwargs: 传给构造函数的其他参数，如 save_results、start_time
+        """
+        bar_size = bar_size or strategy.bar_size
+        streams = [minute_store_bars(store, symbol, start_date, end_date, bar_size, chunk_size) for symbol in symbols]
+        return cls(strategy, streams=streams, symbols=symbols, bar_size=bar_size, **kwargs)
+
+    def _bar_streams(self) -> List[Iterator[BarEvent]]:
+        if self.streams is not None:
+            return [iter(stream) for stream in self.streams]
+        return [frame_bars(symbol, df, self.chunk_size) for symbol, df in self.data.items()]
+
+    @staticmethod
+    def _push_next(queue: list, key: int, stream: Iterator[BarEvent]):
+        """把 bar 流的下一根 bar 放入事件队列，流结束时不再放入"""
+        bar = next(stream, None)
+        if bar is not None:
+            heapq.heappush(queue, (bar.time, BAR, key, bar, stream))
+
+    def on_bar(self, bar: BarEvent) -> List[Tuple[int, object]]:
+        """
+        处理一根 bar：以开盘价成交该股票挂着的委托，更新最新价格、价格时序和各子策略的增量指标，
+        开始交易后对 Position 为 ±1 的子策略发出信号。
+
+        :return: 派生的 (事件类型, 事件) 列表
+        """
+        events = []
+        orders = self._pending.pop(bar.symbol, None)
+        if orders:
+            # 开盘价缺失时以收盘价成交
+            price = bar.open if bar.open > 0 else bar.close
+            for order in orders:
+                events.append((FILL, FillEvent(bar.time, bar.symbol, order.side, price, order.quantity)))
+
+        self.portfolio.prices[self.portfolio.symbol_index[bar.symbol]] = bar.close
+        series = self._series.get(bar.symbol)
+        if series is None:
+            series = self._series[bar.symbol] = PriceRingBuffer(self.price_manager.max_length)
+        series.append(bar.time, bar.close)
+        trading = self.start_time is None or bar.time >= self.start_time
+        for i, strategy in enumerate(self.strategy.strategies):
+            position = strategy.update(bar.symbol, bar.close)
+            if trading and (position == 1 or position == -1):
+                events.append((SIGNAL, SignalEvent(bar.time, bar.symbol, i, int(position), bar.close)))
+        return events
+
+    def on_signal(self, signal: SignalEvent) -> List[Tuple[int, object]]:
+        """
+        按子策略的规则和当前现金、持仓确定下单数量。
+
+        :return: 数量大于 0 时为一个委托事件
+        """
+        strategy = self.strategy.strategies[signal.strategy]
+        holding = int(self.portfolio.positions[self.portfolio.symbol_index[signal.symbol]])
+        recent_prices = self._series[signal.symbol].window(strategy.trend_window)
+        quantity = strategy.order_quantity(signal.position, signal.price, recent_prices, self.portfolio.cash, holding)
+        # 与 OrderBatch.merge 相同，合并各子策略的委托时再按权重取整
+        quantity = int(quantity * strategy.weight)
+        if quantity <= 0:
+            return []
+        side = BUY if signal.position == 1 else SELL
+        return [(ORDER, OrderEvent(signal.time, signal.symbol, side, quantity))]
+
+    def on_order(self, order: OrderEvent) -> List[Tuple[int, object]]:
+        """
+        挂单等待该股票的下一根 bar，同方向的委托合并为一笔，先买后卖，与其他回测引擎的执行顺序一致。
+        """
+        pending = self._pending.setdefault(order.symbol, [])
+        for queued in pending:
+            if queued.side == order.side:
+                queued.quantity += order.quantity
+                return []
+        pending.append(order)
+        pending.sort(key=lambda o: -o.side)
+        return []
+
+    def on_fill(self, fill: FillEvent) -> List[Tuple[int, object]]:
+        """由账本记账，现金或持仓不足时账本拒绝成交"""
+        if fill.side == BUY:
+            self.portfolio.buy_stock(fill.symbol, fill.price, fill.quantity, fill.time)
+        else:
+            self.portfolio.sell_stock(fill.symbol, fill.price, fill.quantity, fill.time)
+        return []
+
+    def run_backtest(self):
+        portfolio = BacktestLedger(self.symbols, initial_cash=config.INITIAL_CASH, simulate_costs=True)  # 启用交易成本模拟
+        self.portfolio = portfolio
+        self.strategy.reset_state()
+        trend_window = max(strategy.trend_window for strategy in self.strategy.strategies)
+        self.price_manager = PriceTimeSeriesManager.create_local(max(100, trend_window))
+        # bar 的时间已是 Unix 秒，直接写入价格时序的环形缓冲区
+        self._series = self.price_manager.get_all_series()
+        self._pending = {}
+
+        handlers = {BAR: self.on_bar, FILL: self.on_fill, SIGNAL: self.on_signal, ORDER: self.on_order}
+        counts = [0] * len(handlers)
+        # 队列元素为 (时间, 事件类型, 顺序, 事件, bar 流)：bar 的顺序为流的编号，堆中每个流最多一根 bar，
+        # 派生事件的顺序从流的个数开始递增，因此前三项总能分出先后
+        queue: list = []
+        streams = self._bar_streams()
+        for key, stream in enumerate(streams):
+            self._push_next(queue, key, stream)
+        sequence = itertools.count(len(streams))
+
+        current_time, current_day = None, None
+        with metrics.span('backtest.phase', stage='events'):
+            while queue:
+                time, kind, key, event, stream = heapq.heappop(queue)
+                if time != current_time:
+                    if current_time is not None and (self.start_time is None or current_time >= self.start_time):
+                        portfolio.mark_to_market(current_time)
+                    current_time = time
+                    if time // 86400 != current_day:
+                        current_day = time // 86400
+                        logging.info(f"回测日期: {np.datetime64(time, 's').astype('datetime64[D]')}")
+                if kind == BAR:
+                    # 归并：取出一根 bar 后补入同一个流的下一根
+                    self._push_next(queue, key, stream)
+                counts[kind] += 1
+                for new_kind, new_event in handlers[kind](event):
+                    heapq.heappush(queue, (time, new_kind, next(sequence), new_event, None))
+            if current_time is not None and (self.start_time is None or current_time >= self.start_time):
+                portfolio.mark_to_market(current_time)
+
+        self.event_counts = {EVENT_NAMES[kind]: count for kind, count in enumerate(counts)}
+        for name, count in self.event_counts.items():
+            metrics.inc('backtest.events', count, type=name)
+        unfilled = sum(len(orders) for orders in self._pending.values())
+        if unfilled:
+            logging.info(f"回测结束时仍有 {unfilled} 笔委托等待下一根 bar，未成交。")
+        logging.info(f"事件驱动回测完成：{self.event_counts['bar']} 根 bar，{self.event_counts['signal']} 个信号，"
+                     f"{self.event_counts['order']} 笔委托，{self.event_counts['fill']} 笔成交。")
+
+        with metrics.span('backtest.phase', stage='finalize'):
+            return self._finalize(portfolio, save=self.save_results)
@@ -0,0 +1,161 @@
+# backtest/ledger.py
+
+import logging
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, Iterator, List
+from config.config import TRANSACTION_COST_RATE, SLIPPAGE_RATE
+from orders import BUY, SELL, TransactionLog
+from price_time_series_manager import Timestamp, to_epoch_seconds
+
+
+class _HoldingsView(Mapping):
+    """持仓数组的只读字典视图，只包含持仓不为 0 的股票，接口与 Portfolio.holdings 一致"""
+
+    def __init__(self, ledger: 'BacktestLedger'):
+        self._ledger = ledger
+
+    def __getitem__(self, symbol: str) -> int:
+        j = self._ledger.symbol_index.get(symbol)
+        if j is None or self._ledger.positions[j] == 0:
+            raise KeyError(symbol)
+        return int(self._ledger.positions[j])
+
+    def __contains__(self, symbol) -> bool:
+        j = self._ledger.symbol_index.get(symbol)
+        return j is not None and self._ledger.positions[j] != 0
+
+    def __iter__(self) -> Iterator[str]:
+        for j in np.flatnonzero(self._ledger.positions):
+            yield self._ledger.symbols[j]
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._ledger.positions))
+
+
+class _PricesView(MutableMapping):
+    """最新价格数组的字典视图，接口与 Portfolio.latest_prices 一致"""
+
+    def __init__(self, ledger: 'BacktestLedger'):
+        self._ledger = ledger
+
+    def __getitem__(self, symbol: str) -> float:
+        j = self._ledger.symbol_index.get(symbol)
+        if j is None or np.isnan(self._ledger.prices[j]):
+            raise KeyError(symbol)
+        return float(self._ledger.prices[j])
+
+    def __setitem__(self, symbol: str, price: float):
+        self._ledger.prices[self._ledger.symbol_index[symbol]] = price
+
+    def __delitem__(self, symbol: str):
+        self._ledger.prices[self._ledger.symbol_index[symbol]] = np.nan
+
+    def __iter__(self) -> Iterator[str]:
+        for j in np.flatnonzero(~np.isnan(self._ledger.prices)):
+            yield self._ledger.symbols[j]
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(~np.isnan(self._ledger.prices)))
+
+
+class BacktestLedger:
+    """
+    回测专用的列式账本。
+
+    现金、持仓、最新价格和成交记录都保存在预分配的 NumPy 数组中，回测过程中不读写任何文件，
+    多个回测可以互不干扰地并行运行。对策略暴露与 Portfolio 相同的 cash、holdings、
+    latest_prices、buy_stock、sell_stock 和 get_portfolio_value 接口，成交规则（含交易成本与滑点）
+    与 Portfolio 一致。
+    """
+
+    def __init__(self, symbols: List[str], initial_cash: float, simulate_costs: bool = True, capacity: int = 4096):
+        """
+        :param symbols: 回测涉及的全部股票代码
+        :param initial_cash: 初始资金
+        :param simulate_costs: 是否模拟交易成本和滑点
+        :param capacity: 成交记录的初始容量，不足时按倍数扩容
+        """
+        self.symbols = list(symbols)
+        self.symbol_index: Dict[str, int] = {symbol: j for j, symbol in enumerate(self.symbols)}
+        self.initial_cash = initial_cash
+        self.cash = initial_cash
+        self.simulate_costs = simulate_costs
+        self.positions = np.zeros(len(self.symbols), dtype=np.int64)
+        self.prices = np.full(len(self.symbols), np.nan)
+        # 成交记录的股票下标与 symbols 一致
+        self.fills = TransactionLog(self.symbols, capacity)
+        self.holdings = _HoldingsView(self)
+        self.latest_prices = _PricesView(self)
+        # 每日收盘后的现金与总市值，由 mark_to_market 追加
+        self._equity_times: List[int] = []
+        self._equity_cash: List[float] = []
+        self._equity_values: List[float] = []
+
+    @property
+    def num_fills(self) -> int:
+        return len(self.fills)
+
+    def buy_stock(self, symbol: str, price: float, quantity: int, time: str):
+        cost = price * quantity
+        # 模拟交易成本和滑点
+        if self.simulate_costs:
+            cost += cost * TRANSACTION_COST_RATE  # 交易成本
+            cost += price * quantity * SLIPPAGE_RATE  # 滑点
+        if self.cash >= cost:
+            j = self.symbol_index[symbol]
+            self.cash -= cost
+            self.positions[j] += quantity
+            self.fills.append(BUY, symbol, price, quantity, time, cost)
+            logging.info(f"买入 {symbol} - 数量: {quantity}, 价格: {price}, 成本: ￥{cost:.2f}")
+        else:
+            logging.warning(f"现金不足，无法买入 {symbol} - 需要: ￥{cost:.2f}, 可用: ￥{self.cash:.2f}")
+
+    def sell_stock(self, symbol: str, price: float, quantity: int, time: str):
+        j = self.symbol_index.get(symbol)
+        held = int(self.positions[j]) if j is not None else 0
+        if held >= quantity:
+            revenue = price * quantity
+            # 模拟交易成本和滑点
+            if self.simulate_costs:
+                revenue -= revenue * TRANSACTION_COST_RATE  # 交易成本
+                revenue -= price * quantity * SLIPPAGE_RATE  # 滑点
+            self.cash += revenue
+            self.positions[j] -= quantity
+            self.fills.append(SELL, symbol, price, quantity, time, revenue)
+            logging.info(f"卖出 {symbol} - 数量: {quantity}, 价格: {price}, 收益: ￥{revenue:.2f}")
+        else:
+            logging.warning(f"持仓不足，无法卖出 {symbol} - 尝试卖出: {quantity}, 持有: {held}")
+
+    def get_portfolio_value(self) -> float:
+        held = (self.positions != 0) & ~np.isnan(self.prices)
+        return float(self.cash + np.dot(self.positions[held], self.prices[held]))
+
+    def mark_to_market(self, time: Timestamp):
+        """
+        按当前价格记录一次现金和总市值，回测引擎在每个交易日结束时调用。
+        """
+        self._equity_times.append(to_epoch_seconds(time))
+        self._equity_cash.append(self.cash)
+        self._equity_values.append(self.get_portfolio_value())
+
+    def equity_frame(self) -> pd.DataFrame:
+        """
+        :return: 以时间为索引，包含 cash、holdings_value、total_value 列的净值，每个 bar 一行
+        """
+        cash = np.array(self._equity_cash, dtype=np.float64)
+        values = np.array(self._equity_values, dtype=np.float64)
+        dates = np.array(self._equity_times, dtype=np.int64).astype('datetime64[s]')
+        return pd.DataFrame({
+            'cash': cash,
+            'holdings_value': values - cash,
+            'total_value': values,
+        }, index=pd.DatetimeIndex(dates.astype('datetime64[ns]'), name='date'))
+
+    @property
+    def transactions(self) -> List[Dict]:
+        """
+        将成交记录转换为与 Portfolio.transactions 相同格式的字典列表，仅在保存结果时调用。
+        """
+        return self.fills.to_dicts()
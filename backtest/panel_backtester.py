@@ -0,0 +1,187 @@
+# backtest/panel_backtester.py
+
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from backtest.ledger import BacktestLedger
+from combined_strategy.combined_strategy import CombinedStrategy
+from backtest.backtester import Backtester
+from backtest.price_panel import PricePanel, PointInTimeData
+from orders import SYMBOL_DTYPE
+import config.config as config
+from utils.metrics import metrics
+
+class PanelBacktester(Backtester):
+    """
+    基于日期对齐价格面板的回测引擎。
+
+    与 Backtester 使用相同的策略和组合接口，但预先构建 日期 × 股票 的价格面板，
+    按整数下标推进，并向策略提供截至当日的时点切片，不再逐日过滤和拼接 DataFrame。
+    回测期间不会修改传入的 data。
+
+    结果与 Backtester 不同，预热结束后也不一致：Backtester 把传入的完整历史交给策略，
+    并逐日在末尾追加一行收盘价，指标按历史末尾的数据计算（前视）；这里策略只能看到截至当日的 bar。
+
+    vectorized=True 时改用组合策略的横截面批量接口 decide_trade_batch：回测开始前按完整历史
+    一次性计算各子策略每根 bar 的 Position，每只股票最近的收盘价窗口以数组逐日滚动，
+    不再构建时点 DataFrame、不再逐只更新增量指标和价格时序，
+    适合全市场数千只股票的回测（见 from_universe）。
+    """
+
+    def __init__(self, strategy: CombinedStrategy, data: Dict[str, pd.DataFrame], panel: Optional[PricePanel] = None,
+                 save_results: bool = True, start: int = 0, end: Optional[int] = None, bar_size: Optional[str] = None,
+                 vectorized: bool = False):
+        """
+        :param strategy: 组合策略
+        :param data: 所有股票的数据字典
+        :param panel: 预先构建好的价格面板，多次回测同一份数据时可复用
+        :param save_results: 是否将详细结果写入回测结果文件
+        :param start: 开始交易的日期下标，之前的日期只用于预热指标和价格时序
+        :param end: 结束日期下标（不含），None 表示到最后一个日期
+        :param bar_size: 回测的 bar 周期，默认使用策略的 bar 周期，data 会先重采样为该周期，面板按该周期对齐
+        :param vectorized: 是否使用横截面批量决策
+        """
+        if panel is not None:
+            # 面板已按周期对齐，不再重采样 data（data 可能是按需构建的 UniverseFrames）
+            super().__init__(strategy, {}, bar_size or panel.bar_size)
+            self.data = data
+        else:
+            super().__init__(strategy, data, bar_size)
+        self.panel = panel if panel is not None else PricePanel(self.data, self.bar_size)
+        self.save_results = save_results
+        self.vectorized = vectorized
+        self.start = start
+        self.end = len(self.panel) if end is None else min(end, len(self.panel))
+        self.portfolio: Optional[BacktestLedger] = None
+
+    @classmethod
+    def from_universe(cls, strategy: CombinedStrategy, store, symbols: Optional[List[str]] = None,
+                      start_date: Optional[str] = None, end_date: Optional[str] = None, **kwargs) -> 'PanelBacktester':
+        """
+        在全市场存储（UniverseStore）上回测，使用批量决策，只读入回测区间和所选股票用到的数据。
+
+        :param strategy: 组合策略
+        :param store: UniverseStore
+        :param symbols: 股票代码，None 表示存储中的全部股票
+        :param start_date: 开始日期，格式 'YYYYMMDD'
+        :param end_date: 结束日期，格式 'YYYYMMDD'
+        :param kwargs: 传给构造函数的其他参数，如 save_results、start、end
+        """
+        panel = PricePanel.from_universe(store, symbols, start_date, end_date)
+        return cls(strategy, panel.frames, panel=panel, vectorized=True, **kwargs)
+
+    def _push_window(self, t: int, closes: np.ndarray, window: np.ndarray):
+        """
+        把第 t 个日期有行情的股票的收盘价移入其最近收盘价窗口（股票 × 窗口长度，右对齐），
+        与价格时序的最近窗口一致。
+        """
+        rows = np.flatnonzero(self.panel.has_bar[t])
+        window[rows, :-1] = window[rows, 1:]
+        window[rows, -1] = closes[t, rows]
+
+    def _positions_history(self, closes: np.ndarray) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        按各股票的完整历史一次性计算各子策略每根 bar 的 Position。滚动均值沿整段历史累积，
+        与逐日对截至当日的数据调用 generate_signals 的结果逐位一致。
+
+        :param closes: 日期 × 股票 的收盘价面板
+        :return: (各子策略 股票 × bar 的 Position 数组（右对齐）, 每只股票第一根 bar 所在的列)
+        """
+        has_bar = self.panel.has_bar
+        totals = has_bar.sum(axis=0)
+        width = max(int(totals.max(initial=0)), 1)
+        series = np.full((len(self.panel.symbols), width), np.nan)
+        for j in range(len(self.panel.symbols)):
+            series[j, width - totals[j]:] = closes[has_bar[:, j], j]
+        with metrics.span('backtest.phase', stage='positions'):
+            return [strategy.positions_history(series) for strategy in self.strategy.strategies], width - totals
+
+    def _push_closes(self, t: int, timestamp: str, closes: np.ndarray) -> Dict[str, float]:
+        """
+        把第 t 个日期有行情的股票的收盘价推送给策略增量指标和价格时序。
+
+        :return: 股票代码到收盘价的字典
+        """
+        day_closes = {}
+        for j in np.flatnonzero(self.panel.has_bar[t]):
+            symbol = self.panel.symbols[j]
+            close_price = float(closes[t, j])
+            day_closes[symbol] = close_price
+            # 增量更新策略指标，使其与截至当日的时点数据保持一致；bar 时间取时点视图最后一行的时间
+            bar_time = self.panel.frames[symbol]['date'].values[self.panel.counts[t, j] - 1]
+            self.strategy.update(symbol, {'close': close_price, 'date': bar_time})
+        self.price_manager.add_prices(timestamp, day_closes)
+        return day_closes
+
+    def run_backtest(self):
+        portfolio = BacktestLedger(self.panel.symbols, initial_cash=config.INITIAL_CASH, simulate_costs=True)  # 启用交易成本模拟
+
+        panel = self.panel
+        closes = panel.field('close')
+        timestamps = panel.timestamps()
+        point_in_time = PointInTimeData(panel)
+        self.strategy.reset_state()
+        self.portfolio = portfolio
+        if self.vectorized:
+            strategies = self.strategy.strategies
+            width = max(max(s.batch_lookback for s in strategies), max(s.trend_window for s in strategies))
+            window = np.full((len(panel.symbols), width), np.nan)
+            symbols = np.array(panel.symbols, dtype=SYMBOL_DTYPE)
+            history, first_column = self._positions_history(closes)
+
+        phases = metrics.stages('backtest.phase')
+        # 开始日期之前只预热，不交易；最新价格取截至预热结束时各股票的最后收盘价
+        if self.start > 0:
+            phases.start('warmup')
+            for t in range(self.start):
+                if self.vectorized:
+                    self._push_window(t, closes, window)
+                else:
+                    self._push_closes(t, timestamps[t], closes)
+                has_bar = panel.has_bar[t]
+                portfolio.prices[has_bar] = closes[t, has_bar]
+            phases.finish()
+
+        for t in range(self.start, self.end):
+            timestamp = timestamps[t]
+            logging.info(f"回测日期: {timestamp if panel.unit != 'D' else timestamp[:10]}")
+
+            # 更新当日有行情的股票的收盘价
+            phases.start('price_update')
+            if self.vectorized:
+                self._push_window(t, closes, window)
+            else:
+                self._push_closes(t, timestamp, closes)
+            has_bar = panel.has_bar[t]
+            portfolio.prices[has_bar] = closes[t, has_bar]
+
+            # 决定当天的买卖操作，策略只能看到截至当日的数据
+            phases.start('decide')
+            if self.vectorized:
+                # 收盘价窗口同时作为价格时序，最新价格即各股票最近一次的收盘价
+                listed = np.flatnonzero(panel.counts[t] > 0)
+                recent = window[listed]
+                # 截至当日最后一根 bar 的 Position，停牌日沿用最后一根 bar 的结果
+                column = first_column[listed] + panel.counts[t, listed] - 1
+                positions = [h[listed, column] for h in history]
+                trades_buy, trades_sell = self.strategy.decide_trade_batch(symbols[listed], recent, recent[:, -1], recent,
+                                                                           portfolio.cash, portfolio.positions[listed],
+                                                                           positions=positions)
+            else:
+                trades_buy, trades_sell = self.strategy.decide_trade(point_in_time.at(t), portfolio,
+                                                                     self.price_manager.get_all_series())
+
+            # 模拟买入
+            phases.start('execute')
+            for trade in trades_buy:
+                portfolio.buy_stock(trade.symbol, trade.price, trade.quantity, timestamp)
+
+            # 模拟卖出
+            for trade in trades_sell:
+                portfolio.sell_stock(trade.symbol, trade.price, trade.quantity, timestamp)
+            portfolio.mark_to_market(timestamp)
+            phases.finish()
+
+        with metrics.span('backtest.phase', stage='finalize'):
+            return self._finalize(portfolio, save=self.save_results)
@@ -0,0 +1,156 @@
+# backtest/price_panel.py
+
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence
+from data.minute_bars import is_intraday
+
+
+class PricePanel:
+    """
+    按日期对齐的价格面板：一次性把各股票的 DataFrame 整理成 日期 × 股票 的 NumPy 数组，
+    回测时按整数下标推进，避免逐日过滤和拼接 DataFrame。分钟 bar 的面板按分钟对齐，
+    下文的“日期”即 bar 的时间。
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, data: Dict[str, pd.DataFrame], bar_size: str = 'daily'):
+        """
+        构建价格面板。
+
+        :param data: 所有股票的数据字典，键为股票代码，值为对应的历史数据 DataFrame
+        :param bar_size: data 的 bar 周期，分钟周期时按分钟对齐，否则按日期对齐
+        """
+        self.bar_size = bar_size
+        self.unit = 'm' if is_intraday(bar_size) else 'D'
+        self.symbols: List[str] = list(data.keys())
+        self.symbol_index: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # 每只股票的原始数据按日期排序后保存，时点视图直接在其上切片
+        self.frames: Dict[str, pd.DataFrame] = {}
+        symbol_dates = []
+        for symbol in self.symbols:
+            df = data[symbol]
+            if not df['date'].is_monotonic_increasing:
+                df = df.sort_values(by='date')
+            df = df.reset_index(drop=True)
+            self.frames[symbol] = df
+            symbol_dates.append(df['date'].values.astype(f'datetime64[{self.unit}]'))
+
+        if symbol_dates:
+            self.dates = np.unique(np.concatenate(symbol_dates))
+        else:
+            self.dates = np.array([], dtype=f'datetime64[{self.unit}]')
+
+        n_dates, n_symbols = len(self.dates), len(self.symbols)
+        self.arrays: Dict[str, np.ndarray] = {
+            field: np.full((n_dates, n_symbols), np.nan) for field in self.FIELDS
+        }
+        self.has_bar = np.zeros((n_dates, n_symbols), dtype=bool)
+        # counts[t, j]: 第 j 只股票截至第 t 个日期（含）的行数，即时点视图的长度
+        self.counts = np.zeros((n_dates, n_symbols), dtype=np.int64)
+
+        for j, symbol in enumerate(self.symbols):
+            df = self.frames[symbol]
+            dates = symbol_dates[j]
+            if len(dates) == 0:
+                continue
+            # 同一日期（分钟）有多行时取最后一行
+            last_of_day = np.append(dates[1:] != dates[:-1], True)
+            rows = np.searchsorted(self.dates, dates[last_of_day])
+            for field in self.FIELDS:
+                if field in df.columns:
+                    self.arrays[field][rows, j] = df[field].to_numpy(dtype=np.float64)[last_of_day]
+            self.has_bar[rows, j] = True
+            self.counts[:, j] = np.searchsorted(dates, self.dates, side='right')
+
+    @classmethod
+    def from_universe(cls, store, symbols: Optional[Sequence[str]] = None, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> 'PricePanel':
+        """
+        直接在全市场存储上构建日线面板。覆盖全部股票时各字段就是内存映射上的视图，不拷贝、不整体读入，
+        只取部分股票时只拷贝这些列；时点视图用到的 DataFrame 在首次访问某只股票时才构建。
+
+        :param store: UniverseStore
+        :param symbols: 股票代码，None 表示存储中的全部股票
+        :param start_date: 开始日期，格式 'YYYYMMDD'
+        :param end_date: 结束日期，格式 'YYYYMMDD'
+        """
+        panel = cls.__new__(cls)
+        panel.bar_size = 'daily'
+        panel.unit = 'D'
+        panel.symbols = list(symbols) if symbols is not None else list(store.symbols)
+        panel.symbol_index = {symbol: i for i, symbol in enumerate(panel.symbols)}
+        rows = store.date_rows(start_date, end_date)
+        columns = store.columns(symbols)
+        panel.dates = np.array(store.dates[rows])
+        panel.arrays = {field: store.block(field, rows, columns) for field in cls.FIELDS}
+        panel.has_bar = ~np.isnan(panel.arrays['close'])
+        panel.counts = np.cumsum(panel.has_bar, axis=0, dtype=np.int32)
+        panel.frames = store.frames(panel.symbols, start_date, end_date)
+        return panel
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def field(self, name: str) -> np.ndarray:
+        """
+        获取某个字段的 日期 × 股票 数组，缺失值为 NaN。
+
+        :param name: 字段名，如 'close'
+        :return: 二维数组
+        """
+        return self.arrays[name]
+
+    def timestamps(self) -> List[str]:
+        """
+        :return: 每个日期对应的时间戳字符串，格式 'YYYY-MM-DD HH:MM:SS'
+        """
+        if self.unit != 'D':
+            return [f"{day[:10]} {day[11:]}" for day in np.datetime_as_string(self.dates, unit='s')]
+        return [f"{day} 00:00:00" for day in np.datetime_as_string(self.dates, unit='D')]
+
+    def view(self, symbol: str, t: int) -> pd.DataFrame:
+        """
+        获取某只股票截至第 t 个日期的数据，为原始数据的切片而非拷贝。
+
+        :param symbol: 股票代码
+        :param t: 日期下标
+        :return: 时点视图 DataFrame
+        """
+        j = self.symbol_index[symbol]
+        return self.frames[symbol].iloc[:self.counts[t, j]]
+
+
+class PointInTimeData(Mapping):
+    """
+    面板在某一日期上的时点数据字典，接口与 Dict[str, pd.DataFrame] 一致，
+    只包含当日之前已有数据的股票，取值时才切片。
+    """
+
+    def __init__(self, panel: PricePanel, t: int = 0):
+        self.panel = panel
+        self.t = t
+
+    def at(self, t: int) -> 'PointInTimeData':
+        self.t = t
+        return self
+
+    def __getitem__(self, symbol: str) -> pd.DataFrame:
+        j = self.panel.symbol_index[symbol]
+        if self.panel.counts[self.t, j] == 0:
+            raise KeyError(symbol)
+        return self.panel.view(symbol, self.t)
+
+    def __contains__(self, symbol) -> bool:
+        j = self.panel.symbol_index.get(symbol)
+        return j is not None and self.panel.counts[self.t, j] > 0
+
+    def __iter__(self) -> Iterator[str]:
+        for j in np.flatnonzero(self.panel.counts[self.t] > 0):
+            yield self.panel.symbols[j]
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.panel.counts[self.t] > 0))
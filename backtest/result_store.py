@@ -0,0 +1,95 @@
+# backtest/result_store.py
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from functools import cached_property
+from typing import Dict, Optional
+from orders import TransactionLog
+
+
+def save_result(path: str, summary: Dict, equity: pd.DataFrame, fills: TransactionLog, pnl: pd.DataFrame):
+    """
+    以列式 npz 保存回测结果：一个 JSON 摘要头，加上每日净值、成交记录和分股票盈亏的各列数组。
+    不压缩，读取时可以只解出需要的列。先写临时文件再替换，避免界面读到写了一半的文件。
+
+    :param path: 结果文件路径
+    :param summary: 统计指标等摘要信息，需可 JSON 序列化
+    :param equity: 以日期为索引的每日净值，包含 cash、holdings_value、total_value 列
+    :param fills: 成交记录
+    :param pnl: symbol_pnl 返回的分股票盈亏
+    """
+    header = dict(summary, num_days=len(equity), num_fills=len(fills), num_symbols=len(pnl))
+    arrays = {
+        'header': np.frombuffer(json.dumps(header, ensure_ascii=False).encode('utf-8'), dtype=np.uint8),
+        'equity_date': equity.index.values.astype('datetime64[s]'),
+        'fill_symbols': np.array(fills.symbols, dtype=str),
+        'pnl_symbol': pnl.index.to_numpy(dtype=str),
+    }
+    for column in equity.columns:
+        arrays[f'equity_{column}'] = equity[column].to_numpy()
+    records = fills.records
+    for field in records.dtype.names:
+        arrays[f'fill_{field}'] = records[field]
+    for column in pnl.columns:
+        arrays[f'pnl_{column}'] = pnl[column].to_numpy()
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+class BacktestResult:
+    """
+    按需读取的回测结果文件。构造时只读取摘要头，每日净值、成交记录和分股票盈亏在首次访问时才解出。
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: save_result 写入的结果文件路径
+        """
+        self.path = path
+        with np.load(path) as data:
+            self.summary: Dict = json.loads(data['header'].tobytes().decode('utf-8'))
+
+    def _columns(self, prefix: str) -> Dict[str, np.ndarray]:
+        with np.load(self.path) as data:
+            return {name[len(prefix):]: data[name] for name in data.files if name.startswith(prefix)}
+
+    @cached_property
+    def equity(self) -> pd.DataFrame:
+        """以日期为索引的每日净值"""
+        columns = self._columns('equity_')
+        dates = columns.pop('date')
+        return pd.DataFrame(columns, index=pd.DatetimeIndex(dates.astype('datetime64[ns]'), name='date'))
+
+    @cached_property
+    def fills(self) -> TransactionLog:
+        """成交记录"""
+        columns = self._columns('fill_')
+        symbols = columns.pop('symbols').tolist()
+        records = np.zeros(len(columns['side']), dtype=TransactionLog.DTYPE)
+        for field in TransactionLog.DTYPE.names:
+            records[field] = columns[field]
+        return TransactionLog.from_records(records, symbols)
+
+    @cached_property
+    def symbol_pnl(self) -> pd.DataFrame:
+        """分股票盈亏"""
+        columns = self._columns('pnl_')
+        symbols = columns.pop('symbol')
+        return pd.DataFrame(columns, index=pd.Index(symbols.astype(object), name='symbol'))
+
+    @classmethod
+    def load(cls, path: str) -> Optional['BacktestResult']:
+        """
+        :return: 结果文件不存在或无法解析时返回 None
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, KeyError):
+            return None
@@ -0,0 +1,232 @@
+# backtest/sweep.py
+
+import copy
+import itertools
+import logging
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+from config.config import STRATEGY_CONFIGS, SWEEP_MAX_WORKERS
+
+# 每个字段在共享内存中的描述：(共享内存名, 形状, dtype)
+ArraySpec = Tuple[str, Tuple[int, ...], str]
+
+SHARED_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class SharedPriceData:
+    """
+    将各股票的历史数据打包成若干扁平数组放入共享内存，
+    子进程按名字挂载后只读使用，无需为每个任务序列化一次价格数据。
+    """
+
+    def __init__(self, data: Dict[str, pd.DataFrame]):
+        """
+        :param data: 所有股票的数据字典，键为股票代码，值为对应的历史数据 DataFrame
+        """
+        self.symbols = list(data.keys())
+        frames = [data[symbol].sort_values(by='date') for symbol in self.symbols]
+        lengths = [len(df) for df in frames]
+        offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        arrays = {
+            'offsets': offsets,
+            'date': np.concatenate([df['date'].values.astype('datetime64[ns]').view(np.int64) for df in frames]) if frames else np.empty(0, dtype=np.int64),
+        }
+        for field in SHARED_FIELDS:
+            arrays[field] = np.concatenate([
+                df[field].to_numpy(dtype=np.float64) if field in df.columns else np.full(len(df), np.nan) for df in frames
+            ]) if frames else np.empty(0)
+
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self.specs: Dict[str, ArraySpec] = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self._blocks.append(block)
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        """释放共享内存"""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def attach(specs: Dict[str, ArraySpec]) -> Tuple[Dict[str, np.ndarray], List[shared_memory.SharedMemory]]:
+        """
+        在子进程中挂载共享内存。
+
+        :param specs: SharedPriceData.specs
+        :return: (字段名到只读数组的字典, 需要保持引用的共享内存对象列表)
+        """
+        arrays, blocks = {}, []
+        for name, (block_name, shape, dtype) in specs.items():
+            # 子进程与父进程共用同一个资源跟踪器，由父进程在 close() 中统一回收
+            block = shared_memory.SharedMemory(name=block_name)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            arrays[name] = array
+            blocks.append(block)
+        return arrays, blocks
+
+    @staticmethod
+    def to_frames(symbols: List[str], arrays: Dict[str, np.ndarray]) -> Dict[str, pd.DataFrame]:
+        """
+        由共享数组还原各股票的 DataFrame。
+
+        :param symbols: 股票代码列表
+        :param arrays: attach 返回的数组字典
+        :return: 股票代码到历史数据 DataFrame 的字典
+        """
+        offsets = arrays['offsets']
+        data = {}
+        for j, symbol in enumerate(symbols):
+            start, end = offsets[j], offsets[j + 1]
+            columns = {'date': arrays['date'][start:end].view('datetime64[ns]')}
+            for field in SHARED_FIELDS:
+                columns[field] = arrays[field][start:end]
+            df = pd.DataFrame(columns)
+            df['symbol'] = symbol
+            data[symbol] = df
+        return data
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    展开参数网格。
+
+    键为 '策略名.参数名'，如 'RSI.window'；'策略名.weight' 表示策略权重。
+
+    :param grid: 参数网格，值为候选取值列表
+    :return: 参数组合列表
+    """
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def apply_params(base_configs: List[Dict], params: Dict[str, Any]) -> List[Dict]:
+    """
+    将一组参数覆盖到策略配置上，返回新的配置。
+
+    :param base_configs: 基础策略配置，格式同 STRATEGY_CONFIGS
+    :param params: 形如 {'RSI.window': 10} 的参数组合
+    :return: 覆盖后的策略配置
+    """
+    configs = copy.deepcopy(base_configs)
+    by_name = {cfg['name']: cfg for cfg in configs}
+    for key, value in params.items():
+        name, _, param = key.partition('.')
+        if name not in by_name or not param:
+            raise ValueError(f"无效的扫描参数: {key}")
+        if param == 'weight':
+            by_name[name]['weight'] = value
+        else:
+            by_name[name]['params'][param] = value
+    return configs
+
+
+# 子进程内的全局状态，由 _init_worker 初始化
+_worker_data: Optional[Dict[str, pd.DataFrame]] = None
+_worker_panel = None
+_worker_blocks: List[shared_memory.SharedMemory] = []
+_worker_base_configs: List[Dict] = []
+
+
+def _init_worker(symbols: List[str], specs: Dict[str, ArraySpec], base_configs: List[Dict]):
+    global _worker_data, _worker_panel, _worker_blocks, _worker_base_configs
+    from backtest.price_panel import PricePanel
+
+    arrays, _worker_blocks = SharedPriceData.attach(specs)
+    _worker_data = SharedPriceData.to_frames(symbols, arrays)
+    _worker_panel = PricePanel(_worker_data)
+    _worker_base_configs = base_configs
+
+
+def run_combination(params: Dict[str, Any], data: Dict[str, pd.DataFrame], panel=None, base_configs: List[Dict] = None,
+                    start: int = 0, end: Optional[int] = None, with_equity: bool = False) -> Dict[str, Any]:
+    """
+    用一组参数运行一次回测，不写任何文件。
+
+    :param params: 参数组合
+    :param data: 所有股票的数据字典
+    :param panel: 可复用的价格面板
+    :param base_configs: 基础策略配置，默认 STRATEGY_CONFIGS
+    :param start: 开始交易的日期下标
+    :param end: 结束日期下标（不含）
+    :param with_equity: 是否在结果中附带每日净值（'equity' 键）
+    :return: 参数与回测指标合并后的字典
+    """
+    from factories.strategy_factory import StrategyFactory
+    from combined_strategy.combined_strategy import CombinedStrategy
+    from backtest.panel_backtester import PanelBacktester
+
+    configs = apply_params(base_configs if base_configs is not None else STRATEGY_CONFIGS, params)
+    strategies = [
+        StrategyFactory.get_strategy(cfg['name'], weight=cfg.get('weight', 1.0), **cfg['params']) for cfg in configs
+    ]
+    backtester = PanelBacktester(CombinedStrategy(strategies), data, panel=panel, save_results=False, start=start, end=end)
+    results = backtester.run_backtest()
+    portfolio = backtester.portfolio
+    row = {
+        **params,
+        'total_return': results['total_return'],
+        'sharpe': results['sharpe'],
+        'max_drawdown': results['max_drawdown'],
+        'final_portfolio_value': portfolio.get_portfolio_value(),
+        'num_transactions': portfolio.num_fills,
+    }
+    if with_equity:
+        row['equity'] = backtester.equity
+    return row
+
+
+def _run_in_worker(params: Dict[str, Any]) -> Dict[str, Any]:
+    return run_combination(params, _worker_data, panel=_worker_panel, base_configs=_worker_base_configs)
+
+
+def run_sweep(data: Dict[str, pd.DataFrame], grid: Dict[str, List[Any]], max_workers: Optional[int] = SWEEP_MAX_WORKERS,
+              base_configs: List[Dict] = None) -> pd.DataFrame:
+    """
+    在多进程中并行扫描参数网格。
+
+    价格数据只打包一次放入共享内存，每个子进程挂载后构建一次价格面板，
+    之后该进程执行的所有回测任务都复用它。
+
+    :param data: 所有股票的数据字典，键为股票代码，值为对应的历史数据 DataFrame
+    :param grid: 参数网格，如 {'MovingAverageCrossover.short_window': [5, 10], 'RSI.window': [14, 21]}
+    :param max_workers: 并行进程数，默认使用全部 CPU 核心
+    :param base_configs: 基础策略配置，默认 STRATEGY_CONFIGS
+    :return: 按总收益从高到低排序的结果表
+    """
+    combinations = expand_grid(grid)
+    base_configs = copy.deepcopy(base_configs if base_configs is not None else STRATEGY_CONFIGS)
+    # 提前校验参数名，避免在子进程中才报错
+    if combinations:
+        apply_params(base_configs, combinations[0])
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(combinations) // (workers * 4))
+    logging.info(f"开始参数扫描: {len(combinations)} 组参数, {workers} 个进程。")
+
+    with SharedPriceData(data) as shared:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.symbols, shared.specs, base_configs)) as executor:
+            rows = list(executor.map(_run_in_worker, combinations, chunksize=chunksize))
+
+    results = pd.DataFrame(rows)
+    if not results.empty:
+        results = results.sort_values(by='total_return', ascending=False, ignore_index=True)
+        results.index = pd.RangeIndex(1, len(results) + 1, name='rank')
+    logging.info("参数扫描完成。")
+    return results
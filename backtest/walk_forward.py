@@ -0,0 +1,142 @@
+# backtest/walk_forward.py
+
+import copy
+import logging
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from backtest import sweep
+from backtest.sweep import SharedPriceData, expand_grid, apply_params, run_combination
+import config.config as config
+from config.config import (STRATEGY_CONFIGS, SWEEP_MAX_WORKERS, WALK_FORWARD_TRAIN_DAYS, WALK_FORWARD_TEST_DAYS,
+                           WALK_FORWARD_METRIC)
+
+# (样本内开始, 样本内结束, 样本外开始, 样本外结束)，均为日期下标，结束不含
+Window = Tuple[int, int, int, int]
+# (参数组合, 开始下标, 结束下标, 是否返回每日净值)
+Task = Tuple[Dict[str, Any], int, int, bool]
+
+
+def walk_forward_windows(n_dates: int, train_days: int = WALK_FORWARD_TRAIN_DAYS, test_days: int = WALK_FORWARD_TEST_DAYS,
+                         anchored: bool = False) -> List[Window]:
+    """
+    生成滚动的样本内/样本外窗口，样本外窗口首尾相接、互不重叠，步长为 test_days。
+
+    :param n_dates: 交易日数量
+    :param train_days: 样本内窗口长度
+    :param test_days: 样本外窗口长度，最后一个窗口可能较短
+    :param anchored: 是否固定样本内窗口的起点（扩展窗口），否则样本内窗口随之滚动
+    :return: 窗口列表
+    """
+    windows = []
+    test_start = train_days
+    while test_start < n_dates:
+        test_end = min(test_start + test_days, n_dates)
+        train_start = 0 if anchored else test_start - train_days
+        windows.append((train_start, test_start, test_start, test_end))
+        test_start = test_end
+    return windows
+
+
+def _run_task(task: Task) -> Dict[str, Any]:
+    params, start, end, with_equity = task
+    return run_combination(params, sweep._worker_data, panel=sweep._worker_panel, base_configs=sweep._worker_base_configs,
+                           start=start, end=end, with_equity=with_equity)
+
+
+def stitch_equity(segments: List[pd.DataFrame], initial_cash: float) -> pd.DataFrame:
+    """
+    将各样本外窗口的每日净值按收益率首尾相接。每个窗口都从初始资金、空仓开始，
+    拼接后的净值相当于把上一个窗口结束时的全部资金投入下一个窗口。
+
+    :param segments: 各窗口以日期为索引、包含 total_value 列的每日净值
+    :param initial_cash: 每个窗口的初始资金，也是拼接后净值的起点
+    :return: 以日期为索引，包含 total_value、window 列的 DataFrame
+    """
+    frames = []
+    capital = initial_cash
+    for i, segment in enumerate(segments):
+        if segment.empty:
+            continue
+        growth = segment['total_value'].to_numpy(dtype=np.float64) / initial_cash
+        frames.append(pd.DataFrame({'total_value': capital * growth, 'window': i}, index=segment.index))
+        capital *= growth[-1]
+    if not frames:
+        return pd.DataFrame(columns=['total_value', 'window'], index=pd.DatetimeIndex([], name='date'))
+    return pd.concat(frames)
+
+
+def run_walk_forward(data: Dict[str, pd.DataFrame], grid: Dict[str, List[Any]], train_days: int = WALK_FORWARD_TRAIN_DAYS,
+                     test_days: int = WALK_FORWARD_TEST_DAYS, metric: str = WALK_FORWARD_METRIC, anchored: bool = False,
+                     max_workers: Optional[int] = SWEEP_MAX_WORKERS,
+                     base_configs: List[Dict] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    滚动前向回测：在每个样本内窗口上扫描参数网格，选出 metric 最高的参数，在紧随其后的样本外窗口上回测，
+    再把各样本外窗口的净值拼接起来。
+
+    所有窗口互相独立，分两批并行执行：先是全部 窗口 × 参数 的样本内回测，再是各窗口的样本外回测。
+    价格数据只放入共享内存一次，每个子进程构建一次价格面板，之后的所有任务都复用（与 run_sweep 相同）。
+    窗口开始之前的数据只用于预热指标，不产生交易。
+
+    :param data: 所有股票的数据字典
+    :param grid: 参数网格，格式同 run_sweep
+    :param train_days: 样本内窗口的交易日数
+    :param test_days: 样本外窗口的交易日数
+    :param metric: 选参指标，run_combination 结果中的列名，如 'sharpe'、'total_return'
+    :param anchored: 是否使用起点固定的扩展样本内窗口
+    :param max_workers: 并行进程数，默认使用全部 CPU 核心
+    :param base_configs: 基础策略配置，默认 STRATEGY_CONFIGS
+    :return: (每个窗口的日期区间、所选参数、样本内和样本外指标；拼接后的样本外每日净值)
+    """
+    combinations = expand_grid(grid)
+    base_configs = copy.deepcopy(base_configs if base_configs is not None else STRATEGY_CONFIGS)
+    if combinations:
+        apply_params(base_configs, combinations[0])
+
+    dates = np.unique(np.concatenate([df['date'].values.astype('datetime64[D]') for df in data.values()])) if data else np.array([], dtype='datetime64[D]')
+    windows = walk_forward_windows(len(dates), train_days, test_days, anchored)
+    if not windows:
+        raise ValueError(f"交易日数 {len(dates)} 不足以划分样本内窗口（{train_days} 天）和样本外窗口")
+    workers = max_workers or os.cpu_count() or 1
+    logging.info(f"开始滚动前向回测: {len(windows)} 个窗口, 每个窗口 {len(combinations)} 组参数, {workers} 个进程。")
+
+    with SharedPriceData(data) as shared:
+        with ProcessPoolExecutor(max_workers=workers, initializer=sweep._init_worker,
+                                 initargs=(shared.symbols, shared.specs, base_configs)) as executor:
+            in_sample_tasks = [(params, train_start, train_end, False)
+                               for train_start, train_end, _, _ in windows for params in combinations]
+            chunksize = max(1, len(in_sample_tasks) // (workers * 4))
+            in_sample = list(executor.map(_run_task, in_sample_tasks, chunksize=chunksize))
+
+            # 每个窗口选出样本内指标最高的参数，指标相同时取网格中靠前的一组
+            chosen = []
+            for i in range(len(windows)):
+                rows = in_sample[i * len(combinations):(i + 1) * len(combinations)]
+                scores = np.array([row[metric] for row in rows], dtype=np.float64)
+                best = int(np.nanargmax(scores)) if not np.isnan(scores).all() else 0
+                chosen.append((combinations[best], rows[best]))
+
+            out_of_sample_tasks = [(params, test_start, test_end, True)
+                                   for (params, _), (_, _, test_start, test_end) in zip(chosen, windows)]
+            out_of_sample = list(executor.map(_run_task, out_of_sample_tasks))
+
+    rows = []
+    for (train_start, train_end, test_start, test_end), (params, in_row), out_row in zip(windows, chosen, out_of_sample):
+        rows.append({
+            'train_start': dates[train_start], 'train_end': dates[train_end - 1],
+            'test_start': dates[test_start], 'test_end': dates[test_end - 1],
+            **params,
+            f'in_sample_{metric}': in_row[metric],
+            'in_sample_return': in_row['total_return'],
+            'out_of_sample_return': out_row['total_return'],
+            'out_of_sample_sharpe': out_row['sharpe'],
+            'out_of_sample_max_drawdown': out_row['max_drawdown'],
+            'num_transactions': out_row['num_transactions'],
+        })
+    summary = pd.DataFrame(rows)
+    summary.index = pd.RangeIndex(len(summary), name='window')
+    equity = stitch_equity([row['equity'] for row in out_of_sample], config.INITIAL_CASH)
+    logging.info("滚动前向回测完成。")
+    return summary, equity
@@ -0,0 +1,340 @@
+# benchmarks/run_benchmarks.py
+"""
+离线性能基准：在合成行情上计时数据获取、信号生成、交易决策、回测、组合交易和存储读写。
+
+在项目根目录下运行：
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --scales 50x250 200x1000 --repeat 5 --only backtest
+
+每次运行的结果连同当前 git 提交追加到历史文件中，并与上一次运行逐项对比。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import SyntheticAkshare, generate_universe
+
+AKSHARE = SyntheticAkshare()
+AKSHARE.install()
+
+# 以下模块会导入 akshare，必须在注册替身之后导入
+from data.data_fetcher import DataFetcher  # noqa: E402
+from data.bar_cache import BarCache  # noqa: E402
+from factories.strategy_factory import StrategyFactory  # noqa: E402
+from combined_strategy.combined_strategy import CombinedStrategy  # noqa: E402
+from backtest.backtester import Backtester  # noqa: E402
+from backtest.panel_backtester import PanelBacktester  # noqa: E402
+from portfolio.portfolio import Portfolio  # noqa: E402
+from storage.storage import Storage, MemoryStorage, JournalStorage, SQLiteStorage  # noqa: E402
+from price_time_series_manager import PriceTimeSeriesManager  # noqa: E402
+from config.config import STRATEGY_CONFIGS, INITIAL_CASH  # noqa: E402
+
+HISTORY_FILE = os.path.join(ROOT_DIR, 'benchmarks', 'history.json')
+DEFAULT_SCALES = ['20x250', '100x500', '200x750']
+REGRESSION_THRESHOLD = 1.10  # 中位数耗时超过上次的 110% 视为退化
+
+
+def parse_scale(scale: str) -> Tuple[int, int]:
+    """'股票数x交易日数' -> (股票数, 交易日数)"""
+    n_symbols, n_days = scale.lower().split('x')
+    return int(n_symbols), int(n_days)
+
+
+def measure(func: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """
+    重复执行 func 并统计耗时（秒），setup 在每次执行前调用且不计时。
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'min': min(timings),
+        'median': float(np.median(timings)),
+        'mean': float(np.mean(timings)),
+        'repeat': repeat,
+    }
+
+
+def create_strategies() -> List:
+    return [
+        StrategyFactory.get_strategy(config['name'], weight=config.get('weight', 1.0), **config['params'])
+        for config in STRATEGY_CONFIGS
+    ]
+
+
+def live_price_series(data: Dict[str, pd.DataFrame], max_length: int = 100) -> Dict:
+    """用最近 max_length 个收盘价填充一个独立的价格管理器，模拟实盘时的价格时序"""
+    manager = PriceTimeSeriesManager.create_local(max_length)
+    for symbol, df in data.items():
+        tail = df.tail(max_length)
+        for date, close in zip(tail['date'], tail['close']):
+            manager.add_price(symbol, date.to_datetime64(), close)
+    return manager.get_all_series()
+
+
+def trading_portfolio(data: Dict[str, pd.DataFrame], storage=None) -> Portfolio:
+    """持有全部股票各 1000 股的组合"""
+    portfolio = Portfolio(INITIAL_CASH * 100, storage=storage or MemoryStorage())
+    for symbol, df in data.items():
+        portfolio.holdings[symbol] = 1000
+        portfolio.latest_prices[symbol] = float(df['close'].iat[-1])
+    return portfolio
+
+
+def simulate_trades(portfolio: Portfolio, symbols: List[str], n_trades: int, seed: int = 0):
+    """随机交替买卖 n_trades 笔"""
+    rng = random.Random(seed)
+    for i in range(n_trades):
+        symbol = rng.choice(symbols)
+        time_str = f"2024-01-02 {9 + i // 3600 % 6:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+        if i % 2 == 0:
+            portfolio.buy_stock(symbol, 10.0 + rng.random(), 100, time_str)
+        else:
+            portfolio.sell_stock(symbol, 10.0 + rng.random(), 100, time_str)
+
+
+def bench_fetch(data: Dict[str, pd.DataFrame], repeat: int, workdir: str) -> Dict[str, Dict]:
+    symbols = list(data)
+    start = data[symbols[0]]['date'].min().strftime('%Y%m%d')
+    end = max(df['date'].max() for df in data.values()).strftime('%Y%m%d')
+    counter = iter(range(10 ** 9))
+    state = {}
+
+    def new_fetcher(cache_dir: str) -> DataFetcher:
+        fetcher = DataFetcher(start, end, symbols=symbols, cache=BarCache(provider=None, cache_dir=cache_dir))
+        fetcher.cache.provider = fetcher.download_history
+        return fetcher
+
+    def cold_setup():
+        state['fetcher'] = new_fetcher(os.path.join(workdir, f'cache_{next(counter)}'))
+
+    warm_dir = os.path.join(workdir, 'cache_warm')
+    new_fetcher(warm_dir).fetch_all_data(start, end)
+    return {
+        'fetch_all_data.cold': measure(lambda: state['fetcher'].fetch_all_data(start, end), repeat, cold_setup),
+        'fetch_all_data.warm': measure(lambda: new_fetcher(warm_dir).fetch_all_data(start, end), repeat),
+    }
+
+
+def bench_signals(data: Dict[str, pd.DataFrame], repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for strategy in create_strategies():
+        name = type(strategy).__name__
+        results[f'{name}.generate_signals'] = measure(
+            lambda: [strategy.generate_signals(df, symbol) for symbol, df in data.items()], repeat)
+    return results
+
+
+def bench_decide(data: Dict[str, pd.DataFrame], repeat: int) -> Dict[str, Dict]:
+    series = live_price_series(data)
+    portfolio = trading_portfolio(data)
+    results = {}
+    for strategy in create_strategies():
+        name = type(strategy).__name__
+        results[f'{name}.decide_trade'] = measure(lambda: strategy.decide_trade(data, portfolio, series), repeat)
+    combined = CombinedStrategy(create_strategies())
+    results['CombinedStrategy.decide_trade'] = measure(lambda: combined.decide_trade(data, portfolio, series), repeat)
+    results['CombinedStrategy.decide_trade_vectorized'] = measure(
+        lambda: combined.decide_trade_vectorized(data, portfolio, series), repeat)
+    return results
+
+
+def bench_backtest(data: Dict[str, pd.DataFrame], repeat: int, legacy: bool) -> Dict[str, Dict]:
+    results = {
+        'PanelBacktester.run_backtest': measure(
+            lambda: PanelBacktester(CombinedStrategy(create_strategies()), data, save_results=False).run_backtest(), repeat),
+    }
+    if legacy:
+        # 逐日拼接全部历史的旧引擎，耗时随交易日数平方增长，只在需要对比时运行
+        def run_legacy():
+            backtester = Backtester(CombinedStrategy(create_strategies()), {s: df.copy() for s, df in data.items()})
+            backtester._finalize = lambda portfolio, save=True: None
+            backtester.run_backtest()
+        results['Backtester.run_backtest'] = measure(run_legacy, repeat)
+    return results
+
+
+def bench_portfolio(data: Dict[str, pd.DataFrame], repeat: int, n_trades: int) -> Dict[str, Dict]:
+    symbols = list(data)
+    state = {}
+
+    def setup():
+        state['portfolio'] = trading_portfolio(data)
+
+    result = measure(lambda: simulate_trades(state['portfolio'], symbols, n_trades), repeat, setup)
+    result['per_trade'] = result['median'] / n_trades
+    return {f'Portfolio.buy_sell.{n_trades}': result}
+
+
+def bench_storage(data: Dict[str, pd.DataFrame], repeat: int, n_trades: int, workdir: str) -> Dict[str, Dict]:
+    portfolio = trading_portfolio(data)
+    simulate_trades(portfolio, list(data), n_trades)
+    state = portfolio._state()
+    results = {}
+
+    json_storage = Storage(os.path.join(workdir, 'portfolio.json'))
+    results['Storage.save'] = measure(lambda: json_storage.save(state), repeat)
+    results['Storage.load'] = measure(json_storage.load, repeat)
+
+    sqlite_storage = SQLiteStorage(os.path.join(workdir, 'portfolio.db'))
+
+    def sqlite_reset():
+        with sqlite_storage.conn:
+            sqlite_storage.conn.execute("DELETE FROM transactions")
+
+    results['SQLiteStorage.save'] = measure(lambda: sqlite_storage.save(state), repeat, sqlite_reset)
+    results['SQLiteStorage.load'] = measure(sqlite_storage.load, repeat)
+
+    # 日志型存储：逐笔追加，计时包含周期性快照
+    counter = iter(range(10 ** 9))
+    journal = {}
+
+    def journal_setup():
+        journal['portfolio'] = trading_portfolio(data, JournalStorage(os.path.join(workdir, f'journal_{next(counter)}.json')))
+
+    result = measure(lambda: simulate_trades(journal['portfolio'], list(data), n_trades), repeat, journal_setup)
+    result['per_trade'] = result['median'] / n_trades
+    results[f'JournalStorage.buy_sell.{n_trades}'] = result
+    journal_path = journal['portfolio'].storage.filepath
+    results['JournalStorage.load'] = measure(lambda: JournalStorage(journal_path), repeat)
+    return results
+
+
+SUITES = ('fetch', 'signals', 'decide', 'backtest', 'portfolio', 'storage')
+
+
+def run_scale(scale: str, args) -> List[Dict]:
+    n_symbols, n_days = parse_scale(scale)
+    data = generate_universe(n_symbols, n_days, seed=args.seed)
+    AKSHARE.universe = data
+    AKSHARE.latency = args.fetch_latency
+    suites = args.only or SUITES
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory(prefix='quant_bench_') as workdir:
+        for suite in suites:
+            print(f"[{scale}] {suite} ...", flush=True)
+            if suite == 'fetch':
+                results.update(bench_fetch(data, args.repeat, workdir))
+            elif suite == 'signals':
+                results.update(bench_signals(data, args.repeat))
+            elif suite == 'decide':
+                results.update(bench_decide(data, args.repeat))
+            elif suite == 'backtest':
+                results.update(bench_backtest(data, args.backtest_repeat, args.legacy))
+            elif suite == 'portfolio':
+                results.update(bench_portfolio(data, args.repeat, args.trades))
+            elif suite == 'storage':
+                results.update(bench_storage(data, args.repeat, args.trades, workdir))
+    return [{'name': name, 'scale': scale, 'n_symbols': n_symbols, 'n_days': n_days, **timing}
+            for name, timing in results.items()]
+
+
+def git_revision() -> Dict[str, object]:
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT_DIR,
+                                             text=True, stderr=subprocess.DEVNULL).strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {'commit': commit, 'dirty': dirty}
+
+
+def load_history(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_history(path: str, history: List[Dict]):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compare(current: List[Dict], previous: Optional[Dict]) -> pd.DataFrame:
+    """
+    与上一次运行逐项对比中位数耗时。
+
+    :return: 包含 scale、name、median、previous、ratio 列的 DataFrame
+    """
+    df = pd.DataFrame(current)[['scale', 'name', 'median']]
+    if previous is None:
+        df['previous'] = np.nan
+    else:
+        prev = pd.DataFrame(previous['results'])[['scale', 'name', 'median']].rename(columns={'median': 'previous'})
+        df = df.merge(prev, on=['scale', 'name'], how='left')
+    df['ratio'] = df['median'] / df['previous']
+    return df
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="量化交易系统离线性能基准")
+    parser.add_argument('--scales', nargs='+', default=DEFAULT_SCALES, help="规模列表，格式为 股票数x交易日数")
+    parser.add_argument('--only', nargs='+', choices=SUITES, help="只运行指定的基准组")
+    parser.add_argument('--repeat', type=int, default=3, help="每项基准的重复次数")
+    parser.add_argument('--backtest-repeat', type=int, default=1, help="回测基准的重复次数")
+    parser.add_argument('--trades', type=int, default=2000, help="组合与存储基准中模拟的交易笔数")
+    parser.add_argument('--seed', type=int, default=0, help="合成行情的随机种子")
+    parser.add_argument('--fetch-latency', type=float, default=0.0, help="模拟每次 akshare 调用的网络延迟（秒）")
+    parser.add_argument('--legacy', action='store_true', help="同时运行逐日拼接历史的旧回测引擎")
+    parser.add_argument('--history', default=HISTORY_FILE, help="结果历史文件")
+    parser.add_argument('--no-save', action='store_true', help="不写入历史文件")
+    args = parser.parse_args(argv)
+
+    # 基准只计时计算本身，关闭逐笔交易日志
+    logging.disable(logging.CRITICAL)
+
+    results = []
+    for scale in args.scales:
+        results.extend(run_scale(scale, args))
+
+    history = load_history(args.history)
+    report = compare(results, history[-1] if history else None)
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:.4f}'.format):
+        print(report.to_string(index=False))
+    regressions = report[report['ratio'] > REGRESSION_THRESHOLD]
+    if not regressions.empty:
+        print(f"\n{len(regressions)} 项耗时比上次运行增加超过 {REGRESSION_THRESHOLD - 1:.0%}：")
+        print(regressions.to_string(index=False))
+
+    if not args.no_save:
+        history.append({
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPU)",
+            'args': {key: value for key, value in vars(args).items() if key not in ('history', 'no_save')},
+            'results': results,
+        })
+        save_history(args.history, history)
+        print(f"\n结果已追加到 {args.history}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# benchmarks/synthetic.py
+
+import sys
+import time
+import types
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+
+def generate_universe(n_symbols: int, n_days: int, seed: int = 0, start_date: str = '2015-01-05',
+                      listing_fraction: float = 0.1, suspension_rate: float = 0.005) -> Dict[str, pd.DataFrame]:
+    """
+    生成可复现的合成日线行情，列与 DataFetcher 返回的数据一致。
+
+    收盘价为带随机漂移切换的几何布朗运动；部分股票在区间中途上市，另有少量随机停牌日，
+    用于覆盖回测引擎中股票之间交易日不一致的情况。
+
+    :param n_symbols: 股票数量
+    :param n_days: 交易日数量
+    :param seed: 随机种子，相同参数生成完全相同的数据
+    :param start_date: 第一个交易日
+    :param listing_fraction: 中途上市的股票比例
+    :param suspension_rate: 每个交易日停牌的概率
+    :return: 字典，键为六位股票代码，值为包含 date、open、close、high、low、volume、turnover、symbol 的 DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start_date, periods=n_days)
+
+    # 每 60 个交易日左右切换一次漂移，使均线和 RSI 都能产生信号
+    regimes = rng.normal(0, 0.001, (n_symbols, n_days // 60 + 1))
+    drift = np.repeat(regimes, 60, axis=1)[:, :n_days]
+    volatility = rng.uniform(0.01, 0.03, (n_symbols, 1))
+    returns = drift + volatility * rng.standard_normal((n_symbols, n_days))
+    close = rng.uniform(3, 80, (n_symbols, 1)) * np.exp(np.cumsum(returns, axis=1))
+    open_ = close * np.exp(volatility * 0.3 * rng.standard_normal((n_symbols, n_days)))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, (n_symbols, n_days)))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, (n_symbols, n_days)))
+    volume = rng.lognormal(13, 0.5, (n_symbols, n_days)).round()
+    turnover = volume * (high + low) / 2
+
+    first_day = np.where(rng.random(n_symbols) < listing_fraction, rng.integers(0, max(n_days // 2, 1), n_symbols), 0)
+    traded = rng.random((n_symbols, n_days)) >= suspension_rate
+
+    universe = {}
+    for i in range(n_symbols):
+        mask = traded[i].copy()
+        mask[:first_day[i]] = False
+        symbol = f'{i + 1:06d}'
+        universe[symbol] = pd.DataFrame({
+            'date': dates[mask],
+            'open': open_[i, mask],
+            'close': close[i, mask],
+            'high': high[i, mask],
+            'low': low[i, mask],
+            'volume': volume[i, mask],
+            'turnover': turnover[i, mask],
+            'symbol': symbol,
+        })
+    return universe
+
+
+class SyntheticAkshare:
+    """
+    akshare 的离线替身，只实现 DataFetcher 用到的接口，数据来自合成行情。
+
+    :param latency: 每次调用模拟的网络延迟（秒）
+    """
+
+    HISTORY_COLUMNS = {
+        'date': '日期', 'open': '开盘', 'close': '收盘', 'high': '最高',
+        'low': '最低', 'volume': '成交量', 'turnover': '成交额',
+    }
+
+    def __init__(self, universe: Optional[Dict[str, pd.DataFrame]] = None, latency: float = 0.0):
+        self.universe = universe or {}
+        self.latency = latency
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def stock_zh_a_hist(self, symbol: str, period: str = 'daily', start_date: str = '19700101', end_date: str = '20500101',
+                        adjust: str = '') -> pd.DataFrame:
+        self._wait()
+        df = self.universe[symbol]
+        mask = (df['date'] >= pd.Timestamp(start_date)) & (df['date'] <= pd.Timestamp(end_date))
+        df = df.loc[mask, list(self.HISTORY_COLUMNS)].rename(columns=self.HISTORY_COLUMNS)
+        df['日期'] = df['日期'].dt.strftime('%Y-%m-%d')
+        return df.reset_index(drop=True)
+
+    def index_stock_cons(self, symbol: str) -> pd.DataFrame:
+        self._wait()
+        return pd.DataFrame({'品种代码': list(self.universe)})
+
+    def stock_zh_a_spot_em(self) -> pd.DataFrame:
+        self._wait()
+        symbols: List[str] = list(self.universe)
+        return pd.DataFrame({'代码': symbols, '最新价': [self.universe[s]['close'].iat[-1] for s in symbols]})
+
+    def install(self) -> types.ModuleType:
+        """
+        以 akshare 的名义注册到 sys.modules，必须在导入 data.data_fetcher 之前调用。
+        """
+        module = types.ModuleType('akshare')
+        module.stock_zh_a_hist = self.stock_zh_a_hist
+        module.index_stock_cons = self.index_stock_cons
+        module.stock_zh_a_spot_em = self.stock_zh_a_spot_em
+        sys.modules['akshare'] = module
+        return module
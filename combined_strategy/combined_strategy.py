@@ -1,11 +1,15 @@
 # combined_strategy/combined_strategy.py
 
+import logging
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple
-from collections import OrderedDict
-from strategies.base_strategy import BaseStrategy
-from price_time_series_manager import PriceTimeSeriesManager
+from typing import List, Dict, Mapping, Optional, Tuple
+from strategies.base_strategy import BaseStrategy, stack_closes, stack_price_windows
+from strategies.indicator_cache import IndicatorCache
+from price_time_series_manager import PriceTimeSeriesManager, PriceRingBuffer
+from orders import OrderBatch, SYMBOL_DTYPE
 from config.config import STRATEGY_CONFIGS
+from utils.metrics import metrics
 
 class CombinedStrategy:
     def __init__(self, strategies: List[BaseStrategy]):
@@ -16,51 +20,136 @@ class CombinedStrategy:
         """
         self.strategies = strategies
         self.price_manager = PriceTimeSeriesManager()  # 初始化管理器
+        # 子策略共享的指标缓存，每个决策周期开始时清空
+        self.indicators = IndicatorCache()
+        for strategy in self.strategies:
+            strategy.indicators = self.indicators
+
+    @property
+    def bar_size(self) -> str:
+        """子策略共同的 bar 周期，不同周期的子策略不能组合"""
+        bar_sizes = {strategy.bar_size for strategy in self.strategies}
+        if len(bar_sizes) > 1:
+            raise ValueError(f"子策略的 bar 周期不一致: {', '.join(sorted(bar_sizes))}")
+        return bar_sizes.pop() if bar_sizes else 'daily'
+
+    def update(self, symbol: str, bar: Dict[str, float]):
+        """
+        将一根新 bar 增量推送给所有子策略。
+
+        :param symbol: 股票代码
+        :param bar: 包含 'close' 的 bar 字典，可带 bar 时间 'date'
+        """
+        for strategy in self.strategies:
+            strategy.update(symbol, bar)
+
+    def reset_state(self):
+        """清空所有子策略的增量指标状态"""
+        for strategy in self.strategies:
+            strategy.reset_state()
 
-    def decide_trade(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, OrderedDict]) -> Tuple[List[Dict], List[Dict]]:
+    def decide_trade(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, PriceRingBuffer]) -> Tuple[OrderBatch, OrderBatch]:
         """
         聚合所有子策略的买入和卖出交易，考虑策略权重。
 
         :param data: 所有股票的数据字典，键为股票代码，值为对应的DataFrame
         :param portfolio: 当前的投资组合
         :param price_time_series: 各股票的价格时序数据
-        :return: (买入交易列表, 卖出交易列表)
+        :return: (买入委托, 卖出委托)
         """
-        buy_trades_dict = {}
-        sell_trades_dict = {}
-
+        self.indicators.clear()
+        buy_batches, sell_batches = [], []
         for strategy in self.strategies:
-            trades_buy, trades_sell = strategy.decide_trade(data, portfolio, price_time_series)
-            strategy_weight = strategy.weight
-
-            for trade in trades_buy:
-                trade_symbol = trade['symbol']
-                weighted_quantity = int(trade['quantity'] * strategy_weight)
-                if trade_symbol in buy_trades_dict:
-                    buy_trades_dict[trade_symbol]['quantity'] += weighted_quantity
-                    buy_trades_dict[trade_symbol]['price'] = (buy_trades_dict[trade_symbol]['price'] + trade['price']) / 2
-                else:
-                    buy_trades_dict[trade_symbol] = {
-                        'symbol': trade_symbol,
-                        'price': trade['price'],
-                        'quantity': weighted_quantity
-                    }
-
-            for trade in trades_sell:
-                trade_symbol = trade['symbol']
-                weighted_quantity = int(trade['quantity'] * strategy_weight)
-                if trade_symbol in sell_trades_dict:
-                    sell_trades_dict[trade_symbol]['quantity'] += weighted_quantity
-                    sell_trades_dict[trade_symbol]['price'] = (sell_trades_dict[trade_symbol]['price'] + trade['price']) / 2
-                else:
-                    sell_trades_dict[trade_symbol] = {
-                        'symbol': trade_symbol,
-                        'price': trade['price'],
-                        'quantity': weighted_quantity
-                    }
-
-        # 转换为列表形式
-        merged_buy_trades = list(buy_trades_dict.values())
-        merged_sell_trades = list(sell_trades_dict.values())
-
-        return merged_buy_trades, merged_sell_trades
\ No newline at end of file
+            with metrics.span('strategy.decide_trade', strategy=type(strategy).__name__):
+                trades_buy, trades_sell = strategy.decide_trade(data, portfolio, price_time_series)
+            buy_batches.append(trades_buy)
+            sell_batches.append(trades_sell)
+
+        weights = [strategy.weight for strategy in self.strategies]
+        return OrderBatch.merge(buy_batches, weights), OrderBatch.merge(sell_batches, weights)
+
+    def decide_trade_batch(self, symbols: np.ndarray, closes: np.ndarray, last_prices: np.ndarray, recent_prices: np.ndarray,
+                           cash: float, holdings: np.ndarray, positions: Optional[List[np.ndarray]] = None) -> Tuple[OrderBatch, OrderBatch]:
+        """
+        横截面批量版本的 decide_trade，合并规则相同。
+
+        :param symbols: 股票代码数组，与以下各数组的行一一对应
+        :param closes: 股票 × 时间 的收盘价数组，至少包含各子策略 batch_lookback 中的最大值列；
+                       包含完整历史时信号与 decide_trade 逐位一致
+        :param last_prices: 每只股票的最新价格
+        :param recent_prices: 股票 × 时间 的最近价格时序，至少包含各子策略 trend_window 中的最大值列
+        :param cash: 当前现金
+        :param holdings: 每只股票的持仓数量
+        :param positions: 预先计算好的各子策略最新的 Position，与 strategies 一一对应，提供时不再由 closes 计算
+        :return: (买入委托, 卖出委托)
+        """
+        buy_batches, sell_batches = [], []
+        for i, strategy in enumerate(self.strategies):
+            with metrics.span('strategy.decide_trade_batch', strategy=type(strategy).__name__):
+                trades_buy, trades_sell = strategy.decide_trade_batch(symbols, closes, last_prices,
+                                                                      recent_prices[:, -strategy.trend_window:], cash, holdings,
+                                                                      None if positions is None else positions[i])
+            buy_batches.append(trades_buy)
+            sell_batches.append(trades_sell)
+
+        weights = [strategy.weight for strategy in self.strategies]
+        return OrderBatch.merge(buy_batches, weights), OrderBatch.merge(sell_batches, weights)
+
+    def decide_trade_vectorized(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, PriceRingBuffer]) -> Tuple[OrderBatch, OrderBatch]:
+        """
+        与 decide_trade 接口和结果相同，但所有股票的指标和下单数量一次性用数组计算，
+        适合股票数量较多的场景。
+
+        :param data: 所有股票的数据字典，键为股票代码，值为对应的DataFrame
+        :param portfolio: 当前的投资组合
+        :param price_time_series: 各股票的价格时序数据
+        :return: (买入委托, 卖出委托)
+        """
+        symbols = [symbol for symbol, df in data.items() if 'symbol' in df.columns and not df.empty]
+        # 使用完整历史，滚动均值的累积误差与 generate_signals 相同
+        lookback = max(max(strategy.batch_lookback for strategy in self.strategies), max((len(data[symbol]) for symbol in symbols), default=0))
+        trend_window = max(strategy.trend_window for strategy in self.strategies)
+
+        with metrics.span('strategy.stack_inputs'):
+            closes = stack_closes(data, symbols, lookback)
+            recent_prices, last_prices = stack_price_windows(price_time_series, symbols, trend_window)
+            holdings = np.array([portfolio.holdings.get(symbol, 0) for symbol in symbols], dtype=np.int64)
+        buys, sells = self.decide_trade_batch(np.array(symbols, dtype=SYMBOL_DTYPE), closes, last_prices, recent_prices,
+                                              portfolio.cash, holdings)
+        logging.info(f"批量决策完成：{len(symbols)} 只股票，买入 {len(buys)} 笔，卖出 {len(sells)} 笔。")
+        return buys, sells
+
+    def decide_trade_universe(self, store, portfolio, price_time_series: Dict[str, PriceRingBuffer],
+                              latest_prices: Optional[Mapping[str, float]] = None,
+                              symbols: Optional[List[str]] = None) -> Tuple[OrderBatch, OrderBatch]:
+        """
+        在全市场存储（UniverseStore）上批量决策：直接从内存映射中读取各股票的历史收盘价，不构建 DataFrame。
+        结果与对同样数据调用 decide_trade_vectorized 相同。
+
+        :param store: UniverseStore
+        :param portfolio: 当前的投资组合
+        :param price_time_series: 各股票的价格时序数据
+        :param latest_prices: 盘中最新价格，有效的价格作为最新一根 bar 接在历史收盘价之后
+        :param symbols: 参与决策的股票，默认为存储中的全部股票
+        :return: (买入委托, 卖出委托)
+        """
+        symbols = list(symbols) if symbols is not None else list(store.symbols)
+        # 使用完整历史，多留一列给盘中最新价格
+        lookback = max(max(strategy.batch_lookback for strategy in self.strategies), len(store) + 1)
+        trend_window = max(strategy.trend_window for strategy in self.strategies)
+
+        with metrics.span('strategy.stack_inputs'):
+            closes = store.last_valid('close', lookback, symbols)
+            if latest_prices:
+                prices = np.array([latest_prices.get(symbol, 0.0) for symbol in symbols], dtype=np.float64)
+                latest = prices > 0
+                closes[latest, :-1] = closes[latest, 1:]
+                closes[latest, -1] = prices[latest]
+            has_data = ~np.isnan(closes).all(axis=1)
+            symbols = [symbol for symbol, keep in zip(symbols, has_data) if keep]
+            recent_prices, last_prices = stack_price_windows(price_time_series, symbols, trend_window)
+            holdings = np.array([portfolio.holdings.get(symbol, 0) for symbol in symbols], dtype=np.int64)
+        buys, sells = self.decide_trade_batch(np.array(symbols, dtype=SYMBOL_DTYPE), closes[has_data], last_prices,
+                                              recent_prices, portfolio.cash, holdings)
+        logging.info(f"全市场批量决策完成：{len(symbols)} 只股票，买入 {len(buys)} 笔，卖出 {len(sells)} 笔。")
+        return buys, sells
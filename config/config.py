@@ -6,7 +6,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 LOG_FILE = os.path.join(BASE_DIR, '..', 'quant_trading_system.log')
 PORTFOLIO_FILE = os.path.join(BASE_DIR, '..', 'portfolio.json')
-BACKTRACE_FILE = os.path.join(BASE_DIR, '..', 'backtest_result.json')  # 确认路径
+BACKTRACE_FILE = os.path.join(BASE_DIR, '..', 'backtest_result.npz')  # 列式回测结果，含 JSON 摘要头
 
 INITIAL_CASH = 100000
 
@@ -37,4 +37,77 @@ STRATEGY_CONFIGS = [
             'sell_pct': 0.3
         }
     }
-]
\ No newline at end of file
+]
+
+# 回测分析配置
+TRADING_DAYS_PER_YEAR = 252  # 年化收益、波动率和夏普比率使用的年交易日数
+RISK_FREE_RATE = 0.0  # 计算夏普比率的年化无风险利率
+
+# 参数扫描配置
+SWEEP_MAX_WORKERS = None  # 并行进程数，None 表示使用全部 CPU 核心
+
+# 本地行情缓存目录
+DATA_CACHE_DIR = os.path.join(BASE_DIR, '..', 'data_cache')
+
+# 分钟行情（data/minute_bars.py）
+TRADING_SESSIONS = [('09:30', '11:30'), ('13:00', '15:00')]  # A 股连续竞价时段，分钟 bar 按时段内的分钟数分桶
+MINUTE_BAR_DIR = os.path.join(DATA_CACHE_DIR, 'minute')  # 1 分钟 bar 的本地存储目录，更粗的周期按需重采样
+RESAMPLE_CACHE_SIZE = 256  # 内存中缓存的重采样结果个数（股票 × 周期）
+
+# 股票池
+SYMBOL_UNIVERSE = 'hot'  # 'hot'：热门指数成分股；'all'：全部 A 股（约 5000 只，历史行情写入 UNIVERSE_STORE_DIR）
+SYMBOL_LIMIT = None  # 股票数量上限，None 表示不限
+
+# 全市场日线存储（data/universe_store.py）：日期 × 股票 的内存映射数组
+UNIVERSE_STORE_DIR = os.path.join(DATA_CACHE_DIR, 'universe')
+UNIVERSE_MAX_SYMBOLS = 6000  # 列数上限，新股按需分配列号
+UNIVERSE_DATE_CHUNK = 256  # 日期轴按该行数整块扩容，避免每个交易日都重写文件
+UNIVERSE_FETCH_CHUNK = 200  # 写入存储时每批下载的股票数，内存中最多同时保留这么多只股票的 DataFrame
+
+# 全市场实时行情快照的缓存时间（秒），期间重复获取价格复用同一份快照
+SPOT_SNAPSHOT_TTL = 5
+
+# 行情下载配置
+FETCH_CONCURRENCY = 8  # 并发下载的股票数上限
+FETCH_MAX_ATTEMPTS = 5  # 单次请求的最大尝试次数
+FETCH_BACKOFF_BASE = 0.5  # 指数退避的初始等待时间（秒）
+FETCH_BACKOFF_MAX = 8.0  # 单次退避的最长等待时间（秒）
+FETCH_SYMBOL_DEADLINE = 60.0  # 单只股票下载（含重试）的最长时间（秒）
+
+# 持仓日志每累计多少笔交易写一次快照
+JOURNAL_SNAPSHOT_INTERVAL = 500
+
+# 持仓存储方式：'json'（单个 JSON 文件）、'journal'（快照 + 追加日志）、'sqlite'（SQLite 数据库）
+STORAGE_BACKEND = 'journal'
+PORTFOLIO_DB_FILE = os.path.join(BASE_DIR, '..', 'portfolio.db')
+
+# 跨进程共享价格存储
+SHARED_PRICE_STORE_NAME = 'quant_trading_prices'  # 共享内存名，行情进程创建，其他进程只读挂载
+SHARED_PRICE_STORE_MAX_SYMBOLS = 6000  # 最多容纳的股票数
+SHARED_PRICE_STORE_CAPACITY = 100  # 每只股票保留的价格个数
+SHARED_PRICE_READ_RETRIES = 1000  # 读者遇到写入中的数据时最多重读的次数，超过后认为写进程已异常退出
+
+# 性能统计
+METRICS_ENABLED = True  # 关闭后计时与计数几乎没有开销
+METRICS_PROMETHEUS_FILE = os.path.join(BASE_DIR, '..', 'metrics.prom')  # Prometheus 文本格式导出文件
+METRICS_JSONL_FILE = os.path.join(BASE_DIR, '..', 'metrics.jsonl')  # 每次运行追加一行统计快照
+
+# 后台信号服务（daemon.py）
+SIGNAL_STORE_FILE = os.path.join(BASE_DIR, '..', 'signals.json')  # 后台服务发布、界面只读的信号文件
+DAEMON_HISTORY_START = '20220101'  # 常驻内存的历史行情起始日期
+DAEMON_SIGNAL_INTERVAL = 300  # 交易时段内计算信号的间隔（秒）
+DAEMON_HISTORY_REFRESH_TIME = '08:45'  # 每天刷新历史行情的时间
+DAEMON_TRADING_SESSIONS = TRADING_SESSIONS  # 只在这些时段内计算信号
+DAEMON_PRICE_FEED = True  # 是否在后台服务中运行盘中行情轮询（data/price_feed.py）
+
+# 盘中行情轮询（data/price_feed.py）
+PRICE_FEED_INTERVAL = 3.0  # 轮询间隔（秒），单次获取超过该时间即放弃
+PRICE_FEED_MAX_PENDING = 4  # 等待写入价格时序的批次上限，超出时丢弃最旧的一批
+
+# 滚动前向（walk-forward）回测配置
+WALK_FORWARD_TRAIN_DAYS = 250  # 样本内窗口的交易日数
+WALK_FORWARD_TEST_DAYS = 60  # 样本外窗口的交易日数，也是窗口滚动的步长
+WALK_FORWARD_METRIC = 'sharpe'  # 样本内选参的指标，取值越大越好
+
+# 事件驱动回测（backtest/event_backtester.py）
+EVENT_STREAM_CHUNK = 4096  # bar 流每次读入并转换的 bar 数，内存占用与总 bar 数无关
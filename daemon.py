@@ -0,0 +1,253 @@
+# daemon.py
+"""
+后台交易信号服务：常驻内存保存历史行情、策略和价格时序，按计划计算交易信号并发布到信号文件，
+Streamlit 界面只读取该文件，不再在页面请求中执行 获取数据 → 初始化策略 → decide_trade 的整条流程。
+
+在项目根目录下运行：
+    python daemon.py
+    python daemon.py --interval 60 --always
+    python daemon.py --once
+"""
+
+import sys
+import time
+import signal
+import logging
+import argparse
+import schedule
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from portfolio.portfolio import Portfolio
+from storage.storage import create_storage
+from storage.signal_store import SignalStore
+from data.data_fetcher import DataFetcher
+from data.price_feed import PriceFeed, AkshareQuoteSource
+from data.universe_store import UniverseStore
+from factories.strategy_factory import StrategyFactory
+from combined_strategy.combined_strategy import CombinedStrategy
+from price_time_series_manager import PriceTimeSeriesManager
+from shared_price_store import SharedPriceStore
+from utils.logger import setup_logger
+from utils.metrics import metrics
+from config.config import (STRATEGY_CONFIGS, INITIAL_CASH, SHARED_PRICE_STORE_NAME, SHARED_PRICE_STORE_MAX_SYMBOLS,
+                           SHARED_PRICE_STORE_CAPACITY, METRICS_PROMETHEUS_FILE, DAEMON_HISTORY_START,
+                           DAEMON_SIGNAL_INTERVAL, DAEMON_HISTORY_REFRESH_TIME, DAEMON_TRADING_SESSIONS,
+                           DAEMON_PRICE_FEED, SYMBOL_UNIVERSE)
+
+
+def in_trading_session(now: datetime, sessions: List[Tuple[str, str]] = DAEMON_TRADING_SESSIONS) -> bool:
+    """
+    :param now: 当前时间
+    :param sessions: 交易时段列表，元素为 ('HH:MM', 'HH:MM')
+    :return: 是否为工作日且处于某个交易时段内
+    """
+    if now.weekday() >= 5:
+        return False
+    current = now.strftime("%H:%M")
+    return any(start <= current <= end for start, end in sessions)
+
+
+def with_latest_prices(history: Dict[str, pd.DataFrame], prices: Dict[str, float], timestamp: str) -> Dict[str, pd.DataFrame]:
+    """
+    在历史行情末尾追加一行最新价格，返回新的字典，不修改常驻内存的历史行情。
+
+    :param history: 历史行情
+    :param prices: 最新价格
+    :param timestamp: 最新价格的时间
+    """
+    data = {}
+    date = pd.to_datetime(timestamp)
+    for symbol, df in history.items():
+        price = prices.get(symbol, 0.0)
+        if price > 0:
+            row = pd.DataFrame([{'date': date, 'open': price, 'close': price, 'high': price, 'low': price,
+                                 'volume': 0, 'turnover': 0.0, 'symbol': symbol}])
+            df = pd.concat([df, row], ignore_index=True)
+        data[symbol] = df
+    return data
+
+
+class TradingDaemon:
+    """
+    常驻的信号计算服务。
+
+    启动时加载一次历史行情并构建策略，之后每天定时增量刷新历史行情（BarCache 只下载缺失的日期），
+    交易时段内按固定间隔获取最新价格、写入价格时序并计算信号。作为行情进程创建共享价格存储，
+    界面进程以只读方式挂载，可以看到同一份价格时序。
+
+    股票池为全部 A 股（SYMBOL_UNIVERSE = 'all'）时，历史行情写入全市场存储（UniverseStore）而不常驻内存，
+    每轮只从中读取各股票最近的收盘价做批量决策。
+    """
+
+    def __init__(self, store: Optional[SignalStore] = None, interval: int = DAEMON_SIGNAL_INTERVAL,
+                 always: bool = False, share_prices: bool = True, price_feed: bool = DAEMON_PRICE_FEED,
+                 universe: bool = SYMBOL_UNIVERSE == 'all'):
+        """
+        :param store: 信号文件，默认使用 SIGNAL_STORE_FILE
+        :param interval: 计算信号的间隔（秒）
+        :param always: 是否忽略交易时段，任何时间都计算信号
+        :param share_prices: 是否创建跨进程共享价格存储
+        :param price_feed: 是否在后台线程中轮询盘中行情，持续写入价格时序
+        :param universe: 是否使用全市场存储保存历史行情
+        """
+        self.store = store or SignalStore()
+        self.interval = interval
+        self.always = always
+        self.fetcher = DataFetcher(start_date=DAEMON_HISTORY_START, end_date=datetime.now().strftime("%Y%m%d"))
+        self.portfolio = Portfolio(initial_cash=INITIAL_CASH, storage=create_storage(), data_fetcher=self.fetcher,
+                                   simulate_costs=False)
+        self.price_manager = PriceTimeSeriesManager()
+        self.shared_store: Optional[SharedPriceStore] = None
+        if share_prices:
+            try:
+                self.shared_store = SharedPriceStore.create(SHARED_PRICE_STORE_NAME, SHARED_PRICE_STORE_MAX_SYMBOLS,
+                                                            SHARED_PRICE_STORE_CAPACITY)
+                self.price_manager.use_shared_store(self.shared_store)
+            except FileExistsError:
+                logging.warning("共享价格存储已存在（可能有另一个行情进程在运行），使用进程内价格时序。")
+        self.strategy = CombinedStrategy([
+            StrategyFactory.get_strategy(cfg['name'], weight=cfg.get('weight', 1.0), **cfg['params']) for cfg in STRATEGY_CONFIGS
+        ])
+        self.history: Dict[str, pd.DataFrame] = {}
+        self.universe: Optional[UniverseStore] = UniverseStore() if universe else None
+        self.feed: Optional[PriceFeed] = None
+        if price_feed:
+            self.feed = PriceFeed(AkshareQuoteSource(self.fetcher), [], self.price_manager,
+                                  active=lambda: self.always or in_trading_session(datetime.now()))
+        self.scheduler = schedule.Scheduler()
+        self._running = False
+
+    def refresh_history(self):
+        """重新加载截至今天的历史行情"""
+        end_date = datetime.now().strftime("%Y%m%d")
+        self.fetcher.end_date = end_date
+        if self.universe is not None:
+            with metrics.span('daemon.refresh_history'):
+                self.fetcher.update_universe(self.universe, start_date=DAEMON_HISTORY_START, end_date=end_date)
+            if self.feed is not None:
+                self.feed.symbols = list(self.universe.symbols)
+            logging.info(f"后台服务已更新全市场存储，共 {len(self.universe.symbols)} 只股票。")
+            return
+        with metrics.span('daemon.refresh_history'):
+            history = self.fetcher.fetch_all_data(start_date=DAEMON_HISTORY_START, end_date=end_date)
+        if history:
+            self.history = history
+            if self.feed is not None:
+                self.feed.symbols = list(history)
+        logging.info(f"后台服务已加载 {len(self.history)} 只股票的历史行情。")
+
+    def run_cycle(self, force: bool = False) -> Optional[Dict]:
+        """
+        计算一轮交易信号并发布。
+
+        :param force: 是否忽略交易时段
+        :return: 发布的内容，跳过时返回 None
+        """
+        if not (force or self.always or in_trading_session(datetime.now())):
+            return None
+        started = time.perf_counter()
+        steps = metrics.stages('daemon.step')
+        try:
+            if not (self.universe.symbols if self.universe is not None else self.history):
+                steps.start('0_load_history')
+                self.refresh_history()
+
+            # 持仓可能已在界面中变化，每轮重新读取
+            steps.start('1_load_portfolio')
+            self.portfolio.load_portfolio()
+
+            steps.start('2_update_prices')
+            symbols = list(self.universe.symbols if self.universe is not None else self.history)
+            current_prices = self.fetcher.fetch_current_prices(symbols)
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # 运行盘中行情轮询时价格时序由轮询写入，这里不再重复写入
+            if self.feed is None or not self.feed.running:
+                self.price_manager.add_prices(timestamp, current_prices)
+            # 只更新内存中的最新价格，不写回持仓，持仓文件只由界面写入
+            self.portfolio.latest_prices.update(current_prices)
+
+            steps.start('3_decide_trade')
+            if self.universe is not None:
+                buy_trades, sell_trades = self.strategy.decide_trade_universe(self.universe, self.portfolio,
+                                                                              self.price_manager.get_all_series(), current_prices)
+            else:
+                data = with_latest_prices(self.history, current_prices, timestamp)
+                buy_trades, sell_trades = self.strategy.decide_trade_vectorized(data, self.portfolio,
+                                                                                self.price_manager.get_all_series())
+
+            steps.start('4_publish')
+            content = self.store.publish(buy_trades, sell_trades, num_symbols=len(symbols),
+                                         duration=time.perf_counter() - started)
+            metrics.inc('daemon.runs', result='success')
+            logging.info(f"后台服务第 {content['run_id']} 轮信号已发布，买入 {len(buy_trades)} 个，卖出 {len(sell_trades)} 个。")
+            return content
+        except Exception as e:
+            logging.error(f"后台服务计算信号时发生错误: {e}")
+            metrics.inc('daemon.runs', result='error')
+            return self.store.publish_error(str(e), duration=time.perf_counter() - started)
+        finally:
+            steps.finish()
+            if metrics.enabled:
+                try:
+                    metrics.export_prometheus(METRICS_PROMETHEUS_FILE)
+                except OSError as e:
+                    logging.warning(f"性能统计导出失败: {e}")
+
+    def run(self):
+        """预热后按计划运行，直到 stop 被调用或收到 SIGINT/SIGTERM"""
+        self._running = True
+        self.refresh_history()
+        if self.feed is not None:
+            self.feed.start_in_thread()
+        self.scheduler.every().day.at(DAEMON_HISTORY_REFRESH_TIME).do(self.refresh_history)
+        self.scheduler.every(self.interval).seconds.do(self.run_cycle)
+        self.run_cycle()
+        logging.info(f"后台服务已启动，每 {self.interval} 秒计算一次信号。")
+        while self._running:
+            self.scheduler.run_pending()
+            idle = self.scheduler.idle_seconds
+            time.sleep(min(max(idle, 0.0), 1.0) if idle is not None else 1.0)
+
+    def stop(self, *_):
+        self._running = False
+
+    def close(self):
+        """停止行情轮询并释放共享价格存储"""
+        if self.feed is not None:
+            self.feed.stop()
+            self.feed.join(timeout=10)
+        if self.shared_store is not None:
+            self.price_manager.use_shared_store(None)
+            self.shared_store.close()
+            self.shared_store.unlink()
+            self.shared_store = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="量化交易系统后台信号服务")
+    parser.add_argument('--interval', type=int, default=DAEMON_SIGNAL_INTERVAL, help="计算信号的间隔（秒）")
+    parser.add_argument('--always', action='store_true', help="忽略交易时段，任何时间都计算信号")
+    parser.add_argument('--once', action='store_true', help="只计算一轮信号后退出")
+    parser.add_argument('--no-shared-prices', action='store_true', help="不创建跨进程共享价格存储")
+    parser.add_argument('--no-price-feed', action='store_true', help="不运行盘中行情轮询")
+    args = parser.parse_args(argv)
+
+    setup_logger()
+    daemon = TradingDaemon(interval=args.interval, always=args.always, share_prices=not args.no_shared_prices,
+                           price_feed=DAEMON_PRICE_FEED and not args.no_price_feed)
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    try:
+        if args.once:
+            daemon.refresh_history()
+            content = daemon.run_cycle(force=True)
+            return 0 if content and content.get('status') == 'ok' else 1
+        daemon.run()
+    finally:
+        daemon.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
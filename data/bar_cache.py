@@ -0,0 +1,137 @@
+# data/bar_cache.py
+
+import os
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+from config.config import DATA_CACHE_DIR
+from utils.metrics import metrics
+
+# 下载函数：(symbol, start_date, end_date, adjust) -> 英文列名的历史数据 DataFrame
+HistoryProvider = Callable[[str, str, str, str], pd.DataFrame]
+
+
+class BarCache:
+    """
+    本地日线行情缓存，每只股票、每种复权方式一个 npz 列式文件。
+
+    文件中除行情列外还记录已覆盖的日期区间，请求时只下载区间外缺失的部分并合并回缓存。
+    前复权（qfq）的历史价格会随除权除息整体改变，因此不做缓存。
+    """
+
+    COLUMNS = ('open', 'close', 'high', 'low', 'volume', 'turnover')
+    DEFAULT_START = '19700101'
+    DEFAULT_END = '20500101'
+
+    def __init__(self, provider: HistoryProvider, cache_dir: str = DATA_CACHE_DIR):
+        """
+        :param provider: 缺失数据的下载函数，离线测试时可传入桩函数
+        :param cache_dir: 缓存目录
+        """
+        self.provider = provider
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, symbol: str, adjust: str) -> str:
+        return os.path.join(self.cache_dir, f"{symbol}_{adjust or 'bfq'}.npz")
+
+    def load(self, symbol: str, adjust: str) -> Tuple[Optional[pd.DataFrame], Optional[str], Optional[str]]:
+        """
+        读取缓存。
+
+        :param symbol: 股票代码
+        :param adjust: 复权方式
+        :return: (历史数据, 已覆盖的开始日期, 已覆盖的结束日期)，无缓存时均为 None
+        """
+        path = self._path(symbol, adjust)
+        if not os.path.exists(path):
+            return None, None, None
+        try:
+            with np.load(path) as npz:
+                df = pd.DataFrame({'date': npz['date'].view('datetime64[ns]')})
+                for column in self.COLUMNS:
+                    df[column] = npz[column]
+                covered_start, covered_end = str(npz['covered_start']), str(npz['covered_end'])
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f"行情缓存 {path} 读取失败，将重新下载: {e}")
+            return None, None, None
+        df['symbol'] = symbol
+        return df, covered_start, covered_end
+
+    def save(self, symbol: str, adjust: str, df: pd.DataFrame, covered_start: str, covered_end: str):
+        """
+        写入缓存，先写临时文件再替换，避免中途崩溃留下损坏的文件。
+        """
+        path = self._path(symbol, adjust)
+        columns = {
+            column: df[column].to_numpy(dtype=np.float64) if column in df.columns else np.full(len(df), np.nan)
+            for column in self.COLUMNS
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, date=df['date'].values.astype('datetime64[ns]').view(np.int64),
+                     covered_start=np.array(covered_start), covered_end=np.array(covered_end), **columns)
+        os.replace(tmp_path, path)
+
+    def _normalize(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+        """只保留缓存的列，保证命中缓存与直接下载时返回的结构一致"""
+        # 没有 bar 时数据源可能返回不带列的空表
+        dates = pd.to_datetime(df['date']).values if 'date' in df.columns else np.array([], dtype='datetime64[ns]')
+        columns = {'date': dates}
+        for column in self.COLUMNS:
+            columns[column] = df[column].to_numpy(dtype=np.float64) if column in df.columns else np.full(len(df), np.nan)
+        normalized = pd.DataFrame(columns)
+        normalized['symbol'] = symbol
+        return normalized
+
+    def get(self, symbol: str, start_date: Optional[str], end_date: Optional[str], adjust: str) -> pd.DataFrame:
+        """
+        获取指定区间的历史数据，只下载缓存未覆盖的部分。
+
+        :param symbol: 股票代码
+        :param start_date: 开始日期，格式 'YYYYMMDD'，None 表示不限
+        :param end_date: 结束日期，格式 'YYYYMMDD'，None 表示不限
+        :param adjust: 复权方式
+        :return: 按日期排序的历史数据 DataFrame
+        """
+        start_date = start_date or self.DEFAULT_START
+        end_date = end_date or self.DEFAULT_END
+        if adjust == 'qfq':
+            metrics.inc('bar_cache.requests', result='bypass')
+            return self.provider(symbol, start_date, end_date, adjust)
+
+        # 今天的行情可能尚未收盘，不计入已覆盖区间，下次请求时会重新下载
+        today = datetime.now().strftime("%Y%m%d")
+        coverable_end = min(end_date, _shift(today, -1))
+
+        cached, covered_start, covered_end = self.load(symbol, adjust)
+        if cached is None:
+            metrics.inc('bar_cache.requests', result='miss')
+            df = self._normalize(symbol, self.provider(symbol, start_date, end_date, adjust))
+            # 开始日期晚于昨天时没有可覆盖的日期，记录为空区间 [start_date, start_date - 1]
+            self.save(symbol, adjust, df, start_date, max(coverable_end, _shift(start_date, -1)))
+            return df
+
+        parts = [cached]
+        if start_date < covered_start:
+            parts.insert(0, self._normalize(symbol, self.provider(symbol, start_date, _shift(covered_start, -1), adjust)))
+        if end_date > covered_end:
+            parts.append(self._normalize(symbol, self.provider(symbol, _shift(covered_end, 1), end_date, adjust)))
+
+        metrics.inc('bar_cache.requests', result='partial' if len(parts) > 1 else 'hit')
+        if len(parts) > 1:
+            merged = pd.concat([part for part in parts if not part.empty] or [cached], ignore_index=True)
+            merged = merged.drop_duplicates(subset='date', keep='last').sort_values(by='date', ignore_index=True)
+            self.save(symbol, adjust, merged, min(start_date, covered_start), max(coverable_end, covered_end))
+            logging.info(f"行情缓存 {symbol} 已补齐至 {end_date}。")
+        else:
+            merged = cached
+
+        mask = (merged['date'] >= pd.Timestamp(start_date)) & (merged['date'] <= pd.Timestamp(end_date))
+        return merged[mask].reset_index(drop=True)
+
+
+def _shift(date: str, days: int) -> str:
+    return (datetime.strptime(date, "%Y%m%d") + timedelta(days=days)).strftime("%Y%m%d")
@@ -3,8 +3,18 @@
 import akshare as ak
 import pandas as pd
 import logging
-from typing import List, Dict
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Optional
 from price_time_series_manager import PriceTimeSeriesManager
+from data.bar_cache import BarCache
+from data.minute_bars import MinuteBarStore, BAR_SIZES, is_intraday, resample_frame
+from utils.retry import retry_call
+from utils.metrics import metrics
+from config.config import (SPOT_SNAPSHOT_TTL, FETCH_CONCURRENCY, FETCH_SYMBOL_DEADLINE, SYMBOL_UNIVERSE, SYMBOL_LIMIT,
+                           UNIVERSE_FETCH_CHUNK)
 
 class DataFetcher:
     # 定义列名映射，将中文列名映射为英文
@@ -30,22 +40,46 @@ class DataFetcher:
         # 添加其他需要映射的列
     }
 
-    def __init__(self, start_date: str, end_date: str, period: str = 'daily', adjust: str = 'hfq', hot_indices: List[str] = None):
+    COLUMN_MAPPING_MINUTE = {
+        '时间': 'date',
+        '开盘': 'open',
+        '收盘': 'close',
+        '最高': 'high',
+        '最低': 'low',
+        '成交量': 'volume',
+        '成交额': 'turnover',
+    }
+
+    def __init__(self, start_date: str, end_date: str, period: str = 'daily', adjust: str = 'hfq', hot_indices: List[str] = None,
+                 symbols: List[str] = None, cache: Optional[BarCache] = None, minute_store: Optional[MinuteBarStore] = None):
         """
         初始化 DataFetcher
 
         :param start_date: 数据开始日期，格式 'YYYYMMDD'
         :param end_date: 数据结束日期，格式 'YYYYMMDD'
-        :param period: 数据周期，如 'daily', 'weekly' 等
+        :param period: bar 周期：'daily'、'weekly'、'monthly'，或分钟周期 '1'、'5'、'15'、'30'、'60'。
+                       周线、月线由日线重采样，分钟周期由本地存储的 1 分钟 bar 重采样（不复权）
         :param adjust: 复权方式，如 'hfq'（后复权）, 'qfq'（前复权）, 'bfq'（不复权）
         :param hot_indices: 热门指数列表，默认为 ['000300', '399005', '399006']
+        :param symbols: 指定股票代码列表，默认按 SYMBOL_UNIVERSE 取热门指数成分股或全部 A 股
+        :param cache: 本地行情缓存，默认在 DATA_CACHE_DIR 下缓存通过 akshare 下载的数据
+        :param minute_store: 本地 1 分钟行情存储，默认在 MINUTE_BAR_DIR 下
         """
+        if period not in BAR_SIZES:
+            raise ValueError(f"未知的数据周期: {period}，可选: {', '.join(BAR_SIZES)}")
         self.start_date = start_date
         self.end_date = end_date
         self.period = period
         self.adjust = adjust
         self.hot_indices = hot_indices if hot_indices else ["000300", "399005", "399006"]
-        self.symbols = self.get_hot_symbols()[:30]  # 限制前10只股票
+        self.symbols = symbols if symbols is not None else self.get_universe_symbols()
+        self.cache = cache if cache is not None else BarCache(provider=self.download_history)
+        self.minute_store = minute_store if minute_store is not None else MinuteBarStore(provider=self.download_minutes)
+        # 全市场实时行情快照缓存：(获取时间, 代码 -> 最新价)
+        self._spot_snapshot: Optional[pd.Series] = None
+        self._spot_snapshot_time = 0.0
+        self._spot_lock = threading.Lock()
+        self.failed_symbols: Dict[str, str] = {}  # 最近一次 fetch_all_data 失败的股票及原因
         # 初始化 PriceTimeSeriesManager
         self.price_manager = PriceTimeSeriesManager()
 
@@ -57,21 +91,79 @@ class DataFetcher:
         """
         all_symbols = set()
         for index_code in self.hot_indices:
-            while True:
-                try:
-                    index_df = ak.index_stock_cons(symbol=index_code)
-                    # 重命名列
-                    index_df.rename(columns=self.COLUMN_MAPPINGS_INDEX_CONS, inplace=True)
-
-                    if 'symbol_code' in index_df.columns:
-                        symbols = index_df['symbol_code'].str.strip().tolist()
-                        logging.info(f"从指数 {index_code} 获取到 {len(symbols)} 只股票代码。")
-                        all_symbols.update(symbols)
-                    break
-                except Exception as e:
-                    pass
+            try:
+                with metrics.span('akshare.call', api='index_stock_cons'):
+                    index_df = retry_call(ak.index_stock_cons, symbol=index_code, description=f"获取指数 {index_code} 成分股")
+            except Exception as e:
+                logging.error(f"获取指数 {index_code} 的成分股失败: {e}")
+                continue
+            # 重命名列
+            index_df.rename(columns=self.COLUMN_MAPPINGS_INDEX_CONS, inplace=True)
+
+            if 'symbol_code' in index_df.columns:
+                symbols = index_df['symbol_code'].str.strip().tolist()
+                logging.info(f"从指数 {index_code} 获取到 {len(symbols)} 只股票代码。")
+                all_symbols.update(symbols)
         return list(all_symbols)
 
+    def get_universe_symbols(self, universe: str = SYMBOL_UNIVERSE, limit: Optional[int] = SYMBOL_LIMIT) -> List[str]:
+        """
+        获取股票池。
+
+        :param universe: 'hot' 为热门指数成分股，'all' 为全市场快照中的全部 A 股
+        :param limit: 股票数量上限，None 表示不限
+        :return: 股票代码列表
+        """
+        if universe == 'all':
+            symbols = sorted(self.fetch_spot_snapshot().index)
+        elif universe == 'hot':
+            symbols = self.get_hot_symbols()
+        else:
+            raise ValueError(f"未知的股票池: {universe}")
+        return symbols[:limit] if limit is not None else symbols
+
+    def fetch_spot_snapshot(self) -> pd.Series:
+        """
+        获取全市场实时行情快照，按股票代码索引。
+
+        SPOT_SNAPSHOT_TTL 秒内的重复调用直接复用上一次的快照；下载失败时沿用上一次的快照，
+        从未成功过则返回空 Series。
+
+        :return: 以股票代码为索引、最新价为值的 Series
+        """
+        with self._spot_lock:
+            if self._spot_snapshot is not None and time.monotonic() - self._spot_snapshot_time < SPOT_SNAPSHOT_TTL:
+                return self._spot_snapshot
+            try:
+                with metrics.span('akshare.call', api='stock_zh_a_spot_em'):
+                    spot_df = retry_call(ak.stock_zh_a_spot_em, deadline=FETCH_SYMBOL_DEADLINE, description="获取实时行情快照")
+            except Exception as e:
+                logging.error(f"获取实时行情快照失败: {e}")
+                return self._spot_snapshot if self._spot_snapshot is not None else pd.Series(dtype=float)
+            spot_df = spot_df.rename(columns=self.COLUMN_MAPPINGS_SPOT)
+            snapshot = pd.Series(pd.to_numeric(spot_df['latest_price'], errors='coerce').to_numpy(dtype=float),
+                                 index=spot_df['symbol'].astype(str).str.strip())
+            self._spot_snapshot = snapshot[~snapshot.index.duplicated(keep='first')]
+            self._spot_snapshot_time = time.monotonic()
+            return self._spot_snapshot
+
+    def fetch_current_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        批量获取股票的最新价格，只下载一次全市场快照。
+
+        :param symbols: 股票代码列表
+        :return: 股票代码到最新价格的字典，未找到的股票价格为 0.0
+        """
+        snapshot = self.fetch_spot_snapshot()
+        prices = {}
+        for symbol in symbols:
+            if symbol in snapshot.index:
+                prices[symbol] = float(snapshot[symbol])
+            else:
+                logging.warning(f"未找到股票代码 {symbol} 的最新价格。")
+                prices[symbol] = 0.0
+        return prices
+
     def fetch_current_price(self, symbol: str) -> float:
         """
         获取指定股票的最新价格。
@@ -79,39 +171,148 @@ class DataFetcher:
         :param symbol: 股票代码
         :return: 最新价格
         """
-        while True:
-            try:
-                stock_zh_a_spot_df = ak.stock_zh_a_spot_em()
-                stock_info = stock_zh_a_spot_df[stock_zh_a_spot_df['代码'] == symbol]
-                if not stock_info.empty:
-                    latest_price = stock_info.iloc[0]['最新价']
-                    return float(latest_price)
-                else:
-                    logging.warning(f"未找到股票代码 {symbol} 的最新价格。")
-                    return 0.0
-            except Exception as e:
-                pass
+        return self.fetch_current_prices([symbol])[symbol]
+
+    @staticmethod
+    def _empty_bars(column_mapping: Dict[str, str], symbol: Optional[str] = None) -> pd.DataFrame:
+        """
+        没有 bar 时返回的空表，列与正常下载的结果一致。
+
+        :param column_mapping: 下载结果的列名映射
+        :param symbol: 股票代码，提供时包含 symbol 列
+        """
+        columns = {name: pd.Series(dtype='datetime64[ns]' if name == 'date' else 'float64') for name in column_mapping.values()}
+        if symbol is not None:
+            columns['symbol'] = pd.Series(dtype='object')
+        return pd.DataFrame(columns)
 
-    def fetch_all_data(self, start_date: str = None, end_date: str = None) -> Dict[str, pd.DataFrame]:
+    def download_history(self, symbol: str, start_date: str, end_date: str, adjust: str) -> pd.DataFrame:
         """
-        获取所有股票的历史数据。
+        通过 akshare 下载单只股票的历史数据并统一列名。
 
+        :param symbol: 股票代码
         :param start_date: 开始日期，格式 'YYYYMMDD'
         :param end_date: 结束日期，格式 'YYYYMMDD'
+        :param adjust: 复权方式
+        :return: 按日期排序的历史数据 DataFrame
+        """
+        with metrics.span('akshare.call', api='stock_zh_a_hist'):
+            stock_df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust=adjust)
+        if stock_df.empty:
+            # 区间内没有交易日（周末、节假日）时数据源返回不带列的空表，按没有新 bar 处理
+            return self._empty_bars(self.COLUMN_MAPPING_HISTORY, symbol)
+        stock_df.rename(columns=self.COLUMN_MAPPING_HISTORY, inplace=True)
+        stock_df['symbol'] = symbol  # 添加 symbol 列
+        # 确保日期是datetime格式并排序
+        stock_df['date'] = pd.to_datetime(stock_df['date'])
+        stock_df.sort_values(by='date', inplace=True)
+        return stock_df
+
+    def download_minutes(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        通过 akshare 下载单只股票的 1 分钟 bar（不复权，数据源只提供最近若干个交易日）。
+
+        :param symbol: 股票代码
+        :param start_date: 开始日期，格式 'YYYYMMDD'
+        :param end_date: 结束日期，格式 'YYYYMMDD'
+        :return: 按时间排序的 1 分钟 bar DataFrame
+        """
+        with metrics.span('akshare.call', api='stock_zh_a_hist_min_em'):
+            minute_df = ak.stock_zh_a_hist_min_em(symbol=symbol, start_date=f"{pd.Timestamp(start_date):%Y-%m-%d} 09:00:00",
+                                                  end_date=f"{pd.Timestamp(end_date):%Y-%m-%d} 15:30:00", period='1', adjust='')
+        if minute_df.empty:
+            # 周末、节假日或超出数据源保留天数的区间没有分钟 bar
+            return self._empty_bars(self.COLUMN_MAPPING_MINUTE)
+        minute_df.rename(columns=self.COLUMN_MAPPING_MINUTE, inplace=True)
+        minute_df['date'] = pd.to_datetime(minute_df['date'])
+        minute_df.sort_values(by='date', inplace=True)
+        return minute_df
+
+    def get_bars(self, symbol: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        按 self.period 获取单只股票的 bar，优先读取本地缓存。
+
+        :param symbol: 股票代码
+        :param start_date: 开始日期，格式 'YYYYMMDD'
+        :param end_date: 结束日期，格式 'YYYYMMDD'
+        :return: 按时间排序的 bar DataFrame
+        """
+        if is_intraday(self.period):
+            return self.minute_store.get(symbol, start_date, end_date, self.period)
+        bars = self.cache.get(symbol, start_date, end_date, self.adjust)
+        return bars if self.period == 'daily' else resample_frame(bars, self.period)
+
+    def fetch_all_data(self, start_date: str = None, end_date: str = None, max_workers: int = FETCH_CONCURRENCY,
+                       symbol_deadline: float = FETCH_SYMBOL_DEADLINE, symbols: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        按 self.period 获取所有股票的历史数据，优先读取本地缓存，只下载缺失的日期区间。
+
+        多只股票通过线程池并发下载，单只股票失败时按指数退避重试，超过时限后放弃，
+        失败的股票及原因记录在 self.failed_symbols 中。
+
+        :param start_date: 开始日期，格式 'YYYYMMDD'
+        :param end_date: 结束日期，格式 'YYYYMMDD'
+        :param max_workers: 并发下载的股票数上限
+        :param symbol_deadline: 单只股票下载（含重试）的最长时间（秒）
+        :param symbols: 只获取这些股票，默认为 self.symbols
         :return: 字典，键为股票代码，值为对应的历史数据 DataFrame
         """
         all_data = {}
-        for symbol in self.symbols:
-            while True:
-                try:
-                    stock_df = ak.stock_zh_a_hist(symbol=symbol, start_date=start_date, end_date=end_date, adjust=self.adjust)
-                    stock_df.rename(columns=self.COLUMN_MAPPING_HISTORY, inplace=True)
-                    stock_df['symbol'] = symbol  # 添加 symbol 列
-                    # 确保日期是datetime格式并排序
-                    stock_df['date'] = pd.to_datetime(stock_df['date'])
-                    stock_df.sort_values(by='date', inplace=True)
-                    all_data[symbol] = stock_df
-                    break
-                except Exception as e:
-                    pass
-        return all_data
\ No newline at end of file
+        self.failed_symbols = {}
+        symbols = symbols if symbols is not None else self.symbols
+        if not symbols:
+            return all_data
+
+        workers = max(1, min(max_workers, len(symbols)))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {
+            executor.submit(retry_call, self.get_bars, symbol, start_date, end_date,
+                            deadline=symbol_deadline, description=f"下载 {symbol} 历史数据"): symbol
+            for symbol in symbols
+        }
+        # 每个并发槽位最多依次处理 ceil(n / workers) 只股票，每只都不超过单股时限
+        total_timeout = symbol_deadline * math.ceil(len(symbols) / workers)
+        done, not_done = wait(futures, timeout=total_timeout)
+        # 不等待仍卡在网络请求中的线程，避免整体挂起
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        for future in done:
+            symbol = futures[future]
+            try:
+                all_data[symbol] = future.result()
+            except Exception as e:
+                self.failed_symbols[symbol] = str(e)
+        for future in not_done:
+            self.failed_symbols[futures[future]] = "下载超时"
+        metrics.inc('fetch.failed_symbols', len(self.failed_symbols))
+
+        # 保持与 symbols 相同的顺序
+        all_data = {symbol: all_data[symbol] for symbol in symbols if symbol in all_data}
+        if self.failed_symbols:
+            logging.warning(f"{len(self.failed_symbols)} 只股票的历史数据获取失败: {', '.join(sorted(self.failed_symbols))}")
+        logging.info(f"成功获取 {len(all_data)} 只股票的历史数据。")
+        return all_data
+
+    def update_universe(self, store, start_date: str = None, end_date: str = None,
+                        chunk_size: int = UNIVERSE_FETCH_CHUNK) -> Dict[str, str]:
+        """
+        把 self.symbols 的日线行情写入全市场存储。按批下载、写入后即释放，
+        内存中最多同时保留 chunk_size 只股票的 DataFrame，与股票总数无关。
+
+        :param store: UniverseStore
+        :param start_date: 开始日期，格式 'YYYYMMDD'
+        :param end_date: 结束日期，格式 'YYYYMMDD'
+        :param chunk_size: 每批下载的股票数
+        :return: 获取失败的股票及原因
+        """
+        if self.period != 'daily':
+            raise ValueError("全市场存储只保存日线行情")
+        failed = {}
+        for i in range(0, len(self.symbols), chunk_size):
+            chunk = self.fetch_all_data(start_date, end_date, symbols=self.symbols[i:i + chunk_size])
+            failed.update(self.failed_symbols)
+            with metrics.span('universe_store.write'):
+                store.write(chunk)
+            logging.info(f"全市场存储已写入 {min(i + chunk_size, len(self.symbols))}/{len(self.symbols)} 只股票。")
+        self.failed_symbols = failed
+        return failed
@@ -0,0 +1,344 @@
+# data/minute_bars.py
+
+import os
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from config.config import MINUTE_BAR_DIR, RESAMPLE_CACHE_SIZE, TRADING_SESSIONS, TRADING_DAYS_PER_YEAR
+from utils.metrics import metrics
+
+# bar 周期：分钟周期的名称与 akshare 分钟行情的 period 参数一致
+MINUTE_BAR_SIZES = ('1', '5', '15', '30', '60')
+CALENDAR_BAR_SIZES = ('daily', 'weekly', 'monthly')
+BAR_SIZES = MINUTE_BAR_SIZES + CALENDAR_BAR_SIZES
+
+# 下载函数：(symbol, start_date, end_date) -> 英文列名的 1 分钟 bar DataFrame
+MinuteProvider = Callable[[str, str, str], pd.DataFrame]
+
+SECONDS_PER_DAY = 86400
+
+
+def _minute_of_day(hhmm: str) -> int:
+    hour, minute = hhmm.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+# 交易时段折线：一天中的分钟 -> 当天已经过的交易分钟数，时段之间和收盘之后保持不变
+_SESSION_X = np.array([_minute_of_day(t) for session in TRADING_SESSIONS for t in session], dtype=np.float64)
+_SESSION_Y = np.concatenate([[0.0, end - start] for start, end in _SESSION_X.reshape(-1, 2)]).cumsum()
+SESSION_MINUTES = int(_SESSION_Y[-1])  # 每个交易日的交易分钟数
+
+
+def symbol_column(symbol: str, length: int) -> pd.Categorical:
+    """
+    :return: 长度为 length 的分类型 symbol 列，每行只占 1 字节，而不是重复的字符串
+    """
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[symbol])
+
+
+def is_intraday(bar_size: str) -> bool:
+    """
+    :param bar_size: bar 周期
+    :return: 是否为分钟周期
+    """
+    if bar_size not in BAR_SIZES:
+        raise ValueError(f"未知的 bar 周期: {bar_size}，可选: {', '.join(BAR_SIZES)}")
+    return bar_size in MINUTE_BAR_SIZES
+
+
+def bars_per_year(bar_size: str) -> float:
+    """
+    :param bar_size: bar 周期
+    :return: 每年的 bar 数，用于年化收益、波动率和夏普比率
+    """
+    if is_intraday(bar_size):
+        return TRADING_DAYS_PER_YEAR * SESSION_MINUTES / int(bar_size)
+    return {'daily': TRADING_DAYS_PER_YEAR, 'weekly': 52, 'monthly': 12}[bar_size]
+
+
+def _bucket_end_minutes(minutes: int) -> np.ndarray:
+    """
+    :return: 每个分钟桶的结束时刻（一天中的分钟），桶按交易时段内的分钟数划分
+    """
+    elapsed = np.minimum(np.arange(1, -(-SESSION_MINUTES // minutes) + 1) * minutes, SESSION_MINUTES)
+    # 恰好落在时段结束处的桶属于前一个时段（如 60 分钟的第二个桶结束于 11:30 而非 13:00）
+    session = np.searchsorted(_SESSION_Y[1::2], elapsed, side='left')
+    return (_SESSION_X[::2][session] + elapsed - _SESSION_Y[::2][session]).astype(np.int64)
+
+
+def _bucket_keys(seconds: np.ndarray, bar_size: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    计算每根 bar 所属的桶。
+
+    :param seconds: 按时间排序的 bar 时间（Unix 秒，本地时间）
+    :param bar_size: 目标周期
+    :return: (每根 bar 的桶编号, 每根 bar 所属桶的结束时间，日历周期为 None，取桶内最后一根 bar 的日期)
+    """
+    days = seconds // SECONDS_PER_DAY
+    if bar_size == 'daily':
+        return days, None
+    if bar_size == 'weekly':
+        # 1970-01-01 是星期四，加 3 后按星期一分周
+        return (days + 3) // 7, None
+    if bar_size == 'monthly':
+        return seconds.astype('datetime64[s]').astype('datetime64[M]').view(np.int64), None
+
+    minutes = int(bar_size)
+    # 以结束时刻标记的分钟 bar：09:31 是第 0 分钟，09:30 的集合竞价并入第一根，午休和收盘后的 bar 并入前一根
+    elapsed = np.interp((seconds % SECONDS_PER_DAY) // 60, _SESSION_X, _SESSION_Y)
+    index = np.clip(np.ceil(elapsed).astype(np.int64) - 1, 0, SESSION_MINUTES - 1)
+    bucket = index // minutes
+    buckets_per_day = -(-SESSION_MINUTES // minutes)
+    labels = days * SECONDS_PER_DAY + _bucket_end_minutes(minutes)[bucket] * 60
+    return days * buckets_per_day + bucket, labels
+
+
+def resample_frame(df: pd.DataFrame, bar_size: str) -> pd.DataFrame:
+    """
+    把按时间排序的 bar 重采样为更粗的周期，全部为 NumPy 分组归约，不逐行循环。
+
+    分钟周期按交易时段内的分钟数分桶，时间为桶的结束时刻，与 akshare 的分钟行情一致；
+    日、周、月周期的时间为桶内最后一根 bar 的日期。开盘取第一根，收盘取最后一根，
+    最高、最低取极值，成交量和成交额求和。各列保持原来的数据类型。
+
+    :param df: 包含 date 和行情列的 DataFrame，周期不能粗于 bar_size
+    :param bar_size: 目标周期
+    :return: 重采样后的 DataFrame
+    """
+    if df.empty:
+        return df.reset_index(drop=True)
+    seconds = df['date'].values.astype('datetime64[s]').view(np.int64)
+    if is_intraday(bar_size) and (seconds % SECONDS_PER_DAY == 0).all():
+        raise ValueError(f"日线及以上周期的数据无法重采样为 {bar_size} 分钟 bar")
+
+    keys, labels = _bucket_keys(seconds, bar_size)
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    ends = np.append(starts[1:], len(keys)) - 1
+    if labels is None:
+        labels = (seconds[ends] // SECONDS_PER_DAY) * SECONDS_PER_DAY
+    else:
+        labels = labels[starts]
+
+    columns = {'date': labels.astype('datetime64[s]').astype('datetime64[ns]')}
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if column in ('date', 'symbol'):
+            continue
+        if column == 'open':
+            columns[column] = values[starts]
+        elif column == 'high':
+            columns[column] = np.maximum.reduceat(values, starts)
+        elif column == 'low':
+            columns[column] = np.minimum.reduceat(values, starts)
+        elif column in ('volume', 'turnover'):
+            total = np.add.reduceat(values, starts, dtype=np.float64 if values.dtype.kind == 'f' else None)
+            columns[column] = total.astype(values.dtype, copy=False)
+        else:
+            # 收盘价及其他列取桶内最后一根
+            columns[column] = values[ends]
+    resampled = pd.DataFrame(columns)
+    if 'symbol' in df.columns:
+        resampled['symbol'] = symbol_column(str(df['symbol'].iat[0]), len(resampled))
+    return resampled
+
+
+def resample_data(data: Dict[str, pd.DataFrame], bar_size: str) -> Dict[str, pd.DataFrame]:
+    """
+    把所有股票的数据重采样为 bar_size。时间都在零点的数据视为日线，目标周期为日线时原样返回。
+
+    :param data: 所有股票的数据字典
+    :param bar_size: 目标周期
+    :return: 新的数据字典，不修改传入的 data
+    """
+    resampled = {}
+    for symbol, df in data.items():
+        if bar_size == 'daily' and (df['date'].values.astype('datetime64[s]').view(np.int64) % SECONDS_PER_DAY == 0).all():
+            resampled[symbol] = df
+        else:
+            resampled[symbol] = resample_frame(df, bar_size)
+    return resampled
+
+
+class MinuteBarStore:
+    """
+    本地 1 分钟行情存储，每只股票一个 npz 列式文件，更粗的周期按需从 1 分钟 bar 重采样。
+
+    价格和成交额以 float32、成交量以 int64 保存，每根 bar（含 int64 时间）共 36 字节，
+    一只股票一年约 6 万根 1 分钟 bar、约 2 MB，数百只股票一年的数据可以全部常驻内存。
+    已读取的 1 分钟 bar 保存在内存中，重采样结果按 股票 × 周期 缓存（LRU），
+    该股票的 1 分钟 bar 有新数据写入后失效。
+
+    分钟行情的数据源只提供最近若干个交易日，因此只向后补齐：请求的结束日期晚于已覆盖的日期时
+    下载缺失的部分并合并，更早的历史依靠持续运行逐日积累。分钟行情不复权。
+    """
+
+    COLUMNS = {'open': np.float32, 'close': np.float32, 'high': np.float32, 'low': np.float32,
+               'volume': np.int64, 'turnover': np.float32}
+    DEFAULT_START = '19700101'
+    DEFAULT_END = '20500101'
+
+    def __init__(self, provider: MinuteProvider, store_dir: str = MINUTE_BAR_DIR, cache_size: int = RESAMPLE_CACHE_SIZE):
+        """
+        :param provider: 缺失数据的下载函数，离线测试时可传入桩函数
+        :param store_dir: 存储目录
+        :param cache_size: 内存中缓存的重采样结果个数
+        """
+        self.provider = provider
+        self.store_dir = store_dir
+        self.cache_size = cache_size
+        os.makedirs(store_dir, exist_ok=True)
+        self._bars: Dict[str, pd.DataFrame] = {}  # symbol: 已读取的全部 1 分钟 bar
+        self._covered_end: Dict[str, str] = {}
+        self._revision: Dict[str, int] = {}  # symbol: 1 分钟 bar 每次变化后加一，用于判断重采样缓存是否过期
+        self._resampled: 'OrderedDict[Tuple[str, str], Tuple[int, pd.DataFrame]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.store_dir, f"{symbol}_1m.npz")
+
+    def load(self, symbol: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        """
+        读取本地存储。
+
+        :return: (1 分钟 bar, 已覆盖的结束日期)，无存储时均为 None
+        """
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return None, None
+        try:
+            with np.load(path) as npz:
+                df = pd.DataFrame({'date': npz['date'].astype('datetime64[s]').astype('datetime64[ns]')})
+                for column in self.COLUMNS:
+                    df[column] = npz[column]
+                covered_end = str(npz['covered_end'])
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f"分钟行情 {path} 读取失败，将重新下载: {e}")
+            return None, None
+        df['symbol'] = symbol_column(symbol, len(df))
+        return df, covered_end
+
+    def save(self, symbol: str, df: pd.DataFrame, covered_end: str):
+        """
+        写入本地存储，先写临时文件再替换。
+        """
+        path = self._path(symbol)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, date=df['date'].values.astype('datetime64[s]').view(np.int64),
+                     covered_end=np.array(covered_end), **{column: df[column].to_numpy() for column in self.COLUMNS})
+        os.replace(tmp_path, path)
+
+    def _normalize(self, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+        """只保留存储的列并转换为紧凑的数据类型"""
+        # 没有 bar 时数据源可能返回不带列的空表
+        dates = pd.to_datetime(df['date']).values if 'date' in df.columns else np.array([], dtype='datetime64[ns]')
+        columns = {'date': dates.astype('datetime64[ns]')}
+        for column, dtype in self.COLUMNS.items():
+            if column in df.columns:
+                values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+                columns[column] = np.nan_to_num(values).astype(dtype) if dtype is np.int64 else values.astype(dtype)
+            else:
+                columns[column] = np.zeros(len(df), dtype=dtype) if dtype is np.int64 else np.full(len(df), np.nan, dtype=dtype)
+        normalized = pd.DataFrame(columns)
+        normalized['symbol'] = symbol_column(symbol, len(normalized))
+        return normalized
+
+    def minutes(self, symbol: str, end_date: Optional[str] = None, start_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        获取一只股票已存储的全部 1 分钟 bar，必要时先下载 end_date 之前缺失的部分。
+
+        :param symbol: 股票代码
+        :param end_date: 需要覆盖到的结束日期，格式 'YYYYMMDD'，None 表示截至今天
+        :param start_date: 首次下载时的开始日期，格式 'YYYYMMDD'
+        :return: 按时间排序的 1 分钟 bar
+        """
+        end_date = end_date or datetime.now().strftime("%Y%m%d")
+        bars = self._bars.get(symbol)
+        covered_end = self._covered_end.get(symbol)
+        if bars is None:
+            bars, covered_end = self.load(symbol)
+        # 今天的行情可能尚未收盘，不计入已覆盖区间
+        coverable_end = min(end_date, (datetime.now() - timedelta(days=1)).strftime("%Y%m%d"))
+
+        if bars is None:
+            metrics.inc('minute_bars.requests', result='miss')
+            start_date = start_date or self.DEFAULT_START
+            bars = self._normalize(symbol, self.provider(symbol, start_date, end_date))
+            bars = bars.drop_duplicates(subset='date', keep='last').sort_values(by='date', ignore_index=True)
+            # 开始日期晚于昨天时没有可覆盖的日期，已覆盖的结束日期记为开始日期的前一天
+            covered_end = max(coverable_end, (datetime.strptime(start_date, "%Y%m%d") - timedelta(days=1)).strftime("%Y%m%d"))
+            self.save(symbol, bars, covered_end)
+            self._revision[symbol] = self._revision.get(symbol, 0) + 1
+        elif end_date > covered_end:
+            metrics.inc('minute_bars.requests', result='partial')
+            start = (datetime.strptime(covered_end, "%Y%m%d") + timedelta(days=1)).strftime("%Y%m%d")
+            new_bars = self._normalize(symbol, self.provider(symbol, start, end_date))
+            if not new_bars.empty:
+                bars = pd.concat([bars, new_bars], ignore_index=True)
+                bars = bars.drop_duplicates(subset='date', keep='last').sort_values(by='date', ignore_index=True)
+                self._revision[symbol] = self._revision.get(symbol, 0) + 1
+            covered_end = max(coverable_end, covered_end)
+            self.save(symbol, bars, covered_end)
+        else:
+            metrics.inc('minute_bars.requests', result='hit')
+        self._bars[symbol] = bars
+        self._covered_end[symbol] = covered_end
+        self._revision.setdefault(symbol, 0)
+        return bars
+
+    def resampled(self, symbol: str, bar_size: str) -> pd.DataFrame:
+        """
+        获取一只股票已读取的全部 1 分钟 bar 重采样为 bar_size 后的结果，有缓存时直接返回。
+
+        :param symbol: 股票代码，需先通过 minutes 或 get 读取
+        :param bar_size: 目标周期
+        """
+        bars = self._bars[symbol]
+        if bar_size == '1':
+            return bars
+        key = (symbol, bar_size)
+        revision = self._revision[symbol]
+        with self._lock:
+            cached = self._resampled.get(key)
+            if cached is not None and cached[0] == revision:
+                self._resampled.move_to_end(key)
+                metrics.inc('minute_bars.resample', result='hit')
+                return cached[1]
+        metrics.inc('minute_bars.resample', result='miss')
+        with metrics.span('minute_bars.resample_time', bar_size=bar_size):
+            resampled = resample_frame(bars, bar_size)
+        with self._lock:
+            self._resampled[key] = (revision, resampled)
+            self._resampled.move_to_end(key)
+            while len(self._resampled) > self.cache_size:
+                self._resampled.popitem(last=False)
+        return resampled
+
+    def get(self, symbol: str, start_date: Optional[str], end_date: Optional[str], bar_size: str = '1') -> pd.DataFrame:
+        """
+        获取指定区间、指定周期的 bar。
+
+        :param symbol: 股票代码
+        :param start_date: 开始日期，格式 'YYYYMMDD'，None 表示不限
+        :param end_date: 结束日期，格式 'YYYYMMDD'，None 表示不限
+        :param bar_size: bar 周期，可以是分钟周期，也可以是日、周、月
+        :return: 按时间排序的 bar
+        """
+        self.minutes(symbol, end_date, start_date)
+        bars = self.resampled(symbol, bar_size)
+        dates = bars['date'].values
+        lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date or self.DEFAULT_START)), side='left')
+        # 结束日期当天的 bar 全部包含在内
+        hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date or self.DEFAULT_END) + pd.Timedelta(days=1)), side='left')
+        return bars.iloc[lo:hi].reset_index(drop=True)
+
+    def memory_usage(self) -> int:
+        """
+        :return: 内存中 1 分钟 bar 和重采样缓存占用的字节数
+        """
+        frames: List[pd.DataFrame] = list(self._bars.values()) + [df for _, df in self._resampled.values()]
+        return int(sum(df.memory_usage(index=False, deep=False).sum() for df in frames))
@@ -0,0 +1,223 @@
+# data/price_feed.py
+
+import asyncio
+import logging
+import threading
+import numpy as np
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from price_time_series_manager import PriceTimeSeriesManager
+from utils.metrics import metrics
+from config.config import PRICE_FEED_INTERVAL, PRICE_FEED_MAX_PENDING
+
+Quotes = Dict[str, float]
+
+
+class QuoteSource:
+    """
+    行情来源接口：fetch 返回一批最新价格；与上一次相比没有新行情时返回 None，由调用方跳过。
+    """
+
+    async def fetch(self, symbols: List[str]) -> Optional[Quotes]:
+        raise NotImplementedError
+
+
+class AkshareQuoteSource(QuoteSource):
+    """
+    通过 DataFetcher 的全市场快照获取最新价格，阻塞的网络请求放到线程池中执行，不阻塞事件循环。
+    快照在 SPOT_SNAPSHOT_TTL 内或下载失败时会沿用上一次的结果，这种情况视为没有新行情。
+    """
+
+    def __init__(self, data_fetcher):
+        """
+        :param data_fetcher: DataFetcher 实例
+        """
+        self.data_fetcher = data_fetcher
+        self._last_snapshot = None
+
+    async def fetch(self, symbols: List[str]) -> Optional[Quotes]:
+        snapshot = await asyncio.to_thread(self.data_fetcher.fetch_spot_snapshot)
+        if snapshot is self._last_snapshot or snapshot.empty:
+            return None
+        self._last_snapshot = snapshot
+        prices = snapshot.reindex(symbols).to_numpy(dtype=float)
+        return {symbol: float(price) for symbol, price in zip(symbols, prices) if price > 0}
+
+
+class StubQuoteSource(QuoteSource):
+    """
+    本地模拟行情，用于测试：每次调用各股票价格按几何随机游走变化一次，可模拟网络延迟和卡顿。
+    """
+
+    def __init__(self, initial_prices: Quotes, volatility: float = 0.002, latency: float = 0.0,
+                 stall_every: int = 0, stall: float = 0.0, seed: Optional[int] = None):
+        """
+        :param initial_prices: 初始价格
+        :param volatility: 每次调用的价格波动率
+        :param latency: 每次调用的模拟延迟（秒）
+        :param stall_every: 每隔多少次调用卡顿一次，0 表示不卡顿
+        :param stall: 卡顿时额外的延迟（秒）
+        :param seed: 随机种子
+        """
+        self.symbols = list(initial_prices)
+        self.prices = np.array([initial_prices[s] for s in self.symbols], dtype=np.float64)
+        self.volatility = volatility
+        self.latency = latency
+        self.stall_every = stall_every
+        self.stall = stall
+        self.rng = np.random.default_rng(seed)
+        self.calls = 0
+
+    async def fetch(self, symbols: List[str]) -> Optional[Quotes]:
+        self.calls += 1
+        delay = self.latency
+        if self.stall_every and self.calls % self.stall_every == 0:
+            delay += self.stall
+        if delay:
+            await asyncio.sleep(delay)
+        self.prices *= np.exp(self.volatility * self.rng.standard_normal(len(self.prices)))
+        quotes = dict(zip(self.symbols, self.prices.tolist()))
+        return {symbol: quotes[symbol] for symbol in symbols if symbol in quotes}
+
+
+class PriceFeed:
+    """
+    异步盘中行情轮询。
+
+    轮询协程按固定节拍（PRICE_FEED_INTERVAL）获取行情，每批带上获取时刻的时间戳放入有界队列；
+    写入协程从队列取出批次，以 add_prices 整批写入 PriceTimeSeriesManager。
+
+    - 超时：单次获取超过一个间隔即放弃，避免慢请求堆积；
+    - 跳过过期节拍：获取耗时超过间隔时，不补跑已错过的节拍，直接对齐到下一个节拍；
+    - 背压：写入跟不上时队列满，丢弃最旧的一批，只保留最新的行情；
+    - 行情来源没有新数据（返回 None）时不写入，避免同一份快照重复进入价格时序。
+    """
+
+    def __init__(self, source: QuoteSource, symbols: List[str], price_manager: Optional[PriceTimeSeriesManager] = None,
+                 interval: float = PRICE_FEED_INTERVAL, max_pending: int = PRICE_FEED_MAX_PENDING,
+                 active: Optional[Callable[[], bool]] = None):
+        """
+        :param source: 行情来源
+        :param symbols: 轮询的股票代码
+        :param price_manager: 写入的价格管理器，默认为全局单例
+        :param interval: 轮询间隔（秒）
+        :param max_pending: 等待写入的批次上限
+        :param active: 返回当前是否需要轮询（如是否处于交易时段），None 表示一直轮询
+        """
+        self.source = source
+        self.symbols = list(symbols)
+        self.price_manager = price_manager if price_manager is not None else PriceTimeSeriesManager()
+        self.interval = interval
+        self.max_pending = max_pending
+        self.active = active
+        self.stats = {'polls': 0, 'batches': 0, 'stale': 0, 'timeouts': 0, 'errors': 0, 'skipped_ticks': 0, 'dropped': 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _count(self, key: str, value: int = 1):
+        self.stats[key] += value
+        metrics.inc('price_feed.events', value, kind=key)
+
+    async def _poll_once(self):
+        self._count('polls')
+        try:
+            with metrics.span('price_feed.fetch'):
+                quotes = await asyncio.wait_for(self.source.fetch(self.symbols), timeout=self.interval)
+        except asyncio.TimeoutError:
+            self._count('timeouts')
+            logging.warning(f"获取行情超过 {self.interval} 秒，放弃本次轮询。")
+            return
+        except Exception as e:
+            self._count('errors')
+            logging.error(f"获取行情失败: {e}")
+            return
+        if not quotes:
+            self._count('stale')
+            return
+        batch = (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), quotes)
+        if self._queue.full():
+            # 写入跟不上，丢弃最旧的一批
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self._count('dropped')
+        self._queue.put_nowait(batch)
+
+    async def _poller(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while not self._stopping.is_set():
+            if self.active is None or self.active():
+                await self._poll_once()
+            next_tick += self.interval
+            now = loop.time()
+            if now > next_tick:
+                # 本次轮询超时，跳过已错过的节拍
+                missed = int((now - next_tick) // self.interval) + 1
+                next_tick += missed * self.interval
+                self._count('skipped_ticks', missed)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=next_tick - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _writer(self):
+        while True:
+            timestamp, quotes = await self._queue.get()
+            try:
+                # 写入放到线程中执行，写入较慢时轮询不受影响，积压由队列上限处理
+                with metrics.span('price_feed.write'):
+                    await asyncio.to_thread(self.price_manager.add_prices, timestamp, quotes)
+                self._count('batches')
+            except Exception as e:
+                logging.error(f"写入价格时序失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def run(self, duration: Optional[float] = None):
+        """
+        运行轮询直到 stop 被调用，或运行 duration 秒后停止。停止时把已取得的批次写完再返回。
+
+        :param duration: 运行时长（秒），None 表示一直运行
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._stopping = asyncio.Event()
+        writer = asyncio.create_task(self._writer())
+        poller = asyncio.create_task(self._poller())
+        logging.info(f"盘中行情轮询已启动，{len(self.symbols)} 只股票，间隔 {self.interval} 秒。")
+        try:
+            if duration is not None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=duration)
+                except asyncio.TimeoutError:
+                    self._stopping.set()
+            await poller
+            await self._queue.join()
+        finally:
+            poller.cancel()
+            writer.cancel()
+            logging.info(f"盘中行情轮询已停止: {self.stats}")
+
+    def stop(self):
+        """停止轮询，可以从其他线程调用"""
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    def start_in_thread(self) -> threading.Thread:
+        """
+        在后台线程的独立事件循环中运行，供同步程序（如 daemon.py）使用。
+        """
+        self._thread = threading.Thread(target=asyncio.run, args=(self.run(),), name='price-feed', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    @property
+    def running(self) -> bool:
+        """是否正在后台线程中运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
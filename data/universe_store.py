@@ -0,0 +1,296 @@
+# data/universe_store.py
+
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+from data.minute_bars import symbol_column
+from config.config import UNIVERSE_STORE_DIR, UNIVERSE_MAX_SYMBOLS, UNIVERSE_DATE_CHUNK
+
+Columns = Union[slice, np.ndarray]
+
+
+class UniverseStore:
+    """
+    全市场日线行情的磁盘存储：每个字段一个 日期 × 股票 的 .npy 文件，以 np.memmap 打开，
+    index.json 记录股票代码与列号的对应关系、已写入的日期数和每只股票最早有数据的行。
+
+    读取时不会整体载入内存，只有实际访问到的日期和列所在的页才会被操作系统读入，
+    因此回测和信号计算可以覆盖全部 A 股而只为用到的部分付出内存。缺失值为 NaN，
+    以收盘价是否为 NaN 判断当天是否有行情。
+
+    列数固定为 max_symbols，新股按需分配列号；日期轴按 UNIVERSE_DATE_CHUNK 行整块扩容，
+    追加新日期时只写新行。写入较早的日期（如新加入的股票带有更早的历史）时整体重排日期轴。
+    """
+
+    # 与 BarCache 相同使用 float64，从存储读出的行情与逐只下载的完全一致
+    FIELDS = {'open': np.float64, 'high': np.float64, 'low': np.float64, 'close': np.float64,
+              'volume': np.float64, 'turnover': np.float64}
+
+    def __init__(self, directory: str = UNIVERSE_STORE_DIR, max_symbols: int = UNIVERSE_MAX_SYMBOLS, readonly: bool = False):
+        """
+        :param directory: 存储目录
+        :param max_symbols: 列数上限，只在首次创建时生效
+        :param readonly: 是否只读打开，界面等只读取数据的进程使用
+        """
+        self.directory = directory
+        self.readonly = readonly
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self.max_symbols = max_symbols
+        self.symbols: List[str] = []
+        self.symbol_index: Dict[str, int] = {}
+        self.first_row = np.zeros(0, dtype=np.int64)  # 每只股票最早有数据的行
+        self.num_dates = 0
+        self.capacity = 0
+        self._arrays: Dict[str, np.memmap] = {}
+        self.reload()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.npy")
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, 'index.json')
+
+    def reload(self):
+        """重新读取索引并重新打开数据文件，用于看到其他进程写入的新数据"""
+        self._arrays = {}
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.max_symbols = index['max_symbols']
+        self.symbols = index['symbols']
+        self.symbol_index = {symbol: j for j, symbol in enumerate(self.symbols)}
+        self.first_row = np.array(index['first_row'], dtype=np.int64)
+        self.num_dates = index['num_dates']
+        self.capacity = index['capacity']
+
+    def _save_index(self):
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'max_symbols': self.max_symbols, 'symbols': self.symbols, 'first_row': self.first_row.tolist(),
+                       'num_dates': self.num_dates, 'capacity': self.capacity}, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _array(self, name: str) -> np.memmap:
+        """打开一个数据文件（日期轴为 'dates'），打开后复用同一个映射"""
+        array = self._arrays.get(name)
+        if array is None:
+            array = self._arrays[name] = np.load(self._path(name), mmap_mode='r' if self.readonly else 'r+')
+        return array
+
+    def __len__(self) -> int:
+        return self.num_dates
+
+    @property
+    def dates(self) -> np.ndarray:
+        """已写入的日期，datetime64[D]"""
+        if self.num_dates == 0:
+            return np.array([], dtype='datetime64[D]')
+        return self._array('dates')[:self.num_dates].view('datetime64[D]')
+
+    def date_rows(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> slice:
+        """
+        :param start_date: 开始日期，格式 'YYYYMMDD'，None 表示不限
+        :param end_date: 结束日期（含），格式 'YYYYMMDD'，None 表示不限
+        :return: 日期区间对应的行切片
+        """
+        dates = self.dates
+        lo = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date), 'D'), side='left'))
+        hi = len(dates) if end_date is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date), 'D'), side='right'))
+        return slice(lo, hi)
+
+    def columns(self, symbols: Optional[Sequence[str]] = None) -> Columns:
+        """
+        :param symbols: 股票代码，None 表示全部
+        :return: 对应的列号；全部股票时为切片，读取时不产生拷贝
+        """
+        if symbols is None:
+            return slice(0, len(self.symbols))
+        return np.array([self.symbol_index[symbol] for symbol in symbols], dtype=np.int64)
+
+    def block(self, field: str, rows: slice = slice(None), columns: Columns = None) -> np.ndarray:
+        """
+        读取一个字段的 日期 × 股票 子数组。列为切片时返回内存映射上的视图，只在访问时读入对应的页；
+        列为下标数组时只拷贝这些列。
+
+        :param field: 字段名
+        :param rows: 行切片，超出已写入日期数的部分会被截断
+        :param columns: columns() 返回的列号，None 表示全部
+        """
+        columns = self.columns() if columns is None else columns
+        if self.num_dates == 0:
+            width = len(range(*columns.indices(len(self.symbols)))) if isinstance(columns, slice) else len(columns)
+            return np.empty((0, width), dtype=self.FIELDS[field])
+        array = self._array(field)[:self.num_dates]
+        if isinstance(columns, slice):
+            return array[rows, columns]
+        return array[rows][:, columns]
+
+    def last_valid(self, field: str, lookback: int, symbols: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        各股票最近 lookback 个有效值（跳过停牌等缺失的日期），右对齐，不足部分在左侧补 NaN，
+        与 stack_closes 对各股票 DataFrame 的结果一致。只读取末尾若干行；
+        尾部窗口内有效值不足而更早还有数据的股票（长期停牌）再单独向前读取。
+
+        :param field: 字段名
+        :param lookback: 每只股票取的个数
+        :param symbols: 股票代码，None 表示全部
+        :return: 形状为 (股票数, lookback) 的 float64 数组
+        """
+        columns = self.columns(symbols)
+        column_ids = np.arange(len(self.symbols))[columns] if isinstance(columns, slice) else columns
+        result = np.full((len(column_ids), lookback), np.nan)
+        n = self.num_dates
+        rows = min(n, 4 * lookback)
+        if rows == 0 or lookback == 0:
+            return result
+        block = np.asarray(self.block(field, slice(n - rows, n), columns), dtype=np.float64)
+        valid = ~np.isnan(block)
+        # 稳定排序把每列的有效值依次移到末尾
+        order = np.argsort(valid, axis=0, kind='stable')
+        aligned = np.take_along_axis(block, order, axis=0)[-lookback:]
+        result[:, lookback - len(aligned):] = aligned.T
+
+        counts = valid.sum(axis=0)
+        short = np.flatnonzero((counts < lookback) & (self.first_row[column_ids] < n - rows))
+        if len(short):
+            array = self._array(field)
+            for i in short:
+                older = np.asarray(array[self.first_row[column_ids[i]]:n - rows, column_ids[i]], dtype=np.float64)
+                older = older[~np.isnan(older)][-(lookback - counts[i]):]
+                result[i, lookback - counts[i] - len(older):lookback - counts[i]] = older
+        return result
+
+    def frame(self, symbol: str, rows: slice = slice(None)) -> pd.DataFrame:
+        """
+        :param symbol: 股票代码
+        :param rows: 行切片
+        :return: 该股票在 rows 内有行情的日期组成的 DataFrame，列与 DataFetcher 返回的一致
+        """
+        j = self.symbol_index[symbol]
+        columns = slice(j, j + 1)
+        close = self.block('close', rows, columns)[:, 0]
+        mask = ~np.isnan(close)
+        data = {'date': self.dates[rows][mask].astype('datetime64[ns]')}
+        for field in ('open', 'close', 'high', 'low', 'volume', 'turnover'):
+            data[field] = np.asarray(self.block(field, rows, columns)[:, 0][mask], dtype=np.float64)
+        df = pd.DataFrame(data)
+        df['symbol'] = symbol_column(symbol, len(df))
+        return df
+
+    def frames(self, symbols: Optional[Sequence[str]] = None, start_date: Optional[str] = None,
+               end_date: Optional[str] = None) -> 'UniverseFrames':
+        """
+        :return: 按需构建各股票 DataFrame 的数据字典
+        """
+        return UniverseFrames(self, list(symbols) if symbols is not None else list(self.symbols), self.date_rows(start_date, end_date))
+
+    def _reserve(self, num_dates: int):
+        """保证日期轴容量不少于 num_dates，不足时按整块扩容并拷贝已有的行"""
+        if num_dates <= self.capacity:
+            return
+        capacity = -(-num_dates // UNIVERSE_DATE_CHUNK) * UNIVERSE_DATE_CHUNK
+        self._rewrite(capacity, np.arange(self.num_dates))
+
+    def _rewrite(self, capacity: int, positions: np.ndarray):
+        """
+        以新的容量重写所有数据文件，已有的第 i 行移动到第 positions[i] 行。
+        分块拷贝，内存占用与股票数 × UNIVERSE_DATE_CHUNK 成正比。
+        """
+        specs = dict(self.FIELDS, dates=np.int64)
+        for name, dtype in specs.items():
+            shape = (capacity,) if name == 'dates' else (capacity, self.max_symbols)
+            tmp_path = self._path(name) + '.tmp'
+            new = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+            new[:] = np.iinfo(np.int64).max if name == 'dates' else np.nan
+            if self.num_dates:
+                old = self._array(name)
+                for lo in range(0, self.num_dates, UNIVERSE_DATE_CHUNK):
+                    hi = min(lo + UNIVERSE_DATE_CHUNK, self.num_dates)
+                    new[positions[lo:hi]] = old[lo:hi]
+            new.flush()
+            del new
+            self._arrays.pop(name, None)
+            os.replace(tmp_path, self._path(name))
+        self.capacity = capacity
+
+    def write(self, data: Dict[str, pd.DataFrame]):
+        """
+        写入一批股票的日线行情，已有日期的值会被覆盖。
+
+        :param data: 股票代码到历史数据 DataFrame 的字典，列与 DataFetcher 返回的一致
+        """
+        if self.readonly:
+            raise PermissionError("只读打开的全市场存储不能写入")
+        data = {symbol: df for symbol, df in data.items() if not df.empty}
+        if not data:
+            return
+        new_symbols = [symbol for symbol in data if symbol not in self.symbol_index]
+        if len(self.symbols) + len(new_symbols) > self.max_symbols:
+            raise ValueError(f"全市场存储最多容纳 {self.max_symbols} 只股票")
+        for symbol in new_symbols:
+            self.symbol_index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        self.first_row = np.append(self.first_row, np.full(len(new_symbols), np.iinfo(np.int64).max))
+
+        incoming = {symbol: df['date'].values.astype('datetime64[D]') for symbol, df in data.items()}
+        old_dates = np.array(self.dates)
+        merged = np.union1d(old_dates, np.concatenate(list(incoming.values())))
+        if len(merged) > len(old_dates):
+            positions = np.searchsorted(merged, old_dates)
+            if len(old_dates) and positions[-1] != len(old_dates) - 1:
+                # 新日期插入在已有日期之间，重排日期轴
+                logging.info(f"全市场存储写入了更早的日期，重排 {len(old_dates)} 个日期。")
+                self._rewrite(-(-len(merged) // UNIVERSE_DATE_CHUNK) * UNIVERSE_DATE_CHUNK, positions)
+                moved = self.first_row < len(old_dates)
+                self.first_row[moved] = positions[self.first_row[moved]]
+            else:
+                self._reserve(len(merged))
+            self._array('dates')[:len(merged)] = merged.view(np.int64)
+            self.num_dates = len(merged)
+
+        arrays = {field: self._array(field) for field in self.FIELDS}
+        for symbol, df in data.items():
+            j = self.symbol_index[symbol]
+            rows = np.searchsorted(merged, incoming[symbol])
+            for field, array in arrays.items():
+                if field in df.columns:
+                    array[rows, j] = df[field].to_numpy(dtype=np.float64)
+            self.first_row[j] = min(self.first_row[j], int(rows.min()))
+        for array in arrays.values():
+            array.flush()
+        self._array('dates').flush()
+        self._save_index()
+
+
+class UniverseFrames(Mapping):
+    """
+    UniverseStore 上的数据字典，接口与 Dict[str, pd.DataFrame] 一致，
+    访问某只股票时才从存储中构建其 DataFrame，构建后缓存。
+    """
+
+    def __init__(self, store: UniverseStore, symbols: List[str], rows: slice):
+        self.store = store
+        self.symbols = symbols
+        self.rows = rows
+        self._frames: Dict[str, pd.DataFrame] = {}
+
+    def __getitem__(self, symbol: str) -> pd.DataFrame:
+        df = self._frames.get(symbol)
+        if df is None:
+            if symbol not in self.store.symbol_index:
+                raise KeyError(symbol)
+            df = self._frames[symbol] = self.store.frame(symbol, self.rows)
+        return df
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.symbols)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
@@ -0,0 +1,261 @@
+# orders.py
+
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+from price_time_series_manager import Timestamp, to_epoch_seconds
+
+BUY, SELL = 1, -1
+SYMBOL_DTYPE = np.dtype('U12')
+
+
+@dataclass(slots=True)
+class Order:
+    """单笔委托：股票代码、价格和数量"""
+    symbol: str
+    price: float
+    quantity: int
+
+
+class OrderBatch:
+    """
+    一组同方向的委托，保存在一个 NumPy 结构化数组中。
+
+    策略的输出和 CombinedStrategy 合并后的结果都使用这种形式，合并时整批做数组运算；
+    逐笔遍历时得到 Order 对象。
+    """
+
+    DTYPE = np.dtype([
+        ('symbol', SYMBOL_DTYPE),
+        ('price', np.float64),
+        ('quantity', np.int64),
+    ])
+
+    def __init__(self, records: Optional[np.ndarray] = None):
+        """
+        :param records: DTYPE 类型的结构化数组，None 表示空批次
+        """
+        self.records = records if records is not None else np.zeros(0, dtype=self.DTYPE)
+
+    @classmethod
+    def from_orders(cls, orders: Sequence[Order]) -> 'OrderBatch':
+        records = np.zeros(len(orders), dtype=cls.DTYPE)
+        if orders:
+            records['symbol'] = [order.symbol for order in orders]
+            records['price'] = [order.price for order in orders]
+            records['quantity'] = [order.quantity for order in orders]
+        return cls(records)
+
+    @classmethod
+    def from_arrays(cls, symbols: Sequence[str], prices: np.ndarray, quantities: np.ndarray) -> 'OrderBatch':
+        records = np.zeros(len(prices), dtype=cls.DTYPE)
+        records['symbol'] = symbols
+        records['price'] = prices
+        records['quantity'] = quantities
+        return cls(records)
+
+    @property
+    def symbols(self) -> np.ndarray:
+        return self.records['symbol']
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.records['price']
+
+    @property
+    def quantities(self) -> np.ndarray:
+        return self.records['quantity']
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, i: int) -> Order:
+        symbol, price, quantity = self.records[i].tolist()
+        return Order(symbol, price, quantity)
+
+    def __iter__(self) -> Iterator[Order]:
+        for symbol, price, quantity in self.records.tolist():
+            yield Order(symbol, price, quantity)
+
+    def to_dicts(self) -> List[Dict]:
+        return [{'symbol': symbol, 'price': price, 'quantity': quantity} for symbol, price, quantity in self.records.tolist()]
+
+    @classmethod
+    def merge(cls, batches: Sequence['OrderBatch'], weights: Sequence[float]) -> 'OrderBatch':
+        """
+        按权重合并多组委托，规则与逐笔合并相同：
+        同一股票的数量按各自权重取整后累加，价格按出现顺序两两取平均，结果按首次出现的顺序排列。
+
+        :param batches: 各组委托
+        :param weights: 每组委托的权重
+        :return: 合并后的委托
+        """
+        records = np.concatenate([batch.records for batch in batches]) if batches else np.zeros(0, dtype=cls.DTYPE)
+        if len(records) == 0:
+            return cls(records)
+        quantities = np.concatenate([
+            np.trunc(batch.quantities * weight).astype(np.int64) for batch, weight in zip(batches, weights)
+        ])
+
+        _, first_index, inverse = np.unique(records['symbol'], return_index=True, return_inverse=True)
+        n_groups = len(first_index)
+        counts = np.bincount(inverse, minlength=n_groups)
+        # 每笔委托在同一股票中的出现次序
+        order = np.argsort(inverse, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        rank = np.empty(len(records), dtype=np.int64)
+        rank[order] = np.arange(len(records)) - starts[inverse[order]]
+        # 两两平均展开后，第 r 笔价格的系数为 1/2^(k-r)，首笔为 1/2^(k-1)；按顺序累加与逐笔平均结果一致
+        k = counts[inverse]
+        price_weights = np.ldexp(1.0, -(k - np.maximum(rank, 1)))
+        merged_price = np.zeros(n_groups)
+        np.add.at(merged_price, inverse, records['price'] * price_weights)
+        merged_quantity = np.zeros(n_groups, dtype=np.int64)
+        np.add.at(merged_quantity, inverse, quantities)
+
+        group_order = np.argsort(first_index, kind='stable')
+        merged = np.zeros(n_groups, dtype=cls.DTYPE)
+        merged['symbol'] = records['symbol'][first_index[group_order]]
+        merged['price'] = merged_price[group_order]
+        merged['quantity'] = merged_quantity[group_order]
+        return cls(merged)
+
+
+class TransactionLog:
+    """
+    成交记录，保存在预分配的结构化数组中，股票代码以下标形式存储，时间为 Unix 秒。
+
+    每笔记录约 37 字节，而字典形式的一笔记录需要数百字节。需要字典形式时（持久化、展示）
+    通过下标、遍历或 to_dicts 转换，格式与原来的 transactions 列表相同。
+    """
+
+    DTYPE = np.dtype([
+        ('side', np.int8),
+        ('symbol', np.int32),
+        ('price', np.float64),
+        ('quantity', np.int64),
+        ('time', np.int64),
+        ('amount', np.float64),  # 买入为总成本，卖出为净收入
+    ])
+
+    def __init__(self, symbols: Iterable[str] = (), capacity: int = 1024):
+        """
+        :param symbols: 预先登记的股票代码，登记顺序即下标
+        :param capacity: 初始容量，不足时按倍数扩容
+        """
+        self.symbols: List[str] = []
+        self.symbol_index: Dict[str, int] = {}
+        for symbol in symbols:
+            self.symbol_id(symbol)
+        self._records = np.zeros(max(capacity, 1), dtype=self.DTYPE)
+        self._size = 0
+
+    @classmethod
+    def from_dicts(cls, transactions: Sequence[Dict]) -> 'TransactionLog':
+        """
+        从字典形式的成交记录列表构建。
+        """
+        log = cls(capacity=len(transactions))
+        for t in transactions:
+            side = BUY if t['type'] == 'buy' else SELL
+            amount = t.get('cost' if side == BUY else 'revenue', t['price'] * t['quantity'])
+            log.append(side, t['symbol'], t['price'], t['quantity'], t['time'], amount)
+        return log
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, symbols: Sequence[str]) -> 'TransactionLog':
+        """
+        从结构化数组和股票代码表构建，records 中的 symbol 为 symbols 的下标。
+        """
+        log = cls(symbols, capacity=len(records))
+        log._records[:len(records)] = records
+        log._size = len(records)
+        return log
+
+    def symbol_id(self, symbol: str) -> int:
+        j = self.symbol_index.get(symbol)
+        if j is None:
+            j = self.symbol_index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return j
+
+    @property
+    def records(self) -> np.ndarray:
+        """已写入部分的结构化数组视图"""
+        return self._records[:self._size]
+
+    def append(self, side: int, symbol: str, price: float, quantity: int, time: Timestamp, amount: float):
+        if self._size == len(self._records):
+            self._records = np.resize(self._records, 2 * len(self._records))
+        self._records[self._size] = (side, self.symbol_id(symbol), price, quantity, to_epoch_seconds(time), amount)
+        self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _to_dicts(self, records: np.ndarray) -> List[Dict]:
+        if len(records) == 0:
+            return []
+        times = np.char.replace(np.datetime_as_string(records['time'].astype('datetime64[s]'), unit='s'), 'T', ' ')
+        return [
+            {
+                'type': 'buy' if side == BUY else 'sell',
+                'symbol': self.symbols[j],
+                'price': price,
+                'quantity': quantity,
+                'time': time,
+                'cost' if side == BUY else 'revenue': amount
+            }
+            for (side, j, price, quantity, _, amount), time in zip(records.tolist(), times.tolist())
+        ]
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Dict, List[Dict]]:
+        if isinstance(i, slice):
+            return self._to_dicts(self.records[i])
+        return self._to_dicts(self.records[[i]])[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.to_dicts())
+
+    def to_dicts(self) -> List[Dict]:
+        return self._to_dicts(self.records)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: 包含 type、symbol、price、quantity、time（datetime64）和 amount 列的 DataFrame
+        """
+        records = self.records
+        return pd.DataFrame({
+            'type': np.where(records['side'] == BUY, 'buy', 'sell'),
+            'symbol': np.array(self.symbols, dtype=object)[records['symbol']] if self.symbols else np.array([], dtype=object),
+            'price': records['price'],
+            'quantity': records['quantity'],
+            'time': records['time'].astype('datetime64[s]'),
+            'amount': records['amount'],
+        })
+
+    def select(self, symbol: Optional[str] = None, start_time: Optional[Timestamp] = None, end_time: Optional[Timestamp] = None,
+               side: Optional[int] = None) -> np.ndarray:
+        """
+        按条件筛选成交记录。
+
+        :return: 满足条件的记录下标
+        """
+        records = self.records
+        mask = np.ones(len(records), dtype=bool)
+        if symbol is not None:
+            j = self.symbol_index.get(symbol)
+            if j is None:
+                return np.zeros(0, dtype=np.int64)
+            mask &= records['symbol'] == j
+        if start_time is not None:
+            mask &= records['time'] >= to_epoch_seconds(start_time)
+        if end_time is not None:
+            mask &= records['time'] <= to_epoch_seconds(end_time)
+        if side is not None:
+            mask &= records['side'] == side
+        return np.flatnonzero(mask)
+
+    def clear(self):
+        self._size = 0
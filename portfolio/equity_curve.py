@@ -0,0 +1,173 @@
+# portfolio/equity_curve.py
+
+import numpy as np
+import pandas as pd
+from datetime import date, datetime
+from typing import Dict, List, Mapping, Optional, Tuple
+from orders import TransactionLog
+from backtest.price_panel import PricePanel
+
+
+def _forward_fill(block: np.ndarray, previous: Optional[np.ndarray]) -> np.ndarray:
+    """
+    沿时间轴（第 0 维）向前填充 NaN，previous 为 block 之前一行已填充好的价格。
+    """
+    if previous is not None:
+        block = np.vstack([previous[np.newaxis, :], block])
+    rows = np.where(np.isnan(block), 0, np.arange(len(block))[:, np.newaxis])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = block[rows, np.arange(block.shape[1])]
+    return filled[1:] if previous is not None else filled
+
+
+class EquityCurve:
+    """
+    按日逐市值计价的组合净值曲线。
+
+    由成交记录和日线价格面板计算每日现金、各股票持仓和总市值：现金与持仓是按日汇总的
+    成交变化量的累加和，持仓按当日收盘价估值，当日没有收盘价时沿用最近一次的收盘价或成交价。
+    估值应使用不复权价格，否则与成交价不可比。
+
+    结果会缓存；再次 update 时若只是追加了成交、价格面板新增了日期或最新价格变化，
+    只从受影响的第一天开始重新计算，之前的行保持不变。
+    """
+
+    def __init__(self, initial_cash: float):
+        """
+        :param initial_cash: 初始资金
+        """
+        self.initial_cash = initial_cash
+        self._reset()
+
+    def _reset(self):
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.symbols: List[str] = []
+        self.cash = np.zeros(0)
+        self.positions = np.zeros((0, 0), dtype=np.int64)
+        self.prices = np.zeros((0, 0))
+        self._key: Optional[Tuple] = None
+        self._n_transactions = 0
+        self._marks_key: Optional[Tuple] = None
+        self._frame: Optional[pd.DataFrame] = None
+
+    def update(self, transactions: TransactionLog, panel: Optional[PricePanel] = None,
+               latest_prices: Optional[Mapping[str, float]] = None, as_of: Optional[date] = None) -> pd.DataFrame:
+        """
+        计算（或增量更新）净值曲线。
+
+        :param transactions: 成交记录
+        :param panel: 日线收盘价面板，None 表示只用成交价估值
+        :param latest_prices: 最新价格，用于给 as_of 当天估值
+        :param as_of: 最新价格对应的日期，默认为今天
+        :return: 以日期为索引，包含 cash、holdings_value、total_value 列的 DataFrame
+        """
+        n_transactions = len(transactions)
+        marks_key = (as_of, tuple(sorted(latest_prices.items()))) if latest_prices else None
+        if (self._frame is not None and n_transactions == self._n_transactions and marks_key == self._marks_key
+                and self._key is not None and self._key[0] is panel and self._key[1] == self.initial_cash):
+            return self._frame
+
+        records = transactions.records
+        if n_transactions == 0:
+            self._reset()
+            self._frame = pd.DataFrame(columns=['cash', 'holdings_value', 'total_value'], dtype=float)
+            return self._frame
+
+        trade_days = records['time'].astype('datetime64[s]').astype('datetime64[D]')
+        first_day = trade_days.min()
+        marks_day = None
+        if latest_prices:
+            marks_day = np.datetime64(as_of or datetime.now().date(), 'D')
+
+        # 日期轴：第一笔成交之后的面板日期、成交日和最新价格日
+        parts = [trade_days]
+        if panel is not None and len(panel):
+            parts.append(panel.dates[panel.dates >= first_day])
+        if marks_day is not None and marks_day >= first_day:
+            parts.append(np.array([marks_day]))
+        dates = np.unique(np.concatenate(parts))
+
+        # 列：面板中的股票在前，只出现在成交记录中的股票在后
+        panel_symbols = panel.symbols if panel is not None else []
+        extra = [symbol for symbol in transactions.symbols if panel is None or symbol not in panel.symbol_index]
+        symbols = list(panel_symbols) + extra
+        key = (panel, self.initial_cash, tuple(symbols))
+
+        # 从受影响的第一天开始重算：日期轴只在末尾追加、股票不变且成交只追加时增量计算
+        start = 0
+        old_length = len(self.dates)
+        if (self._key is not None and self._key[0] is panel and self._key[1:] == key[1:]
+                and n_transactions >= self._n_transactions and old_length > 0 and len(dates) >= old_length
+                and np.array_equal(dates[:old_length], self.dates)):
+            # 最后一天的价格可能被最新价格覆盖过，总是重算
+            start = old_length - 1
+            if n_transactions > self._n_transactions:
+                new_first = np.searchsorted(dates, trade_days[self._n_transactions:].min())
+                start = min(start, int(new_first))
+
+        self._compute(records, trade_days, transactions.symbols, dates, symbols, panel, latest_prices, marks_day, start)
+        self._key = key
+        self._n_transactions = n_transactions
+        self._marks_key = marks_key
+
+        holdings_value = np.where(self.positions != 0, self.positions * np.nan_to_num(self.prices), 0.0).sum(axis=1)
+        self._frame = pd.DataFrame({
+            'cash': self.cash,
+            'holdings_value': holdings_value,
+            'total_value': self.cash + holdings_value,
+        }, index=pd.DatetimeIndex(self.dates.astype('datetime64[ns]'), name='date'))
+        return self._frame
+
+    def _compute(self, records: np.ndarray, trade_days: np.ndarray, log_symbols: List[str], dates: np.ndarray,
+                 symbols: List[str], panel: Optional[PricePanel], latest_prices: Optional[Mapping[str, float]],
+                 marks_day: Optional[np.datetime64], start: int):
+        n_dates, n_symbols = len(dates), len(symbols)
+        column: Dict[str, int] = {symbol: j for j, symbol in enumerate(symbols)}
+        tail = n_dates - start
+
+        # 原始价格：面板收盘价，缺失时用当天最后一笔成交价，最新价格覆盖 marks_day 当天
+        raw = np.full((tail, n_symbols), np.nan)
+        if panel is not None and len(panel):
+            in_range = panel.dates >= dates[start]
+            rows = np.searchsorted(dates, panel.dates[in_range]) - start
+            raw[rows, :len(panel.symbols)] = panel.field('close')[in_range]
+
+        affected = trade_days >= dates[start]
+        order = np.flatnonzero(affected)
+        order = order[np.argsort(records['time'][order], kind='stable')]
+        trade_rows = np.searchsorted(dates, trade_days[order]) - start
+        log_to_column = np.array([column[symbol] for symbol in log_symbols], dtype=np.int64)
+        trade_columns = log_to_column[records['symbol'][order]]
+        missing = np.isnan(raw[trade_rows, trade_columns])
+        # 同一天同一股票多笔成交时，按时间顺序赋值，最后一笔生效
+        raw[trade_rows[missing], trade_columns[missing]] = records['price'][order][missing]
+
+        if latest_prices and marks_day is not None and marks_day >= dates[start]:
+            row = int(np.searchsorted(dates, marks_day)) - start
+            for symbol, price in latest_prices.items():
+                j = column.get(symbol)
+                if j is not None and price and price > 0:
+                    raw[row, j] = price
+
+        previous_prices = self.prices[start - 1] if start > 0 else None
+        prices = _forward_fill(raw, previous_prices)
+
+        # 成交带来的现金与持仓变化，按日汇总后累加
+        sides = records['side'][order].astype(np.int64)
+        cash_delta = np.bincount(trade_rows, weights=-sides * records['amount'][order], minlength=tail)
+        position_delta = np.zeros((tail, n_symbols), dtype=np.int64)
+        np.add.at(position_delta, (trade_rows, trade_columns), sides * records['quantity'][order])
+
+        base_cash = self.cash[start - 1] if start > 0 else self.initial_cash
+        base_positions = self.positions[start - 1] if start > 0 else np.zeros(n_symbols, dtype=np.int64)
+        cash = base_cash + np.cumsum(cash_delta)
+        positions = base_positions + np.cumsum(position_delta, axis=0)
+
+        if start > 0:
+            self.cash = np.concatenate([self.cash[:start], cash])
+            self.positions = np.vstack([self.positions[:start], positions])
+            self.prices = np.vstack([self.prices[:start], prices])
+        else:
+            self.cash, self.positions, self.prices = cash, positions, prices
+        self.dates = dates
+        self.symbols = symbols
@@ -1,18 +1,22 @@
 # portfolio/portfolio.py
 
 import logging
+import numpy as np
 from datetime import datetime
 from typing import Dict, Optional, List
 from storage.storage import Storage
 from data.data_fetcher import DataFetcher
 from config.config import INITIAL_CASH, TRANSACTION_COST_RATE, SLIPPAGE_RATE
+from orders import BUY, SELL, TransactionLog
+from utils.metrics import metrics
 
 class Portfolio:
     def __init__(self, initial_cash: float = INITIAL_CASH, data_fetcher: Optional[DataFetcher] = None, storage: Optional[Storage] = None, simulate_costs: bool = False):
         self.initial_cash = initial_cash
         self.cash = initial_cash
         self.holdings: Dict[str, int] = {}  # symbol: quantity
-        self.transactions = []
+        self._transactions: Optional[TransactionLog] = None
+        self._transactions_version = None
         self.data_fetcher = data_fetcher
         self.storage = storage if storage else Storage()
         self.buy_lots: Dict[str, List[Dict[str, float]]] = {}
@@ -21,26 +25,73 @@ class Portfolio:
         self.load_portfolio()
 
     def load_portfolio(self):
-        data = self.storage.load()
+        with metrics.span('storage.load', backend=type(self.storage).__name__):
+            data = self.storage.load()
         self.cash = data.get('cash', self.initial_cash)
         self.holdings = data.get('holdings', {})
-        self.transactions = data.get('transactions', [])
+        if 'transactions' in data or not hasattr(self.storage, 'load_transactions'):
+            self.transactions = TransactionLog.from_dicts(data.get('transactions', []))
+        elif self._transactions is not None and self.storage.transactions_version() != self._transactions_version:
+            # 其他进程写入过交易记录，下次访问时重新读取
+            self._transactions = None
         self.buy_lots = data.get('buy_lots', {})
         self.latest_prices = data.get('latest_prices', {})
         if self.latest_prices == {} and self.data_fetcher is not None:
-            for symbol in self.holdings:
-                self.latest_prices[symbol] = self.data_fetcher.fetch_current_price(symbol)
+            self.latest_prices.update(self.data_fetcher.fetch_current_prices(list(self.holdings)))
             self.save_portfolio()
 
-    def save_portfolio(self):
-        data = {
+    @property
+    def transactions(self) -> TransactionLog:
+        """
+        成交记录。存储按需提供交易记录时（如 SQLiteStorage），加载持仓不读取交易记录，
+        首次访问时才读取一次，之后随本进程的交易在内存中追加。
+        """
+        if self._transactions is None:
+            with metrics.span('storage.load_transactions', backend=type(self.storage).__name__):
+                self._transactions = TransactionLog.from_dicts(self.storage.load_transactions())
+            self._sync_transactions_version()
+        return self._transactions
+
+    @transactions.setter
+    def transactions(self, transactions: TransactionLog):
+        self._transactions = transactions
+
+    def _sync_transactions_version(self):
+        """记录内存中的交易记录对应的存储版本，用于发现其他进程写入的交易记录"""
+        if self._transactions is not None and hasattr(self.storage, 'transactions_version'):
+            self._transactions_version = self.storage.transactions_version()
+
+    def _state(self) -> Dict:
+        state = {
             'cash': self.cash,
             'holdings': self.holdings,
-            'transactions': self.transactions,
             'buy_lots': self.buy_lots,
             'latest_prices': self.latest_prices
         }
-        self.storage.save(data)
+        # 尚未读取的交易记录不写回，存储中已有的记录保持不变
+        if self._transactions is not None:
+            state['transactions'] = self._transactions
+        return state
+
+    def save_portfolio(self):
+        with metrics.span('storage.save', backend=type(self.storage).__name__):
+            self.storage.save(self._state())
+        self._sync_transactions_version()
+
+    def _record_trade(self, symbol: str, transaction: Dict):
+        """
+        持久化一笔交易，只记录这笔交易涉及的现金、持仓和买入批次变化。
+        """
+        record = {
+            'cash': self.cash,
+            'symbol': symbol,
+            'holding': self.holdings.get(symbol, 0),
+            'buy_lots': self.buy_lots.get(symbol, []),
+            'transaction': transaction
+        }
+        with metrics.span('storage.append', backend=type(self.storage).__name__):
+            self.storage.append(record, self._state())
+        self._sync_transactions_version()
 
     def buy_stock(self, symbol: str, price: float, quantity: int, time: str):
         cost = price * quantity
@@ -51,20 +102,13 @@ class Portfolio:
         if self.cash >= cost:
             self.cash -= cost
             self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
-            self.transactions.append({
-                'type': 'buy',
-                'symbol': symbol,
-                'price': price,
-                'quantity': quantity,
-                'time': time,
-                'cost': cost
-            })
+            self.transactions.append(BUY, symbol, price, quantity, time, cost)
             logging.info(f"买入 {symbol} - 数量: {quantity}, 价格: {price}, 成本: ￥{cost:.2f}")
             # 更新买入批次
             if symbol not in self.buy_lots:
                 self.buy_lots[symbol] = []
             self.buy_lots[symbol].append({'price': price, 'quantity': quantity})
-            self.save_portfolio()
+            self._record_trade(symbol, self.transactions[-1])
         else:
             logging.warning(f"现金不足，无法买入 {symbol} - 需要: ￥{cost:.2f}, 可用: ￥{self.cash:.2f}")
 
@@ -79,14 +123,7 @@ class Portfolio:
             self.holdings[symbol] -= quantity
             if self.holdings[symbol] == 0:
                 del self.holdings[symbol]
-            self.transactions.append({
-                'type': 'sell',
-                'symbol': symbol,
-                'price': price,
-                'quantity': quantity,
-                'time': time,
-                'revenue': revenue
-            })
+            self.transactions.append(SELL, symbol, price, quantity, time, revenue)
             logging.info(f"卖出 {symbol} - 数量: {quantity}, 价格: {price}, 收益: ￥{revenue:.2f}")
             # 更新买入批次（FIFO）
             if symbol in self.buy_lots:
@@ -101,10 +138,47 @@ class Portfolio:
                         self.buy_lots[symbol].pop(0)
                 if not self.buy_lots[symbol]:
                     del self.buy_lots[symbol]
-            self.save_portfolio()
+            self._record_trade(symbol, self.transactions[-1])
         else:
             logging.warning(f"持仓不足，无法卖出 {symbol} - 尝试卖出: {quantity}, 持有: {self.holdings.get(symbol, 0)}")
 
+    def query_transactions(self, symbol: Optional[str] = None, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                           trade_type: Optional[str] = None, limit: Optional[int] = None, offset: int = 0,
+                           descending: bool = True) -> List[Dict]:
+        """
+        按条件分页查询交易记录。存储支持查询时（如 SQLiteStorage）直接走索引查询，
+        否则在内存中的交易记录上过滤。
+
+        :param symbol: 股票代码
+        :param start_time: 开始时间（含），格式 'YYYY-MM-DD HH:MM:SS'
+        :param end_time: 结束时间（含），格式同上
+        :param trade_type: 'buy' 或 'sell'
+        :param limit: 最多返回的条数，None 表示不限
+        :param offset: 跳过的条数
+        :param descending: 是否按时间倒序
+        :return: 交易记录列表
+        """
+        if hasattr(self.storage, 'query_transactions'):
+            return self.storage.query_transactions(symbol=symbol, start_time=start_time, end_time=end_time,
+                                                   trade_type=trade_type, limit=limit, offset=offset, descending=descending)
+        matched = self._select_transactions(symbol, start_time, end_time, trade_type)
+        times = self.transactions.records['time'][matched]
+        matched = matched[np.argsort(-times if descending else times, kind='stable')]
+        return [self.transactions[int(i)] for i in matched[offset:None if limit is None else offset + limit]]
+
+    def count_transactions(self, symbol: Optional[str] = None, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                           trade_type: Optional[str] = None) -> int:
+        """
+        统计符合条件的交易记录条数，参数含义同 query_transactions。存储支持统计时不读取交易记录。
+        """
+        if hasattr(self.storage, 'count_transactions'):
+            return self.storage.count_transactions(symbol=symbol, start_time=start_time, end_time=end_time, trade_type=trade_type)
+        return len(self._select_transactions(symbol, start_time, end_time, trade_type))
+
+    def _select_transactions(self, symbol, start_time, end_time, trade_type) -> np.ndarray:
+        side = None if trade_type is None else (BUY if trade_type == 'buy' else SELL)
+        return self.transactions.select(symbol=symbol, start_time=start_time, end_time=end_time, side=side)
+
     def get_portfolio_value(self) -> float:
         total = self.cash
         for symbol, qty in self.holdings.items():
@@ -131,8 +205,10 @@ class Portfolio:
     def reset_portfolio(self):
         self.cash = self.initial_cash
         self.holdings = {}
-        self.transactions = []
+        self.transactions = TransactionLog()
         self.buy_lots = {}
         self.latest_prices = {}
-        self.save_portfolio()
+        with metrics.span('storage.reset', backend=type(self.storage).__name__):
+            self.storage.reset(self._state())
+        self._sync_transactions_version()
         logging.info("组合已重置。")
\ No newline at end of file
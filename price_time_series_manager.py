@@ -1,9 +1,129 @@
 # price_time_series_manager.py
 
-from collections import OrderedDict
-from typing import Dict
+import numpy as np
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+from datetime import datetime
 import threading
 
+Timestamp = Union[str, datetime, np.datetime64, int]
+
+
+def to_epoch_seconds(timestamp: Timestamp) -> int:
+    """
+    将时间戳转换为 Unix 秒数。
+
+    :param timestamp: 'YYYY-MM-DD HH:MM:SS' 字符串、datetime、np.datetime64 或已经是秒数的整数
+    :return: Unix 秒数
+    """
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    return int(np.datetime64(timestamp, 's').astype(np.int64))
+
+
+class PriceRingBuffer:
+    """
+    单只股票的定长价格环形缓冲区，价格为 float64、时间戳为 int64（Unix 秒）。
+
+    数据在长度为 2 × capacity 的数组中镜像写入两份，因此任意长度的最近窗口都是一段连续内存，
+    window(n) 直接返回视图而不拷贝。底层数组也可以由外部传入（如共享内存）。
+    """
+
+    def __init__(self, capacity: int, values: Optional[np.ndarray] = None, timestamps: Optional[np.ndarray] = None,
+                 meta: Optional[np.ndarray] = None):
+        """
+        :param capacity: 最多保留的价格个数
+        :param values: 外部提供的 float64 数组，长度 2 × capacity
+        :param timestamps: 外部提供的 int64 数组，长度 2 × capacity
+        :param meta: 外部提供的 int64 数组，meta[0] 为累计写入次数
+        """
+        self.capacity = capacity
+        self._values = values if values is not None else np.zeros(2 * capacity, dtype=np.float64)
+        self._timestamps = timestamps if timestamps is not None else np.zeros(2 * capacity, dtype=np.int64)
+        self._meta = meta if meta is not None else np.zeros(1, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return int(min(self._meta[0], self.capacity))
+
+    def _head(self) -> int:
+        """最新一个价格在前半段数组中的位置"""
+        return int((self._meta[0] - 1) % self.capacity)
+
+    def append(self, timestamp: int, price: float):
+        """
+        追加一个价格；时间戳与最新一个相同时覆盖最新价格。
+
+        :param timestamp: Unix 秒数
+        :param price: 价格
+        """
+        written = int(self._meta[0])
+        if written > 0 and self._timestamps[self._head()] == timestamp:
+            pos = self._head()
+        else:
+            pos = written % self.capacity
+            self._timestamps[pos] = self._timestamps[pos + self.capacity] = timestamp
+            written += 1
+        self._values[pos] = self._values[pos + self.capacity] = price
+        self._meta[0] = written
+
+    def last(self) -> float:
+        """:return: 最新价格，没有数据时为 NaN"""
+        written = int(self._meta[0])
+        if written == 0:
+            return float('nan')
+        return float(self._values[(written - 1) % self.capacity])
+
+    def last_timestamp(self) -> Optional[int]:
+        """:return: 最新价格的时间戳（Unix 秒），没有数据时为 None"""
+        written = int(self._meta[0])
+        if written == 0:
+            return None
+        return int(self._timestamps[(written - 1) % self.capacity])
+
+    def _window_slice(self, n: Optional[int]) -> slice:
+        # 只读取一次写入次数，长度和末尾位置来自同一时刻
+        written = int(self._meta[0])
+        count = min(written, self.capacity)
+        n = count if n is None else max(0, min(n, count))
+        end = (written - 1) % self.capacity + self.capacity + 1
+        return slice(end - n, end)
+
+    def window(self, n: Optional[int] = None) -> np.ndarray:
+        """
+        获取最近 n 个价格（按时间从早到晚），为底层数组的只读视图。
+
+        :param n: 窗口长度，None 表示全部
+        :return: 价格数组视图
+        """
+        view = self._values[self._window_slice(n)]
+        view.flags.writeable = False
+        return view
+
+    def timestamp_window(self, n: Optional[int] = None) -> np.ndarray:
+        """
+        获取最近 n 个时间戳（Unix 秒），为底层数组的只读视图。
+
+        :param n: 窗口长度，None 表示全部
+        :return: 时间戳数组视图
+        """
+        view = self._timestamps[self._window_slice(n)]
+        view.flags.writeable = False
+        return view
+
+    def values(self) -> np.ndarray:
+        """兼容旧接口，等同于 window()"""
+        return self.window()
+
+    def items(self) -> List[Tuple[str, float]]:
+        """
+        :return: (时间戳字符串, 价格) 列表，会拷贝数据，仅用于展示
+        """
+        timestamps = np.datetime_as_string(self.timestamp_window().astype('datetime64[s]'), unit='s')
+        return [(ts.replace('T', ' '), float(price)) for ts, price in zip(timestamps, self.window())]
+
+    def clear(self):
+        self._meta[0] = 0
+
+
 class PriceTimeSeriesManager:
     _instance = None
     _lock = threading.Lock()
@@ -16,22 +136,76 @@ class PriceTimeSeriesManager:
                     cls._instance._initialize(max_length)
         return cls._instance
 
+    @classmethod
+    def create_local(cls, max_length=100) -> 'PriceTimeSeriesManager':
+        """
+        创建独立于全局单例的价格管理器，供回测等需要隔离价格时序的场景使用。
+
+        :param max_length: 每只股票保留的价格个数
+        """
+        manager = super(PriceTimeSeriesManager, cls).__new__(cls)
+        manager._initialize(max_length)
+        return manager
+
     def _initialize(self, max_length):
-        self.price_time_series: Dict[str, OrderedDict] = {}
+        self.price_time_series: Dict[str, PriceRingBuffer] = {}
         self.max_length = max_length
+        self.shared_store = None
+
+    def use_shared_store(self, store):
+        """
+        改为使用跨进程共享的价格存储，之后的读写都转发给它。
+
+        :param store: SharedPriceStore，传入 None 恢复为进程内存储
+        """
+        self.shared_store = store
+        if store is not None:
+            self.max_length = store.capacity
+
+    @property
+    def writable(self) -> bool:
+        """当前进程是否可以写入价格（以只读方式挂载共享存储时不可写）"""
+        return self.shared_store is None or self.shared_store.writable
+
+    def _buffer(self, symbol: str) -> PriceRingBuffer:
+        buffer = self.price_time_series.get(symbol)
+        if buffer is None:
+            buffer = self.price_time_series[symbol] = PriceRingBuffer(self.max_length)
+        return buffer
+
+    def add_price(self, symbol: str, timestamp: Timestamp, price: float):
+        if self.shared_store is not None:
+            self.shared_store.add_price(symbol, timestamp, price)
+            return
+        self._buffer(symbol).append(to_epoch_seconds(timestamp), price)
+
+    def add_prices(self, timestamp: Timestamp, prices: Mapping[str, float]):
+        """
+        批量写入同一时刻多只股票的价格。
 
-    def add_price(self, symbol: str, timestamp: str, price: float):
-        if symbol not in self.price_time_series:
-            self.price_time_series[symbol] = OrderedDict()
-        self.price_time_series[symbol][timestamp] = price
-        if len(self.price_time_series[symbol]) > self.max_length:
-            self.price_time_series[symbol].popitem(last=False)
+        :param timestamp: 时间戳
+        :param prices: 股票代码到价格的映射
+        """
+        if self.shared_store is not None:
+            self.shared_store.add_prices(timestamp, prices)
+            return
+        ts = to_epoch_seconds(timestamp)
+        for symbol, price in prices.items():
+            self._buffer(symbol).append(ts, price)
 
-    def get_series(self, symbol: str) -> OrderedDict:
-        return self.price_time_series.get(symbol, OrderedDict())
+    def get_series(self, symbol: str) -> PriceRingBuffer:
+        if self.shared_store is not None:
+            return self.shared_store.get_series(symbol)
+        return self.price_time_series.get(symbol, PriceRingBuffer(1))
 
-    def get_all_series(self) -> Dict[str, OrderedDict]:
+    def get_all_series(self) -> Dict[str, PriceRingBuffer]:
+        if self.shared_store is not None:
+            return self.shared_store.get_all_series()
         return self.price_time_series
 
     def clear(self):
-        self.price_time_series.clear()
\ No newline at end of file
+        if self.shared_store is not None:
+            if self.shared_store.writable:
+                self.shared_store.clear()
+            return
+        self.price_time_series.clear()
@@ -0,0 +1,217 @@
+# shared_price_store.py
+
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Mapping, Optional, TypeVar
+from price_time_series_manager import PriceRingBuffer, Timestamp, to_epoch_seconds
+from config.config import SHARED_PRICE_READ_RETRIES
+
+T = TypeVar('T')
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    挂载已存在的共享内存，且不登记到本进程的资源跟踪器，
+    否则读进程退出时会把写进程创建的共享内存一并删除。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    block = shared_memory.SharedMemory(name=name)
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(block._name, 'shared_memory')
+    return block
+
+
+class SharedPriceStore:
+    """
+    跨进程共享的价格时序存储，单写多读。
+
+    所有股票的环形缓冲区放在同一块共享内存中，写进程（如行情进程）通过 add_price/add_prices 更新，
+    其他进程（Streamlit、回测、工作进程）挂载后通过 get_series、get_all_series 或 snapshot 读取，无需重新获取。
+    每只股票有一个序号锁（seqlock）：写入前后各加一，读者拷贝数据后若序号为奇数或前后不一致则让出 CPU 后重读，
+    重读超过 SHARED_PRICE_READ_RETRIES 次（写进程在写入中途退出）时抛出 TimeoutError。
+    读者只拿到校验过的拷贝，不加锁、不阻塞写者，也不会看到写了一半的价格。
+    """
+
+    MAGIC = 0x50524943  # 'PRIC'
+    HEADER_FIELDS = 4  # magic, max_symbols, capacity, n_symbols
+    SYMBOL_DTYPE = np.dtype('S16')
+
+    def __init__(self, block: shared_memory.SharedMemory, max_symbols: int, capacity: int, writable: bool):
+        self.block = block
+        self.max_symbols = max_symbols
+        self.capacity = capacity
+        self.writable = writable
+
+        buf = block.buf
+        offset = 0
+
+        def take(dtype, shape):
+            nonlocal offset
+            array = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self.header = take(np.int64, (self.HEADER_FIELDS,))
+        self.symbols = take(self.SYMBOL_DTYPE, (max_symbols,))
+        self.seq = take(np.int64, (max_symbols,))
+        self.meta = take(np.int64, (max_symbols,))
+        self.values = take(np.float64, (max_symbols, 2 * capacity))
+        self.timestamps = take(np.int64, (max_symbols, 2 * capacity))
+        self._index: Dict[str, int] = {}
+        self._buffers: Dict[str, PriceRingBuffer] = {}
+
+    @classmethod
+    def _size(cls, max_symbols: int, capacity: int) -> int:
+        return (cls.HEADER_FIELDS * 8 + max_symbols * (cls.SYMBOL_DTYPE.itemsize + 8 + 8)
+                + max_symbols * 2 * capacity * (8 + 8))
+
+    @classmethod
+    def create(cls, name: Optional[str], max_symbols: int, capacity: int) -> 'SharedPriceStore':
+        """
+        创建共享存储，调用方即为唯一的写进程，退出前应调用 unlink。
+
+        :param name: 共享内存名，None 表示自动生成
+        :param max_symbols: 最多容纳的股票数
+        :param capacity: 每只股票保留的价格个数
+        """
+        block = shared_memory.SharedMemory(name=name, create=True, size=cls._size(max_symbols, capacity))
+        store = cls(block, max_symbols, capacity, writable=True)
+        store.header[:] = (cls.MAGIC, max_symbols, capacity, 0)
+        store.seq[:] = 0
+        store.meta[:] = 0
+        return store
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedPriceStore':
+        """
+        以只读方式挂载已存在的共享存储。
+
+        :param name: 共享内存名
+        """
+        block = _attach_untracked(name)
+        header = np.ndarray((cls.HEADER_FIELDS,), dtype=np.int64, buffer=block.buf)
+        if header[0] != cls.MAGIC:
+            block.close()
+            raise ValueError(f"共享内存 {name} 不是价格存储")
+        return cls(block, int(header[1]), int(header[2]), writable=False)
+
+    @property
+    def name(self) -> str:
+        return self.block.name
+
+    def _refresh_index(self):
+        n_symbols = int(self.header[3])
+        for j in range(len(self._index), n_symbols):
+            self._index[self.symbols[j].decode()] = j
+
+    def _slot(self, symbol: str, create: bool) -> Optional[int]:
+        j = self._index.get(symbol)
+        if j is None:
+            self._refresh_index()
+            j = self._index.get(symbol)
+        if j is None and create:
+            j = int(self.header[3])
+            if j >= self.max_symbols:
+                raise ValueError(f"共享价格存储已满，最多 {self.max_symbols} 只股票")
+            self.symbols[j] = symbol.encode()
+            self.meta[j] = 0
+            # 先写好代码再发布股票数，读者看到新股票时代码已经完整
+            self.header[3] = j + 1
+            self._index[symbol] = j
+        return j
+
+    def _buffer(self, j: int) -> PriceRingBuffer:
+        return PriceRingBuffer(self.capacity, values=self.values[j], timestamps=self.timestamps[j], meta=self.meta[j:j + 1])
+
+    def add_price(self, symbol: str, timestamp: Timestamp, price: float):
+        self.add_prices(timestamp, {symbol: price})
+
+    def add_prices(self, timestamp: Timestamp, prices: Mapping[str, float]):
+        """
+        批量写入同一时刻多只股票的价格，只有写进程可以调用。
+
+        :param timestamp: 时间戳
+        :param prices: 股票代码到价格的映射
+        """
+        if not self.writable:
+            raise PermissionError("只读挂载的共享价格存储不能写入")
+        ts = to_epoch_seconds(timestamp)
+        for symbol, price in prices.items():
+            j = self._slot(symbol, create=True)
+            buffer = self._buffers.get(symbol)
+            if buffer is None:
+                buffer = self._buffers[symbol] = self._buffer(j)
+            self.seq[j] += 1
+            buffer.append(ts, price)
+            self.seq[j] += 1
+
+    def _read(self, symbol: str, j: int, read: Callable[[], T]) -> T:
+        """
+        在序号锁保护下读取：序号为奇数（写入中）或读取前后不一致时让出 CPU 后重读。
+
+        :param symbol: 股票代码，用于报错
+        :param j: 股票所在的槽位
+        :param read: 拷贝数据的函数
+        :return: read 的返回值
+        """
+        for attempt in range(SHARED_PRICE_READ_RETRIES):
+            before = int(self.seq[j])
+            if before % 2 == 0:
+                result = read()
+                if int(self.seq[j]) == before:
+                    return result
+            # 先让出 CPU，多次失败后退避等待写者完成
+            time.sleep(0 if attempt < 10 else 0.001)
+        raise TimeoutError(f"读取 {symbol} 的共享价格超时，写进程可能在写入中途退出")
+
+    def get_series(self, symbol: str) -> PriceRingBuffer:
+        """
+        获取某只股票价格缓冲区的一致性拷贝，之后的写入不会影响返回的缓冲区。
+
+        :param symbol: 股票代码
+        """
+        j = self._slot(symbol, create=False)
+        if j is None:
+            return PriceRingBuffer(1)
+        return self._read(symbol, j, lambda: PriceRingBuffer(self.capacity, values=self.values[j].copy(),
+                                                             timestamps=self.timestamps[j].copy(), meta=self.meta[j:j + 1].copy()))
+
+    def get_all_series(self) -> Dict[str, PriceRingBuffer]:
+        """获取全部股票价格缓冲区的一致性拷贝，见 get_series"""
+        self._refresh_index()
+        return {symbol: self.get_series(symbol) for symbol in self._index}
+
+    def snapshot(self, symbol: str, n: Optional[int] = None) -> np.ndarray:
+        """
+        读取最近 n 个价格的一致性拷贝。
+
+        :param symbol: 股票代码
+        :param n: 窗口长度，None 表示全部
+        """
+        j = self._slot(symbol, create=False)
+        if j is None:
+            return np.empty(0)
+        buffer = self._buffer(j)
+        return self._read(symbol, j, lambda: np.array(buffer.window(n)))
+
+    def clear(self):
+        if not self.writable:
+            raise PermissionError("只读挂载的共享价格存储不能清空")
+        for j in range(int(self.header[3])):
+            self.seq[j] += 1
+            self.meta[j] = 0
+            self.seq[j] += 1
+
+    def close(self):
+        """断开与共享内存的连接"""
+        self._buffers.clear()
+        self.header = self.symbols = self.seq = self.meta = self.values = self.timestamps = None
+        self.block.close()
+
+    def unlink(self):
+        """删除共享内存，仅由写进程在退出时调用"""
+        self.close()
+        self.block.unlink()
@@ -0,0 +1,88 @@
+# storage/signal_store.py
+
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from orders import OrderBatch
+from config.config import SIGNAL_STORE_FILE
+
+
+class SignalStore:
+    """
+    后台服务与界面之间交换交易信号的本地文件。
+
+    后台服务每轮计算后整体替换文件（先写临时文件再 os.replace），界面只读；
+    每次发布带有递增的 run_id，界面据此判断是否有新一批信号。读取时按文件修改时间缓存，
+    文件未变化时不重新解析。
+    """
+
+    def __init__(self, filepath: str = SIGNAL_STORE_FILE):
+        """
+        :param filepath: 信号文件路径
+        """
+        self.filepath = filepath
+        self._cache: Optional[Tuple[float, Dict]] = None
+
+    def publish(self, buy_trades: OrderBatch, sell_trades: OrderBatch, **status) -> Dict:
+        """
+        发布一批新的交易信号，覆盖上一批。
+
+        :param buy_trades: 买入信号
+        :param sell_trades: 卖出信号
+        :param status: 附加的运行信息，如 duration、num_symbols
+        :return: 写入的内容
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        signals: List[Dict] = []
+        for side, trades in (('buy', buy_trades), ('sell', sell_trades)):
+            for trade in trades:
+                signals.append({'type': side, 'symbol': trade.symbol, 'price': trade.price,
+                                'quantity': trade.quantity, 'time': now})
+        previous = self.read()
+        content = {
+            'run_id': previous.get('run_id', 0) + 1,
+            'generated_at': now,
+            'status': 'ok',
+            **status,
+            'signals': signals,
+        }
+        self._write(content)
+        return content
+
+    def publish_error(self, error: str, **status) -> Dict:
+        """
+        记录一次失败的运行，保留上一批信号，只更新状态。
+
+        :param error: 错误信息
+        """
+        content = dict(self.read())
+        content.update(status, status='error', error=error, failed_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self._write(content)
+        return content
+
+    def _write(self, content: Dict):
+        tmp_path = self.filepath + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(content, f, ensure_ascii=False)
+        os.replace(tmp_path, self.filepath)
+
+    def read(self) -> Dict:
+        """
+        :return: 最近一次发布的内容，文件不存在或损坏时返回空字典
+        """
+        try:
+            mtime = os.path.getmtime(self.filepath)
+        except OSError:
+            return {}
+        if self._cache is not None and self._cache[0] == mtime:
+            return self._cache[1]
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"读取信号文件失败: {e}")
+            return {}
+        self._cache = (mtime, content)
+        return content
@@ -3,8 +3,17 @@
 import json
 import os
 import logging
-from typing import Dict
-from config.config import PORTFOLIO_FILE
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from config.config import PORTFOLIO_FILE, PORTFOLIO_DB_FILE, JOURNAL_SNAPSHOT_INTERVAL, STORAGE_BACKEND
+
+def _to_json(obj):
+    """json.dump 的 default 钩子：成交记录等列式对象转换为字典列表"""
+    if hasattr(obj, 'to_dicts'):
+        return obj.to_dicts()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 
 class Storage:
     def __init__(self, filepath: str = PORTFOLIO_FILE):
@@ -25,5 +34,462 @@ class Storage:
             return {}
 
     def save(self, data: Dict):
-        with open(self.filepath, 'w') as f:
-            json.dump(data, f, indent=4)
\ No newline at end of file
+        # 先写临时文件再替换，写入中途崩溃不会损坏原文件
+        tmp_path = self.filepath + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=4, default=_to_json)
+        os.replace(tmp_path, self.filepath)
+
+    def append(self, record: Dict, data: Dict):
+        """
+        记录一笔交易带来的状态变化。默认直接保存完整状态，日志型存储会覆盖此方法。
+
+        :param record: 本次变化，包含 cash、symbol、holding、buy_lots、transaction
+        :param data: 变化后的完整状态
+        """
+        self.save(data)
+
+    def reset(self, data: Dict):
+        """
+        用 data 覆盖全部持仓数据，包括交易记录，用于重置持仓。
+
+        :param data: 重置后的完整状态
+        """
+        self.save(data)
+
+class MemoryStorage(Storage):
+    """
+    仅保存在内存中的存储，不读写任何文件，用于回测和参数扫描等不应触碰实盘持仓的场景。
+    """
+
+    def __init__(self, data: Dict = None):
+        self.filepath = None
+        self.data = dict(data) if data else {}
+
+    def load(self) -> Dict:
+        return dict(self.data)
+
+    def save(self, data: Dict):
+        self.data = data
+
+
+class JournalStorage(Storage):
+    """
+    快照 + 追加日志的持仓存储。
+
+    每笔交易只向日志文件追加一行 JSON，写入开销与历史长度无关；每累计
+    snapshot_interval 笔交易写一次紧凑快照并清空日志。启动时读取快照再重放日志。
+    日志记录带有递增序号，快照中保存已包含的最大序号，重放时跳过已在快照中的记录，
+    因此在写快照与清空日志之间崩溃也不会重复记账；末尾写了一半的记录会被忽略。
+
+    快照只包含现金、持仓、买入批次和最新价格，交易记录在写快照时追加到只增不改的
+    交易记录段文件中，写快照的开销与累计交易笔数无关。交易记录段中的每条记录同样带有序号，
+    重放日志时已写入交易记录段的交易不会重复添加。快照中记录交易记录段的条数和字节数，
+    load 只读取快照、日志和交易记录段中快照之后追加的部分，交易记录通过 load_transactions 按需读取。
+    """
+
+    def __init__(self, filepath: str = PORTFOLIO_FILE, snapshot_interval: int = JOURNAL_SNAPSHOT_INTERVAL):
+        """
+        :param filepath: 快照文件路径，日志文件为同名加 .journal 后缀，交易记录段为同名加 .transactions 后缀
+        :param snapshot_interval: 每多少笔交易写一次快照
+        """
+        self.journal_path = filepath + '.journal'
+        self.transactions_path = filepath + '.transactions'
+        self.snapshot_interval = snapshot_interval
+        self.seq = 0
+        self.pending = 0  # 上次快照之后追加的记录数
+        self.segment_count = 0  # 交易记录段中的记录数
+        self.segment_bytes = 0  # 交易记录段的字节数
+        self.unsegmented: List[Dict] = []  # 只在日志中、尚未写入交易记录段的交易记录（带序号）
+        self._journal = None
+        self._lock = threading.Lock()
+        super().__init__(filepath)
+
+    def load(self) -> Dict:
+        """
+        读取现金、持仓、买入批次和最新价格，开销与累计交易笔数无关。
+        交易记录不在此读取，通过 load_transactions 按需读取。
+        """
+        with self._lock:
+            data = super().load()
+            self.seq = data.pop('journal_seq', 0)
+            self.pending = 0
+            self.unsegmented = []
+            segment_seq = self._load_segment(data.pop('transactions', None), data.pop('transactions_count', None),
+                                             data.pop('transactions_bytes', None))
+
+            for record in self._read_records(self.journal_path, "持仓日志"):
+                if record['seq'] <= self.seq:
+                    continue
+                self._apply(data, record)
+                self.seq = record['seq']
+                self.pending += 1
+                if record['seq'] > segment_seq:
+                    self.unsegmented.append({'seq': record['seq'], **record['transaction']})
+            return data
+
+    def _load_segment(self, legacy: Optional[List[Dict]], count: Optional[int], size: Optional[int]) -> int:
+        """
+        确定交易记录段的条数、字节数和已包含的最大序号。快照记录的字节数与文件一致时不读取交易记录段；
+        在追加交易记录段与写快照之间崩溃时只读取快照之后追加的部分。
+
+        :param legacy: 旧版快照中保存的交易记录，交易记录段不存在时迁移到交易记录段
+        :param count: 快照记录的交易记录段条数
+        :param size: 快照记录的交易记录段字节数
+        :return: 交易记录段已包含的最大序号
+        """
+        if not os.path.exists(self.transactions_path):
+            self._write_transactions(legacy or [])
+            return self.seq
+        if count is None or size is None or os.path.getsize(self.transactions_path) < size:
+            records = self._read_records(self.transactions_path, "交易记录段")
+            self.segment_count = len(records)
+            self.segment_bytes = os.path.getsize(self.transactions_path)
+            return records[-1]['seq'] if records else 0
+        # 快照写入时交易记录段已包含快照之前的全部交易
+        tail = self._read_records(self.transactions_path, "交易记录段", offset=size)
+        self.segment_count = count + len(tail)
+        self.segment_bytes = os.path.getsize(self.transactions_path)
+        return tail[-1]['seq'] if tail else self.seq
+
+    def load_transactions(self) -> List[Dict]:
+        """
+        按写入顺序读取全部交易记录，包括只在日志中的记录。
+
+        :return: 交易记录列表
+        """
+        with self._lock:
+            records = self._read_records(self.transactions_path, "交易记录段") + self.unsegmented
+        return [{key: value for key, value in record.items() if key != 'seq'} for record in records]
+
+    def transactions_version(self) -> tuple:
+        """
+        交易记录的版本号，写入或重写交易记录后变化。
+
+        :return: (日志序号, 交易记录条数)
+        """
+        return self.seq, self.segment_count + len(self.unsegmented)
+
+    @staticmethod
+    def _read_records(path: str, name: str, offset: int = 0) -> List[Dict]:
+        """
+        逐行读取 JSON 记录，截掉末尾写了一半的记录，之后追加的记录才能被正常读取。
+
+        :param path: 文件路径
+        :param name: 文件名称，用于日志
+        :param offset: 开始读取的字节位置
+        :return: 完整的记录列表
+        """
+        if not os.path.exists(path):
+            return []
+        records = []
+        valid_bytes = offset
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("记录不完整")
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(path):
+            logging.warning(f"{name}末尾存在不完整的记录，已忽略。")
+            with open(path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return records
+
+    @staticmethod
+    def _apply(data: Dict, record: Dict):
+        symbol = record['symbol']
+        data['cash'] = record['cash']
+        holdings = data.setdefault('holdings', {})
+        if record['holding']:
+            holdings[symbol] = record['holding']
+        else:
+            holdings.pop(symbol, None)
+        buy_lots = data.setdefault('buy_lots', {})
+        if record['buy_lots']:
+            buy_lots[symbol] = record['buy_lots']
+        else:
+            buy_lots.pop(symbol, None)
+
+    @staticmethod
+    def _dumps(record: Dict) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+    def _encode(self, records: List[Dict]) -> bytes:
+        return ''.join(self._dumps(record) + '\n' for record in records).encode('utf-8')
+
+    def _write_transactions(self, transactions: List[Dict]):
+        """整体重写交易记录段，先写临时文件再替换"""
+        content = self._encode([{'seq': self.seq, **t} for t in transactions])
+        tmp_path = self.transactions_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, self.transactions_path)
+        self.segment_count = len(transactions)
+        self.segment_bytes = len(content)
+        self.unsegmented = []
+
+    def _flush_transactions(self):
+        """把只在日志中的交易记录追加到交易记录段"""
+        if not self.unsegmented:
+            return
+        content = self._encode(self.unsegmented)
+        with open(self.transactions_path, 'ab') as f:
+            f.write(content)
+        self.segment_count += len(self.unsegmented)
+        self.segment_bytes += len(content)
+        self.unsegmented = []
+
+    def _write_snapshot(self, data: Dict):
+        """写快照并清空日志，调用前交易记录段应已包含全部交易"""
+        snapshot = {key: value for key, value in data.items() if key != 'transactions'}
+        snapshot.update(journal_seq=self.seq, transactions_count=self.segment_count, transactions_bytes=self.segment_bytes)
+        tmp_path = self.filepath + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(tmp_path, self.filepath)
+        # 快照和交易记录段已包含全部记录，清空日志
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'w')
+        self.pending = 0
+
+    def save(self, data: Dict):
+        """
+        写快照。交易记录只追加，data 中的交易记录不会覆盖交易记录段。
+
+        :param data: 完整状态
+        """
+        with self._lock:
+            self._flush_transactions()
+            self._write_snapshot(data)
+
+    def reset(self, data: Dict):
+        """
+        用 data 中的交易记录重写交易记录段并写快照。
+
+        :param data: 重置后的完整状态
+        """
+        transactions = data.get('transactions', [])
+        with self._lock:
+            self._write_transactions(transactions.to_dicts() if hasattr(transactions, 'to_dicts') else list(transactions))
+            self._write_snapshot(data)
+
+    def append(self, record: Dict, data: Dict):
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a')
+            self.seq += 1
+            self._journal.write(self._dumps({'seq': self.seq, **record}) + '\n')
+            self._journal.flush()
+            self.unsegmented.append({'seq': self.seq, **record['transaction']})
+            self.pending += 1
+            need_snapshot = self.pending >= self.snapshot_interval
+        if need_snapshot:
+            self.save(data)
+
+
+class SQLiteStorage(Storage):
+    """
+    基于标准库 sqlite3 的持仓存储。
+
+    现金、持仓、买入批次、最新价格和交易记录分表保存，交易记录按股票代码和时间建立索引，
+    每笔交易只更新相关的行，并支持分页和按条件查询交易记录。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL);
+        CREATE TABLE IF NOT EXISTS holdings (symbol TEXT PRIMARY KEY, quantity INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS buy_lots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_buy_lots_symbol ON buy_lots (symbol, id);
+        CREATE TABLE IF NOT EXISTS latest_prices (symbol TEXT PRIMARY KEY, price REAL);
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            time TEXT NOT NULL,
+            cost REAL,
+            revenue REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transactions_symbol_time ON transactions (symbol, time);
+        CREATE INDEX IF NOT EXISTS idx_transactions_time ON transactions (time);
+    """
+
+    TRANSACTION_COLUMNS = ('type', 'symbol', 'price', 'quantity', 'time', 'cost', 'revenue')
+
+    def __init__(self, filepath: str = PORTFOLIO_DB_FILE):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        super().__init__(filepath)
+
+    def load(self) -> Dict:
+        """
+        读取现金、持仓、买入批次和最新价格。交易记录不在此读取，
+        通过 load_transactions、query_transactions 和 count_transactions 按需读取。
+        """
+        with self._lock:
+            cash = self.conn.execute("SELECT value FROM meta WHERE key = 'cash'").fetchone()
+            if cash is None:
+                logging.info("持仓数据库为空，初始化新的持仓。")
+                return {}
+            buy_lots: Dict[str, List[Dict[str, float]]] = {}
+            for row in self.conn.execute("SELECT symbol, price, quantity FROM buy_lots ORDER BY id"):
+                buy_lots.setdefault(row['symbol'], []).append({'price': row['price'], 'quantity': row['quantity']})
+            return {
+                'cash': cash['value'],
+                'holdings': {row['symbol']: row['quantity'] for row in self.conn.execute("SELECT symbol, quantity FROM holdings")},
+                'buy_lots': buy_lots,
+                'latest_prices': {row['symbol']: row['price'] for row in self.conn.execute("SELECT symbol, price FROM latest_prices")},
+            }
+
+    def save(self, data: Dict):
+        """
+        保存现金、持仓、买入批次和最新价格。交易记录只由 append 逐笔写入、由 reset 清空，
+        保存时不改动，其他进程写入的交易不会因本进程内存中的记录较旧而丢失。
+
+        :param data: 完整状态
+        """
+        with self._lock, self.conn:
+            self._save_state(data)
+
+    def _save_state(self, data: Dict):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cash', ?)", (data.get('cash', 0.0),))
+        self.conn.execute("DELETE FROM holdings")
+        self.conn.executemany("INSERT INTO holdings (symbol, quantity) VALUES (?, ?)", data.get('holdings', {}).items())
+        self.conn.execute("DELETE FROM buy_lots")
+        self.conn.executemany(
+            "INSERT INTO buy_lots (symbol, price, quantity) VALUES (?, ?, ?)",
+            [(symbol, lot['price'], lot['quantity']) for symbol, lots in data.get('buy_lots', {}).items() for lot in lots]
+        )
+        self.conn.execute("DELETE FROM latest_prices")
+        self.conn.executemany("INSERT INTO latest_prices (symbol, price) VALUES (?, ?)", data.get('latest_prices', {}).items())
+
+    def reset(self, data: Dict):
+        """
+        清空交易记录并用 data 覆盖其余持仓数据。
+
+        :param data: 重置后的完整状态，其中的交易记录会被写入
+        """
+        transactions = data.get('transactions', [])
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM transactions")
+            self.conn.executemany(self._insert_transaction_sql(), [self._transaction_row(t) for t in transactions])
+            self._save_state(data)
+
+    def append(self, record: Dict, data: Dict):
+        symbol = record['symbol']
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cash', ?)", (record['cash'],))
+            if record['holding']:
+                self.conn.execute("INSERT OR REPLACE INTO holdings (symbol, quantity) VALUES (?, ?)", (symbol, record['holding']))
+            else:
+                self.conn.execute("DELETE FROM holdings WHERE symbol = ?", (symbol,))
+            self.conn.execute("DELETE FROM buy_lots WHERE symbol = ?", (symbol,))
+            self.conn.executemany(
+                "INSERT INTO buy_lots (symbol, price, quantity) VALUES (?, ?, ?)",
+                [(symbol, lot['price'], lot['quantity']) for lot in record['buy_lots']]
+            )
+            self.conn.execute(self._insert_transaction_sql(), self._transaction_row(record['transaction']))
+
+    def load_transactions(self) -> List[Dict]:
+        """
+        按写入顺序读取全部交易记录。
+
+        :return: 交易记录列表
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM transactions ORDER BY id").fetchall()
+        return [self._transaction(row) for row in rows]
+
+    def transactions_version(self) -> int:
+        """
+        交易记录的版本号，即最大的记录 id。id 自增且不复用，写入或清空交易记录后版本号都会变化。
+
+        :return: 版本号，没有交易记录时为 0
+        """
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+
+    def query_transactions(self, symbol: Optional[str] = None, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                           trade_type: Optional[str] = None, limit: Optional[int] = None, offset: int = 0,
+                           descending: bool = True) -> List[Dict]:
+        """
+        按条件分页查询交易记录。
+
+        :param symbol: 股票代码
+        :param start_time: 开始时间（含），格式 'YYYY-MM-DD HH:MM:SS'
+        :param end_time: 结束时间（含），格式同上
+        :param trade_type: 'buy' 或 'sell'
+        :param limit: 最多返回的条数，None 表示不限
+        :param offset: 跳过的条数
+        :param descending: 是否按时间倒序
+        :return: 交易记录列表
+        """
+        where, params = self._where(symbol, start_time, end_time, trade_type)
+        order = 'DESC' if descending else 'ASC'
+        sql = f"SELECT * FROM transactions{where} ORDER BY time {order}, id {order} LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self.conn.execute(sql, (*params, -1 if limit is None else limit, offset)).fetchall()
+        return [self._transaction(row) for row in rows]
+
+    def count_transactions(self, symbol: Optional[str] = None, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                           trade_type: Optional[str] = None) -> int:
+        """
+        统计符合条件的交易记录条数，参数含义同 query_transactions。
+        """
+        where, params = self._where(symbol, start_time, end_time, trade_type)
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM transactions{where}", params).fetchone()[0]
+
+    @staticmethod
+    def _where(symbol, start_time, end_time, trade_type):
+        clauses, params = [], []
+        for clause, value in (("symbol = ?", symbol), ("time >= ?", start_time), ("time <= ?", end_time), ("type = ?", trade_type)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _insert_transaction_sql(self) -> str:
+        return f"INSERT INTO transactions ({', '.join(self.TRANSACTION_COLUMNS)}) VALUES ({', '.join('?' * len(self.TRANSACTION_COLUMNS))})"
+
+    def _transaction_row(self, transaction: Dict) -> tuple:
+        return tuple(transaction.get(column) for column in self.TRANSACTION_COLUMNS)
+
+    @staticmethod
+    def _transaction(row: sqlite3.Row) -> Dict:
+        transaction = {key: row[key] for key in ('type', 'symbol', 'price', 'quantity', 'time')}
+        amount_key = 'cost' if row['type'] == 'buy' else 'revenue'
+        transaction[amount_key] = row[amount_key]
+        return transaction
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    """
+    按配置创建持仓存储。
+
+    :param backend: 'json'、'journal' 或 'sqlite'
+    :return: 存储实例
+    """
+    if backend == 'json':
+        return Storage(filepath=PORTFOLIO_FILE)
+    elif backend == 'journal':
+        return JournalStorage(filepath=PORTFOLIO_FILE)
+    elif backend == 'sqlite':
+        return SQLiteStorage(filepath=PORTFOLIO_DB_FILE)
+    else:
+        raise ValueError(f"未知的存储类型: {backend}")
@@ -1,28 +1,270 @@
 # strategies/base_strategy.py
 
 from abc import ABC, abstractmethod
+import numpy as np
 import pandas as pd
-from typing import List, Tuple, Dict
+from numbers import Number
+from typing import Any, Callable, List, Tuple, Dict, Optional, Union
+from price_time_series_manager import PriceRingBuffer
+from .indicators import IndicatorState
+from .indicator_cache import IndicatorCache
+from orders import OrderBatch
+from data.minute_bars import BAR_SIZES
+
+
+def stack_closes(data: Dict[str, pd.DataFrame], symbols: List[str], lookback: int) -> np.ndarray:
+    """
+    将各股票最近 lookback 根 bar 的收盘价右对齐堆叠成 股票 × 时间 的二维数组，不足部分在左侧补 NaN。
+
+    :param data: 所有股票的数据字典
+    :param symbols: 股票顺序
+    :param lookback: 取最近多少根 bar
+    :return: 形状为 (len(symbols), lookback) 的数组
+    """
+    closes = np.full((len(symbols), lookback), np.nan)
+    for i, symbol in enumerate(symbols):
+        df = data.get(symbol)
+        if df is None or df.empty:
+            continue
+        tail = df['close'].to_numpy(dtype=np.float64)[-lookback:]
+        closes[i, lookback - len(tail):] = tail
+    return closes
+
+
+def stack_price_windows(price_time_series: Dict[str, PriceRingBuffer], symbols: List[str], window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    取各股票价格时序的最近 window 个价格，右对齐堆叠，不足部分在左侧补 NaN。
+
+    :param price_time_series: 各股票的价格时序
+    :param symbols: 股票顺序
+    :param window: 窗口长度
+    :return: (形状为 (len(symbols), window) 的价格数组, 各股票最新价格，没有价格时为 NaN)
+    """
+    windows = np.full((len(symbols), window), np.nan)
+    last_prices = np.full(len(symbols), np.nan)
+    for i, symbol in enumerate(symbols):
+        series = price_time_series.get(symbol)
+        if series is None or len(series) == 0:
+            continue
+        recent = series.window(window)
+        windows[i, window - len(recent):] = recent
+        last_prices[i] = series.last()
+    return windows, last_prices
+
 
 class BaseStrategy(ABC):
-    def __init__(self, weight: float = 1.0):
+    def __init__(self, weight: float = 1.0, bar_size: str = 'daily'):
         """
         初始化策略。
 
         :param weight: 策略权重
+        :param bar_size: 策略运行的 bar 周期，如 'daily' 或分钟周期 '5'，各窗口参数均以该周期的 bar 数计
         """
+        if bar_size not in BAR_SIZES:
+            raise ValueError(f"未知的 bar 周期: {bar_size}，可选: {', '.join(BAR_SIZES)}")
         self.weight = weight
+        self.bar_size = bar_size
+        self.states: Dict[str, IndicatorState] = {}  # symbol: 增量指标状态
+        self.indicators: Optional[IndicatorCache] = None  # 由组合策略注入的共享指标缓存
 
     @abstractmethod
-    def generate_signals(self, data: pd.DataFrame) -> pd.DataFrame:
-        """生成交易信号"""
+    def generate_signals(self, data: pd.DataFrame, symbol: Optional[str] = None) -> pd.DataFrame:
+        """
+        生成交易信号，返回新的 DataFrame，不修改传入的 data
+
+        :param data: 某只股票的历史数据
+        :param symbol: 股票代码，提供时通过共享指标缓存复用计算结果
+        """
         pass
 
+    def indicator(self, symbol: Optional[str], name: str, params: Tuple, data: pd.DataFrame, compute: Callable[[], Any]) -> Any:
+        """
+        获取一个指标，有共享指标缓存时同一周期内只计算一次。
+
+        :param symbol: 股票代码
+        :param name: 指标名
+        :param params: 指标参数
+        :param data: 计算所依据的历史数据，用于确定数据版本
+        :param compute: 计算函数
+        """
+        if self.indicators is None or symbol is None:
+            return compute()
+        return self.indicators.get(symbol, name, params, IndicatorCache.data_version(data), compute)
+
+    def recent_trend(self, symbol: str, price_series: PriceRingBuffer, window: int) -> float:
+        """
+        最近 window 个价格的平均变化量。
+
+        :param symbol: 股票代码
+        :param price_series: 该股票的价格时序
+        :param window: 窗口长度
+        """
+        def compute() -> float:
+            return np.mean(np.diff(price_series.window(window)))
+
+        if self.indicators is None:
+            return compute()
+        version = (len(price_series), price_series.last_timestamp(), price_series.last())
+        return self.indicators.get(symbol, 'trend', (window,), version, compute)
+
     @abstractmethod
-    def decide_trade(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, Dict[str, float]]) -> Tuple[List[Dict], List[Dict]]:
+    def decide_trade(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, PriceRingBuffer]) -> Tuple[OrderBatch, OrderBatch]:
         """
         根据交易信号，决定买卖操作
-        返回买入和卖出操作列表
-        每个操作为字典，包含 symbol, price, quantity
+
+        :param data: 所有股票的数据字典，键为股票代码，值为对应的DataFrame
+        :param portfolio: 当前的投资组合
+        :param price_time_series: 各股票的价格时序数据
+        :return: (买入委托, 卖出委托)，均为 OrderBatch，逐笔遍历得到包含 symbol、price、quantity 的 Order
+        """
+        pass
+
+    @abstractmethod
+    def create_state(self) -> IndicatorState:
+        """创建单只股票的增量指标状态"""
+        pass
+
+    def update(self, symbol: str, bar: Union[Dict[str, float], float]) -> float:
+        """
+        以一根新 bar 增量更新指标，每次调用的开销与历史长度无关。
+
+        :param symbol: 股票代码
+        :param bar: 包含 'close' 的 bar 字典（可带 bar 时间 'date'），或直接传入收盘价
+        :return: 最新的 Position
+        """
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = self.create_state()
+        if isinstance(bar, Number):
+            return state.update(float(bar))
+        return state.update(float(bar['close']), bar.get('date'))
+
+    def reset_state(self):
+        """清空所有股票的增量指标状态"""
+        self.states.clear()
+
+    def latest_position(self, symbol: str, df: pd.DataFrame) -> float:
+        """
+        获取某只股票最新的 Position。
+
+        若增量状态恰好处理过 df 中的全部 bar（bar 数、最后一根 bar 的时间和收盘价都相同），
+        则直接使用增量结果，否则回退到对整段历史调用 generate_signals。
+        未记录 bar 时间的增量状态无法确认对应同一段历史，总是回退。
+
+        :param symbol: 股票代码
+        :param df: 该股票的历史数据
+        :return: 最新的 Position
+        """
+        state: Optional[IndicatorState] = self.states.get(symbol)
+        if (state is not None and state.last_time is not None and state.count == len(df)
+                and state.last_time == df['date'].values[-1] and state.last_close == df['close'].iat[-1]):
+            return state.position
+        return self.generate_signals(df, symbol).iloc[-1]['Position']
+
+    # 以下为横截面批量接口：一次处理全部股票，所有计算都是 NumPy 数组运算
+
+    @property
+    @abstractmethod
+    def batch_lookback(self) -> int:
+        """positions_batch 需要的最近 bar 数"""
+        pass
+
+    @property
+    @abstractmethod
+    def trend_window(self) -> int:
+        """用于判断价格趋势的窗口长度"""
+        pass
+
+    @abstractmethod
+    def positions_history(self, closes: np.ndarray) -> np.ndarray:
+        """
+        计算每只股票每根 bar 的 Position。closes 包含完整历史时，每行与
+        generate_signals(...)['Position'] 逐位一致；只包含最近若干根 bar 时，
+        pandas 沿整段历史累积的求和误差无法复现，均线恰好相等时信号可能不同。
+
+        :param closes: 股票 × 时间 的收盘价数组，右对齐，左侧缺失为 NaN
+        :return: 与 closes 形状相同的 Position 数组，每只股票的第一根 bar 及之前为 NaN
+        """
+        pass
+
+    def positions_batch(self, closes: np.ndarray) -> np.ndarray:
+        """
+        计算每只股票最新一根 bar 的 Position，closes 包含完整历史时与
+        generate_signals(...).iloc[-1]['Position'] 逐位一致，见 positions_history。
+
+        :param closes: 股票 × 时间 的收盘价数组，右对齐，左侧缺失为 NaN，至少包含 batch_lookback 列
+        :return: 每只股票的 Position，历史不足两根 bar 时为 NaN
+        """
+        return self.positions_history(closes)[:, -1]
+
+    def decide_trade_batch(self, symbols: np.ndarray, closes: np.ndarray, last_prices: np.ndarray, recent_prices: np.ndarray,
+                           cash: float, holdings: np.ndarray, positions: Optional[np.ndarray] = None) -> Tuple[OrderBatch, OrderBatch]:
+        """
+        批量决定全部股票的买卖操作，规则与 decide_trade 相同。
+
+        :param symbols: 股票代码数组，与以下各数组的行一一对应
+        :param closes: 股票 × 时间 的收盘价数组，见 positions_batch
+        :param last_prices: 每只股票的最新价格，无效时为 NaN 或非正数
+        :param recent_prices: 股票 × trend_window 的最近价格时序，不足部分为 NaN
+        :param cash: 当前现金
+        :param holdings: 每只股票的持仓数量
+        :param positions: 预先计算好的每只股票最新的 Position，提供时不再由 closes 计算
+        :return: (买入委托, 卖出委托)
+        """
+        if positions is None:
+            positions = self.positions_batch(closes)
+        valid_price = np.isfinite(last_prices) & (last_prices > 0)
+
+        # 价格时序满一个窗口时根据趋势调整买入或卖出比例
+        has_trend = ~np.isnan(recent_prices).any(axis=1)
+        rising = np.zeros(len(positions), dtype=bool)
+        if recent_prices.shape[1] > 1:
+            rising[has_trend] = np.diff(recent_prices[has_trend], axis=1).mean(axis=1) > 0
+        buy_pct = np.where(has_trend, np.where(rising, self.buy_pct * 1.1, self.buy_pct * 0.9), self.buy_pct)
+        sell_pct = np.where(has_trend, np.where(rising, self.sell_pct * 0.9, self.sell_pct * 1.1), self.sell_pct)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            buy_quantity = np.where(valid_price, (cash * buy_pct * self.weight) // last_prices, 0)
+        sell_quantity = np.trunc(holdings * sell_pct * self.weight)
+
+        buy_mask = valid_price & (positions == 1) & (buy_quantity > 0)
+        sell_mask = valid_price & (positions == -1) & (holdings > 0) & (sell_quantity > 0)
+        buys = OrderBatch.from_arrays(symbols[buy_mask], last_prices[buy_mask], buy_quantity[buy_mask])
+        sells = OrderBatch.from_arrays(symbols[sell_mask], last_prices[sell_mask], sell_quantity[sell_mask])
+        return buys, sells
+
+    def order_quantity(self, position: float, price: float, recent_prices: np.ndarray, cash: float, holding: int) -> int:
+        """
+        单只股票的下单数量，规则与 decide_trade_batch 相同，供事件驱动回测逐个信号调用。
+
+        :param position: 最新的 Position，1 为买入，-1 为卖出
+        :param price: 最新价格
+        :param recent_prices: 最近的价格时序，满 trend_window 个时根据趋势调整比例
+        :param cash: 当前现金
+        :param holding: 当前持仓数量
+        :return: 下单数量，不下单时为 0
+        """
+        if not (np.isfinite(price) and price > 0):
+            return 0
+        buy_pct, sell_pct = self.buy_pct, self.sell_pct
+        if len(recent_prices) >= self.trend_window:
+            window = recent_prices[len(recent_prices) - self.trend_window:]
+            rising = self.trend_window > 1 and np.diff(window).mean() > 0
+            buy_pct = buy_pct * 1.1 if rising else buy_pct * 0.9
+            sell_pct = sell_pct * 0.9 if rising else sell_pct * 1.1
+        if position == 1:
+            return int((cash * buy_pct * self.weight) // price)
+        if position == -1 and holding > 0:
+            return int(holding * sell_pct * self.weight)
+        return 0
+
+    @staticmethod
+    def _first_bar_mask(closes: np.ndarray) -> np.ndarray:
+        """
+        每只股票的第一根 bar 及其左侧补齐的列，这些位置没有 Position。
+
+        :param closes: 股票 × 时间 的收盘价数组，右对齐，左侧缺失为 NaN
+        :return: 与 closes 形状相同的布尔数组
         """
-        pass
\ No newline at end of file
+        first = closes.shape[1] - np.count_nonzero(~np.isnan(closes), axis=1)
+        return np.arange(closes.shape[1]) <= first[:, None]
@@ -0,0 +1,51 @@
+# strategies/indicator_cache.py
+
+from typing import Any, Callable, Dict, Hashable, Tuple
+import pandas as pd
+
+
+class IndicatorCache:
+    """
+    指标计算结果缓存，键为 (股票代码, 指标名, 参数, 数据版本)。
+
+    组合策略在每个决策周期开始时清空缓存并共享给所有子策略，
+    同一周期内多个子策略请求相同的指标时只计算一次。
+    """
+
+    def __init__(self):
+        self._cache: Dict[Tuple, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def data_version(data: pd.DataFrame) -> Tuple:
+        """
+        数据版本：行数与最后一个收盘价，数据追加新行后版本随之改变。
+
+        :param data: 某只股票的历史数据
+        """
+        if data.empty:
+            return (0,)
+        return (len(data), float(data['close'].iat[-1]))
+
+    def get(self, symbol: str, name: str, params: Tuple, version: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        获取指标，缓存未命中时调用 compute 计算并保存。
+
+        :param symbol: 股票代码
+        :param name: 指标名，如 'sma'
+        :param params: 指标参数，如 (20,)
+        :param version: 数据版本
+        :param compute: 计算函数
+        :return: 指标值
+        """
+        key = (symbol, name, params, version)
+        if key in self._cache:
+            self.hits += 1
+            return self._cache[key]
+        self.misses += 1
+        value = self._cache[key] = compute()
+        return value
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,202 @@
+# strategies/indicators.py
+
+import math
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import deque
+
+
+class RollingMean:
+    """
+    固定窗口滚动均值的增量计算，每次更新 O(1)。
+
+    累加和采用与 pandas rolling().mean() 相同的补偿求和及修正规则，
+    因此逐 bar 的结果与 pandas 一致。
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = math.nan
+        self.value = math.nan
+
+    def _add(self, val: float):
+        if math.isnan(val):
+            return
+        self.nobs += 1
+        y = val - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if val < 0:
+            self.neg_ct += 1
+        if val == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = val
+
+    def _remove(self, val: float):
+        if math.isnan(val):
+            return
+        self.nobs -= 1
+        y = -val - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if val < 0:
+            self.neg_ct -= 1
+
+    def update(self, val: float) -> float:
+        """
+        加入一个新值，返回最新的滚动均值（数据不足一个窗口时为 NaN）。
+        """
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(val)
+        self._add(val)
+
+        if self.nobs >= self.window and self.nobs > 0:
+            result = self.sum_x / self.nobs
+            if self.num_consecutive_same_value >= self.nobs:
+                result = self.prev_value
+            elif self.neg_ct == 0 and result < 0:
+                result = 0.0
+            elif self.neg_ct == self.nobs and result > 0:
+                result = 0.0
+        else:
+            result = math.nan
+        self.value = result
+        return result
+
+
+def rolling_mean_batch(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    对二维数组的每一行沿时间方向计算 window 期滚动均值，各行同时计算。
+
+    与 RollingMean 逐值更新的规则相同（补偿求和、跳过 NaN），结果逐位等于对每行调用
+    pandas rolling(window).mean()。pandas 的累加和沿整段序列延续，因此只有传入完整历史时
+    才与对完整历史计算的结果逐位一致。
+
+    :param values: 股票 × 时间 的数组，左侧缺失为 NaN
+    :param window: 窗口长度
+    :return: 与 values 形状相同的滚动均值，数据不足一个窗口时为 NaN
+    """
+    n_rows, n_cols = values.shape
+    nobs = np.zeros(n_rows)
+    neg_ct = np.zeros(n_rows)
+    sum_x = np.zeros(n_rows)
+    compensation_add = np.zeros(n_rows)
+    compensation_remove = np.zeros(n_rows)
+    num_consecutive_same_value = np.zeros(n_rows)
+    prev_value = np.full(n_rows, np.nan)
+    result = np.full((n_rows, n_cols), np.nan)
+    for j in range(n_cols):
+        if j >= window:
+            val = values[:, j - window]
+            valid = ~np.isnan(val)
+            nobs -= valid
+            y = np.where(valid, -val - compensation_remove, 0.0)
+            t = sum_x + y
+            compensation_remove = np.where(valid, t - sum_x - y, compensation_remove)
+            sum_x = np.where(valid, t, sum_x)
+            neg_ct -= valid & (val < 0)
+
+        val = values[:, j]
+        valid = ~np.isnan(val)
+        nobs += valid
+        y = np.where(valid, val - compensation_add, 0.0)
+        t = sum_x + y
+        compensation_add = np.where(valid, t - sum_x - y, compensation_add)
+        sum_x = np.where(valid, t, sum_x)
+        neg_ct += valid & (val < 0)
+        num_consecutive_same_value = np.where(valid, np.where(val == prev_value, num_consecutive_same_value + 1, 1),
+                                              num_consecutive_same_value)
+        prev_value = np.where(valid, val, prev_value)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = sum_x / nobs
+        same = num_consecutive_same_value >= nobs
+        mean = np.where(same, prev_value, mean)
+        mean = np.where(~same & (neg_ct == 0) & (mean < 0), 0.0, mean)
+        mean = np.where(~same & (neg_ct == nobs) & (mean > 0), 0.0, mean)
+        result[:, j] = np.where((nobs >= window) & (nobs > 0), mean, np.nan)
+    return result
+
+
+class IndicatorState(ABC):
+    """
+    单只股票的增量指标状态基类，记录已处理的 bar 数、最新一根 bar 的时间和收盘价以及最新信号。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.last_close = math.nan
+        self.last_time = None
+        self.signal = math.nan
+        self.position = math.nan
+
+    @abstractmethod
+    def compute_signal(self, close: float) -> int:
+        """根据新收盘价更新指标并返回当前信号"""
+        pass
+
+    def update(self, close: float, time=None) -> float:
+        """
+        处理一根新 bar，返回最新的 Position（信号变化量）。
+
+        :param close: 收盘价
+        :param time: bar 的时间，用于确认状态对应哪一段历史，未知时为 None
+        :return: Position，第一根 bar 为 NaN
+        """
+        signal = self.compute_signal(close)
+        self.position = signal - self.signal
+        self.signal = signal
+        self.last_close = close
+        self.last_time = time
+        self.count += 1
+        return self.position
+
+
+class MovingAverageCrossoverState(IndicatorState):
+    def __init__(self, short_window: int, long_window: int):
+        super().__init__()
+        self.ma_short = RollingMean(short_window)
+        self.ma_long = RollingMean(long_window)
+
+    def compute_signal(self, close: float) -> int:
+        ma_short = self.ma_short.update(close)
+        ma_long = self.ma_long.update(close)
+        return 1 if ma_short > ma_long else -1
+
+
+class RSIState(IndicatorState):
+    def __init__(self, window: int, overbought: float, oversold: float):
+        super().__init__()
+        self.overbought = overbought
+        self.oversold = oversold
+        self.gain = RollingMean(window)
+        self.loss = RollingMean(window)
+        self.rsi = math.nan
+
+    def compute_signal(self, close: float) -> int:
+        delta = close - self.last_close
+        # 与 delta.where(delta > 0, 0) / -delta.where(delta < 0, 0) 一致，首个差值按 0 计
+        gain = self.gain.update(delta if delta > 0 else 0.0)
+        loss = self.loss.update(-delta if delta < 0 else -0.0)
+        if loss == 0:
+            rs = math.inf if gain > 0 else math.nan
+        else:
+            rs = gain / loss
+        self.rsi = 100 - (100 / (1 + rs))
+        if self.rsi > self.overbought:
+            return -1
+        if self.rsi < self.oversold:
+            return 1
+        return 0
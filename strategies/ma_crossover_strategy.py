@@ -1,32 +1,56 @@
 # strategies/ma_crossover_strategy.py
 
 import pandas as pd
-from collections import OrderedDict
 import numpy as np
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 from .base_strategy import BaseStrategy
+from price_time_series_manager import PriceRingBuffer
+from orders import Order, OrderBatch
+from .indicators import MovingAverageCrossoverState, rolling_mean_batch
 import logging
 
 class MovingAverageCrossoverStrategy(BaseStrategy):
-    def __init__(self, short_window: int = 5, long_window: int = 20, buy_pct: float = 0.1, sell_pct: float = 0.5, weight: float = 1.0):
-        super().__init__(weight)
+    def __init__(self, short_window: int = 5, long_window: int = 20, buy_pct: float = 0.1, sell_pct: float = 0.5, weight: float = 1.0,
+                 bar_size: str = 'daily'):
+        super().__init__(weight, bar_size)
         self.short_window = short_window
         self.long_window = long_window
         self.buy_pct = buy_pct  # 买入资金比例
         self.sell_pct = sell_pct  # 卖出持仓比例
 
-    def generate_signals(self, data: pd.DataFrame) -> pd.DataFrame:
+    def generate_signals(self, data: pd.DataFrame, symbol: Optional[str] = None) -> pd.DataFrame:
         """
         计算短期和长期移动平均线并生成信号
         """
-        data['MA_Short'] = data['close'].rolling(window=self.short_window).mean()
-        data['MA_Long'] = data['close'].rolling(window=self.long_window).mean()
-        data['Signal'] = 0
-        data['Signal'] = np.where(data['MA_Short'] > data['MA_Long'], 1, -1)
-        data['Position'] = data['Signal'].diff()
-        return data
-
-    def decide_trade(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, OrderedDict]) -> Tuple[List[Dict], List[Dict]]:
+        close = data['close']
+        signals = pd.DataFrame(index=data.index)
+        signals['MA_Short'] = self.indicator(symbol, 'sma', (self.short_window,), data, lambda: close.rolling(window=self.short_window).mean())
+        signals['MA_Long'] = self.indicator(symbol, 'sma', (self.long_window,), data, lambda: close.rolling(window=self.long_window).mean())
+        signals['Signal'] = np.where(signals['MA_Short'] > signals['MA_Long'], 1, -1)
+        signals['Position'] = signals['Signal'].diff()
+        return signals
+
+    def create_state(self) -> MovingAverageCrossoverState:
+        return MovingAverageCrossoverState(self.short_window, self.long_window)
+
+    @property
+    def batch_lookback(self) -> int:
+        return self.long_window + 1
+
+    @property
+    def trend_window(self) -> int:
+        return self.long_window
+
+    def positions_history(self, closes: np.ndarray) -> np.ndarray:
+        ma_short = rolling_mean_batch(closes, self.short_window)
+        ma_long = rolling_mean_batch(closes, self.long_window)
+        signal = np.where(ma_short > ma_long, 1, -1)
+        positions = np.full(closes.shape, np.nan)
+        positions[:, 1:] = np.diff(signal, axis=1)
+        positions[self._first_bar_mask(closes)] = np.nan
+        return positions
+
+    def decide_trade(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, PriceRingBuffer]) -> Tuple[OrderBatch, OrderBatch]:
         """
         根据移动平均交叉策略决定买卖操作
         """
@@ -34,16 +58,16 @@ class MovingAverageCrossoverStrategy(BaseStrategy):
         trades_sell = []
 
         for symbol, df in data.items():
-            signals = self.generate_signals(df)
-            latest = signals.iloc[-1]
+            position = self.latest_position(symbol, df)
 
             if 'symbol' not in df.columns:
                 logging.warning(f"Symbol 信息缺失，跳过 MA 交易决策。")
                 continue
 
             # 从 price_time_series 获取最新价格
-            if symbol in price_time_series and len(price_time_series[symbol]) > 0:
-                current_price = list(price_time_series[symbol].values())[-1]
+            symbol_price_time_series = price_time_series.get(symbol)
+            if symbol_price_time_series is not None and len(symbol_price_time_series) > 0:
+                current_price = symbol_price_time_series.last()
             else:
                 logging.warning(f"没有找到 {symbol} 的最新价格。")
                 continue
@@ -53,10 +77,8 @@ class MovingAverageCrossoverStrategy(BaseStrategy):
                 continue
 
             # 使用统一的 price_time_series 来分析趋势
-            symbol_price_time_series = price_time_series.get(symbol, OrderedDict())
             if len(symbol_price_time_series) >= self.long_window:
-                recent_prices = list(symbol_price_time_series.values())[-self.long_window:]
-                recent_trend = np.mean(np.diff(recent_prices))
+                recent_trend = self.recent_trend(symbol, symbol_price_time_series, self.long_window)
                 # 根据趋势调整买入或卖出比例
                 if recent_trend > 0:
                     adjusted_buy_pct = self.buy_pct * 1.1  # 略微增加买入比例
@@ -69,26 +91,18 @@ class MovingAverageCrossoverStrategy(BaseStrategy):
                 adjusted_sell_pct = self.sell_pct
 
             # 生成买入信号
-            if latest['Position'] == 1:
+            if position == 1:
                 budget = portfolio.cash * adjusted_buy_pct * self.weight
                 quantity = int(budget // current_price)
                 if quantity > 0:
-                    trades_buy.append({
-                        'symbol': symbol,
-                        'price': current_price,
-                        'quantity': quantity
-                    })
+                    trades_buy.append(Order(symbol, current_price, quantity))
                     logging.info(f"MA 交叉策略生成买入信号：{symbol}，价格：{current_price}，数量：{quantity}")
 
             # 生成卖出信号
-            elif latest['Position'] == -1 and symbol in portfolio.holdings:
+            elif position == -1 and symbol in portfolio.holdings:
                 quantity = int(portfolio.holdings[symbol] * adjusted_sell_pct * self.weight)
                 if quantity > 0:
-                    trades_sell.append({
-                        'symbol': symbol,
-                        'price': current_price,
-                        'quantity': quantity
-                    })
+                    trades_sell.append(Order(symbol, current_price, quantity))
                     logging.info(f"MA 交叉策略生成卖出信号：{symbol}，价格：{current_price}，数量：{quantity}")
 
-        return trades_buy, trades_sell
\ No newline at end of file
+        return OrderBatch.from_orders(trades_buy), OrderBatch.from_orders(trades_sell)
\ No newline at end of file
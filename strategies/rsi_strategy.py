@@ -2,35 +2,73 @@
 
 import pandas as pd
 import numpy as np
-from collections import OrderedDict
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 from .base_strategy import BaseStrategy
+from price_time_series_manager import PriceRingBuffer
+from orders import Order, OrderBatch
+from .indicators import RSIState, rolling_mean_batch
 import logging
 
 class RSIStrategy(BaseStrategy):
-    def __init__(self, window: int = 14, overbought: float = 70, oversold: float = 30, buy_pct: float = 0.05, sell_pct: float = 0.3, weight: float = 1.0):
-        super().__init__(weight)
+    def __init__(self, window: int = 14, overbought: float = 70, oversold: float = 30, buy_pct: float = 0.05, sell_pct: float = 0.3, weight: float = 1.0,
+                 bar_size: str = 'daily'):
+        super().__init__(weight, bar_size)
         self.window = window
         self.overbought = overbought
         self.oversold = oversold
         self.buy_pct = buy_pct
         self.sell_pct = sell_pct
 
-    def generate_signals(self, data: pd.DataFrame) -> pd.DataFrame:
+    def generate_signals(self, data: pd.DataFrame, symbol: Optional[str] = None) -> pd.DataFrame:
         """
         计算 RSI 指标并生成信号
         """
-        delta = data['close'].diff()
+        signals = pd.DataFrame(index=data.index)
+        signals['RSI'] = self.indicator(symbol, 'rsi', (self.window,), data, lambda: self.compute_rsi(data, symbol))
+        signals['Signal'] = np.where(signals['RSI'] > self.overbought, -1, np.where(signals['RSI'] < self.oversold, 1, 0))
+        signals['Position'] = signals['Signal'].diff()
+        return signals
+
+    def compute_rsi(self, data: pd.DataFrame, symbol: Optional[str] = None) -> pd.Series:
+        """
+        计算 RSI 指标
+        """
+        delta = self.indicator(symbol, 'diff', (), data, lambda: data['close'].diff())
         gain = (delta.where(delta > 0, 0)).rolling(window=self.window).mean()
         loss = (-delta.where(delta < 0, 0)).rolling(window=self.window).mean()
         RS = gain / loss
-        data['RSI'] = 100 - (100 / (1 + RS))
-        data['Signal'] = 0
-        data['Signal'] = np.where(data['RSI'] > self.overbought, -1, np.where(data['RSI'] < self.oversold, 1, 0))
-        data['Position'] = data['Signal'].diff()
-        return data
+        return 100 - (100 / (1 + RS))
+
+    def create_state(self) -> RSIState:
+        return RSIState(self.window, self.overbought, self.oversold)
+
+    @property
+    def batch_lookback(self) -> int:
+        return self.window + 2
+
+    @property
+    def trend_window(self) -> int:
+        return self.window
+
+    def positions_history(self, closes: np.ndarray) -> np.ndarray:
+        delta = np.diff(closes, axis=1, prepend=np.nan)
+        # 与 delta.where(delta > 0, 0) / -delta.where(delta < 0, 0) 一致：首个差值（NaN）按 0 计，
+        # 第一根 bar 之前补齐的列保持 NaN，不计入滚动窗口
+        first_bar = self._first_bar_mask(closes)
+        before_first = first_bar & np.isnan(closes)
+        gain = np.where(before_first, np.nan, np.where(delta > 0, delta, 0.0))
+        loss = np.where(before_first, np.nan, -np.where(delta < 0, delta, 0.0))
+        gain = rolling_mean_batch(gain, self.window)
+        loss = rolling_mean_batch(loss, self.window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - (100 / (1 + gain / loss))
+        signal = np.where(rsi > self.overbought, -1, np.where(rsi < self.oversold, 1, 0))
+        positions = np.full(closes.shape, np.nan)
+        positions[:, 1:] = np.diff(signal, axis=1)
+        positions[first_bar] = np.nan
+        return positions
 
-    def decide_trade(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, OrderedDict]) -> Tuple[List[Dict], List[Dict]]:
+    def decide_trade(self, data: Dict[str, pd.DataFrame], portfolio, price_time_series: Dict[str, PriceRingBuffer]) -> Tuple[OrderBatch, OrderBatch]:
         """
         根据 RSI 策略决定买卖操作
         """
@@ -38,16 +76,16 @@ class RSIStrategy(BaseStrategy):
         trades_sell = []
 
         for symbol, df in data.items():
-            signals = self.generate_signals(df)
-            latest = signals.iloc[-1]
+            position = self.latest_position(symbol, df)
 
             if 'symbol' not in df.columns:
                 logging.warning(f"Symbol 信息缺失，跳过 RSI 交易决策。")
                 continue
 
             # 从 price_time_series 获取最新价格
-            if symbol in price_time_series and len(price_time_series[symbol]) > 0:
-                current_price = list(price_time_series[symbol].values())[-1]
+            symbol_price_time_series = price_time_series.get(symbol)
+            if symbol_price_time_series is not None and len(symbol_price_time_series) > 0:
+                current_price = symbol_price_time_series.last()
             else:
                 logging.warning(f"没有找到 {symbol} 的最新价格。")
                 continue
@@ -57,10 +95,8 @@ class RSIStrategy(BaseStrategy):
                 continue
 
             # 使用统一的 price_time_series 来分析趋势
-            symbol_price_time_series = price_time_series.get(symbol, OrderedDict())
             if len(symbol_price_time_series) >= self.window:
-                recent_prices = list(symbol_price_time_series.values())[-self.window:]
-                recent_trend = np.mean(np.diff(recent_prices))
+                recent_trend = self.recent_trend(symbol, symbol_price_time_series, self.window)
                 # 根据趋势调整买入或卖出比例
                 if recent_trend > 0:
                     adjusted_buy_pct = self.buy_pct * 1.1  # 略微增加买入比例
@@ -73,26 +109,18 @@ class RSIStrategy(BaseStrategy):
                 adjusted_sell_pct = self.sell_pct
 
             # 生成买入信号
-            if latest['Position'] == 1:
+            if position == 1:
                 budget = portfolio.cash * adjusted_buy_pct * self.weight
                 quantity = int(budget // current_price)
                 if quantity > 0:
-                    trades_buy.append({
-                        'symbol': symbol,
-                        'price': current_price,
-                        'quantity': quantity
-                    })
+                    trades_buy.append(Order(symbol, current_price, quantity))
                     logging.info(f"RSI 策略生成买入信号：{symbol}，价格：{current_price}，数量：{quantity}")
 
             # 生成卖出信号
-            elif latest['Position'] == -1 and symbol in portfolio.holdings:
+            elif position == -1 and symbol in portfolio.holdings:
                 quantity = int(portfolio.holdings[symbol] * adjusted_sell_pct * self.weight)
                 if quantity > 0:
-                    trades_sell.append({
-                        'symbol': symbol,
-                        'price': current_price,
-                        'quantity': quantity
-                    })
+                    trades_sell.append(Order(symbol, current_price, quantity))
                     logging.info(f"RSI 策略生成卖出信号：{symbol}，价格：{current_price}，数量：{quantity}")
 
-        return trades_buy, trades_sell
\ No newline at end of file
+        return OrderBatch.from_orders(trades_buy), OrderBatch.from_orders(trades_sell)
\ No newline at end of file
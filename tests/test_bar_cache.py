@@ -0,0 +1,49 @@
+# tests/test_bar_cache.py
+
+import pandas as pd
+from datetime import datetime
+from data.bar_cache import BarCache
+
+
+def test_weekend_top_up_is_not_a_failure(fetcher, fake_akshare):
+    # 先缓存到周五 2024-01-05
+    first = fetcher.fetch_all_data(start_date='20240101', end_date='20240105')
+    assert fetcher.failed_symbols == {}
+    assert len(first['000001']) == 5
+
+    # 结束日期为周日：补齐的区间 20240106-20240107 没有交易日
+    data = fetcher.fetch_all_data(start_date='20240101', end_date='20240107')
+    assert fetcher.failed_symbols == {}
+    assert fake_akshare.calls[-1] == ('20240106', '20240107')
+    assert data['000001']['date'].tolist() == list(pd.bdate_range('20240101', '20240105'))
+
+    # 已覆盖的结束日期推进到周日，再次请求不再下载
+    _, _, covered_end = fetcher.cache.load('000001', fetcher.adjust)
+    assert covered_end == '20240107'
+    calls = len(fake_akshare.calls)
+    fetcher.fetch_all_data(start_date='20240101', end_date='20240107')
+    assert len(fake_akshare.calls) == calls
+
+
+def test_empty_download_has_history_columns(fetcher):
+    df = fetcher.download_history('000001', '20240106', '20240107', 'hfq')
+    assert df.empty
+    assert {'date', 'open', 'close', 'high', 'low', 'volume', 'turnover', 'symbol'} <= set(df.columns)
+
+
+def test_today_is_not_covered(tmp_path):
+    calls = []
+
+    def provider(symbol, start_date, end_date, adjust):
+        calls.append((start_date, end_date))
+        return pd.DataFrame({'date': pd.to_datetime([start_date]), 'close': [10.5]})
+
+    cache = BarCache(provider=provider, cache_dir=str(tmp_path))
+    today = datetime.now().strftime("%Y%m%d")
+    cache.get('000001', today, today, 'hfq')
+    _, covered_start, covered_end = cache.load('000001', 'hfq')
+    assert covered_start == today and covered_end < today
+
+    # 今天的 bar 可能尚未收盘，下次请求重新下载
+    assert len(cache.get('000001', today, today, 'hfq')) == 1
+    assert calls == [(today, today), (today, today)]
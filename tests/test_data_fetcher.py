@@ -0,0 +1,32 @@
+# tests/test_data_fetcher.py
+
+import threading
+import time
+import pytest
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    # 释放仍卡在桩数据源中的下载线程
+    event.set()
+
+
+def test_hung_download_is_abandoned_at_deadline(fetcher, fake_akshare, release):
+    download = fake_akshare.stock_zh_a_hist
+
+    def stock_zh_a_hist(symbol, start_date, end_date, adjust):
+        if symbol == '000001':
+            release.wait()
+        return download(symbol, start_date, end_date, adjust)
+
+    fake_akshare.stock_zh_a_hist = stock_zh_a_hist
+    begin = time.monotonic()
+    # 只有一个并发槽位：卡住的股票超时后，排在后面的股票仍能下载
+    data = fetcher.fetch_all_data(start_date='20240101', end_date='20240105', max_workers=1, symbol_deadline=0.3,
+                                  symbols=['000001', '000002'])
+    assert time.monotonic() - begin < 2
+    assert list(data) == ['000002']
+    assert list(fetcher.failed_symbols) == ['000001']
+    assert '超过' in fetcher.failed_symbols['000001']
@@ -0,0 +1,94 @@
+# tests/test_event_backtester.py
+
+import numpy as np
+import pandas as pd
+import pytest
+import config.config as config
+from backtest.event_backtester import EventBacktester
+from combined_strategy.combined_strategy import CombinedStrategy
+from strategies.ma_crossover_strategy import MovingAverageCrossoverStrategy
+from strategies.rsi_strategy import RSIStrategy
+
+
+class ScriptedStrategy(RSIStrategy):
+    """按 (股票代码, 收盘价) 给出预先写好的 Position，用于检查事件的处理顺序和成交规则"""
+
+    def __init__(self, script, buy_pct: float, sell_pct: float = 0.5):
+        # 窗口长于测试中的 bar 数，下单数量不做趋势调整
+        super().__init__(window=30, buy_pct=buy_pct, sell_pct=sell_pct)
+        self.script = script
+
+    def update(self, symbol, bar):
+        return self.script.get((symbol, bar), 0.0)
+
+
+def bars(dates, closes):
+    closes = np.asarray(closes, dtype=np.float64)
+    return pd.DataFrame({'date': pd.to_datetime(dates), 'open': closes + 0.5, 'high': closes + 1, 'low': closes - 1,
+                         'close': closes, 'volume': 1000.0})
+
+
+def buy_cost(price, quantity):
+    cost = price * quantity
+    cost += cost * config.TRANSACTION_COST_RATE
+    cost += price * quantity * config.SLIPPAGE_RATE
+    return cost
+
+
+def fills(backtester):
+    frame = backtester.portfolio.fills.to_frame()
+    return [(row.type, row.symbol, row.price, row.time.strftime('%Y-%m-%d'), row.quantity) for row in frame.itertuples()]
+
+
+def test_orders_fill_at_next_bar_open_across_calendars():
+    data = {
+        # A 每个工作日都有 bar，B 隔日才有
+        'A': bars(['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05', '2024-01-08', '2024-01-09'],
+                  [10, 11, 12, 13, 14, 15, 16]),
+        'B': bars(['2024-01-02', '2024-01-04', '2024-01-08', '2024-01-10'], [20, 21, 22, 23]),
+    }
+    first = ScriptedStrategy({('A', 11.0): 1, ('A', 12.0): 1, ('B', 21.0): 1, ('A', 14.0): 1, ('A', 15.0): -1}, buy_pct=0.1)
+    second = ScriptedStrategy({('A', 14.0): 1}, buy_pct=0.05)
+    backtester = EventBacktester(CombinedStrategy([first, second]), data, save_results=False, start_time='2024-01-03')
+    backtester.run_backtest()
+
+    # 01-02 的信号在开始交易之前，只用于预热；01-03 的信号在 A 的下一根 bar（01-04）开盘成交
+    q1 = int(config.INITIAL_CASH * 0.1 // 12)
+    cash = config.INITIAL_CASH - buy_cost(13.5, q1)
+    # 同一时刻先成交再处理信号：B 在 01-04 的信号按 A 成交后的现金下单，在 B 的下一根 bar（01-08）成交
+    q_b = int(cash * 0.1 // 21)
+    # 两个子策略在 01-05 对 A 的同方向委托合并为一笔
+    q2 = int(cash * 0.1 // 14) + int(cash * 0.05 // 14)
+    # 01-08 的卖出信号在当根 bar 的买入成交之后处理，按成交后的持仓下单
+    q_sell = int((q1 + q2) * 0.5)
+    assert fills(backtester) == [
+        ('buy', 'A', 13.5, '2024-01-04', q1),
+        ('buy', 'A', 15.5, '2024-01-08', q2),
+        ('buy', 'B', 22.5, '2024-01-08', q_b),
+        ('sell', 'A', 16.5, '2024-01-09', q_sell),
+    ]
+    assert backtester.event_counts == {'bar': 11, 'fill': 4, 'signal': 5, 'order': 5}
+    # 净值从开始交易的时刻起逐时刻记录
+    assert backtester.equity.index[0] == pd.Timestamp('2024-01-03')
+
+
+@pytest.mark.parametrize('strategy', [MovingAverageCrossoverStrategy(short_window=3, long_window=7, weight=0.8),
+                                      RSIStrategy(window=5, buy_pct=0.2, sell_pct=0.4)], ids=lambda s: type(s).__name__)
+def test_order_quantity_matches_decide_trade_batch(strategy):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        position = rng.choice([1.0, -1.0])
+        price = rng.uniform(1, 50)
+        cash = rng.uniform(0, 200_000)
+        holding = int(rng.integers(0, 5000))
+        n_prices = int(rng.integers(0, strategy.trend_window + 3))
+        prices = rng.uniform(1, 50, n_prices)
+
+        recent = np.full(strategy.trend_window, np.nan)
+        tail = prices[-strategy.trend_window:] if n_prices else prices
+        recent[strategy.trend_window - len(tail):] = tail
+        buys, sells = strategy.decide_trade_batch(np.array(['A']), np.full((1, strategy.batch_lookback), price), np.array([price]),
+                                                  recent[None, :], cash, np.array([holding]), positions=np.array([position]))
+        orders = buys if position == 1 else sells
+        expected = int(orders.quantities[0]) if len(orders) else 0
+        assert strategy.order_quantity(position, price, prices, cash, holding) == expected
@@ -0,0 +1,138 @@
+# tests/test_indicators.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from types import SimpleNamespace
+from price_time_series_manager import PriceRingBuffer
+from strategies.base_strategy import stack_closes, stack_price_windows
+from strategies.ma_crossover_strategy import MovingAverageCrossoverStrategy
+from strategies.rsi_strategy import RSIStrategy
+
+
+def make_closes(seed: int = 0) -> pd.DataFrame:
+    """随机游走中夹杂横盘（价格不变）、单边上涨和单边下跌的收盘价序列"""
+    rng = np.random.default_rng(seed)
+    parts = [
+        10 + np.cumsum(rng.normal(0, 0.2, 60)),
+        np.full(30, 12.0),                      # 横盘：差值全为 0
+        12 + np.arange(1, 26) * 0.1,            # 单边上涨：没有下跌
+        np.full(5, 14.5),
+        14.5 - np.arange(1, 26) * 0.1,          # 单边下跌：没有上涨
+        12 + np.cumsum(rng.normal(0, 0.3, 80)),
+        np.round(12 + np.cumsum(rng.choice([-0.01, 0.0, 0.01], 80)), 2),  # 小幅波动，大量零变化
+    ]
+    closes = np.concatenate(parts)
+    return pd.DataFrame({'date': pd.date_range('2024-01-01', periods=len(closes)), 'close': closes})
+
+
+STRATEGIES = [
+    MovingAverageCrossoverStrategy(short_window=5, long_window=20),
+    MovingAverageCrossoverStrategy(short_window=3, long_window=7),
+    RSIStrategy(window=14),
+    RSIStrategy(window=5, overbought=60, oversold=40),
+]
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES, ids=lambda s: f"{type(s).__name__}-{s.__dict__.get('window', '')}")
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_incremental_update_matches_generate_signals(strategy, seed):
+    df = make_closes(seed)
+    expected = strategy.generate_signals(df)['Position'].to_numpy(dtype=np.float64)
+
+    strategy.reset_state()
+    positions = np.array([strategy.update('000001', {'close': close}) for close in df['close']], dtype=np.float64)
+
+    # 逐根比较，预热期的 NaN 也必须一致
+    np.testing.assert_array_equal(positions, expected)
+    assert np.isnan(positions[0])
+    assert strategy.latest_position('000001', df) == expected[-1] or np.isnan(expected[-1])
+
+
+def test_update_accepts_bare_close():
+    df = make_closes()
+    strategy = RSIStrategy(window=14)
+    from_dicts = [strategy.update('000001', {'close': close}) for close in df['close']]
+    strategy.reset_state()
+    from_floats = [strategy.update('000001', close) for close in df['close']]
+    np.testing.assert_array_equal(from_dicts, from_floats)
+
+
+def test_latest_position_checks_bar_time(monkeypatch):
+    df = make_closes()
+    strategy = RSIStrategy(window=14)
+    for row in df.itertuples():
+        strategy.update('000001', {'close': row.close, 'date': row.date})
+    expected = strategy.generate_signals(df)['Position'].iat[-1]
+
+    calls = []
+    original = strategy.generate_signals
+    monkeypatch.setattr(strategy, 'generate_signals', lambda data, symbol=None: calls.append(1) or original(data, symbol))
+    assert strategy.latest_position('000001', df) == expected
+    assert calls == []
+
+    # bar 数和最后收盘价相同、但不是同一段历史时重新计算
+    shifted = df.assign(date=df['date'] + pd.Timedelta(days=1))
+    strategy.latest_position('000001', shifted)
+    assert calls == [1]
+
+    # 未记录 bar 时间的增量状态无法确认，同样重新计算
+    strategy.reset_state()
+    for close in df['close']:
+        strategy.update('000001', close)
+    strategy.latest_position('000001', df)
+    assert calls == [1, 1]
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES, ids=lambda s: f"{type(s).__name__}-{s.__dict__.get('window', '')}")
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_positions_batch_matches_generate_signals(strategy, seed):
+    df = make_closes(seed)
+    expected = strategy.generate_signals(df)['Position'].to_numpy(dtype=np.float64)
+    closes = df['close'].to_numpy(dtype=np.float64)
+
+    # 多只股票一起计算，上市较晚的股票左侧补 NaN
+    stacked = np.full((3, len(closes) + 10), np.nan)
+    stacked[0, 10:] = closes
+    stacked[1, 10:] = closes
+    stacked[2, 10 + 50:] = closes[:-50]
+    history = strategy.positions_history(stacked)
+    np.testing.assert_array_equal(history[0, 10:], expected)
+    np.testing.assert_array_equal(history[1, 10:], expected)
+    np.testing.assert_array_equal(history[2, 60:], strategy.generate_signals(df.iloc[:-50])['Position'].to_numpy(dtype=np.float64))
+    assert np.isnan(history[:, :10]).all()
+
+    # 逐根 bar：第 i 行是截至第 i 根 bar 的完整历史（左侧补 NaN），其最新 Position 应等于 expected[i]
+    n = len(closes)
+    prefixes = np.full((n, max(strategy.batch_lookback, n)), np.nan)
+    for i in range(n):
+        prefixes[i, prefixes.shape[1] - i - 1:] = closes[:i + 1]
+    np.testing.assert_array_equal(strategy.positions_batch(prefixes), expected)
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES, ids=lambda s: f"{type(s).__name__}-{s.__dict__.get('window', '')}")
+def test_decide_trade_batch_matches_decide_trade(strategy):
+    frames = {}
+    for seed, symbol in enumerate(['000001', '000002', '600519']):
+        df = make_closes(seed).iloc[seed * 40:].reset_index(drop=True)
+        frames[symbol] = df.assign(symbol=symbol)
+    portfolio = SimpleNamespace(cash=1_000_000.0, holdings={'000001': 1000, '600519': 300})
+    symbols = list(frames)
+
+    for end in range(30, 200):
+        data = {symbol: df.iloc[:end] for symbol, df in frames.items()}
+        series = {}
+        for symbol, df in data.items():
+            series[symbol] = PriceRingBuffer(strategy.trend_window + 5)
+            for t, close in enumerate(df['close'].iloc[-(strategy.trend_window + 5):]):
+                series[symbol].append(t, close)
+        strategy.reset_state()
+        buys, sells = strategy.decide_trade(data, portfolio, series)
+
+        closes = stack_closes(data, symbols, max(len(df) for df in data.values()))
+        recent_prices, last_prices = stack_price_windows(series, symbols, strategy.trend_window)
+        holdings = np.array([portfolio.holdings.get(symbol, 0) for symbol in symbols], dtype=np.int64)
+        batch_buys, batch_sells = strategy.decide_trade_batch(np.array(symbols), closes, last_prices, recent_prices,
+                                                              portfolio.cash, holdings)
+        assert batch_buys.to_dicts() == buys.to_dicts(), end
+        assert batch_sells.to_dicts() == sells.to_dicts(), end
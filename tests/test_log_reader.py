@@ -0,0 +1,65 @@
+# tests/test_log_reader.py
+
+import numpy as np
+from utils.log_reader import LogIndex
+
+LINES = [
+    "2024-01-02 09:30:00,001 [INFO] 买入 600519 - 数量: 123456, 价格: 10.5, 成本: ￥123456.00\n",
+    "2024-01-02 09:30:01,002 [WARNING] 3 只股票的历史数据获取失败: 000001, 000002, 300750\n",
+    "2024-01-02 09:30:02,003 [INFO] RSI 策略生成买入信号：000002，价格：100000，数量：200000\n",
+    "2024-01-02 09:30:03,004 [WARNING] 持仓不足，无法卖出 000001 - 尝试卖出: 300000, 持有: 100000\n",
+]
+
+
+def write(path, lines, mode='a'):
+    with open(path, mode, encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def test_every_symbol_in_a_line_is_indexed(tmp_path):
+    log = tmp_path / 'app.log'
+    write(log, LINES, 'w')
+    index = LogIndex(str(log))
+    assert index.update() == len(LINES)
+
+    assert index.query(symbol='000001') == [LINES[1], LINES[3]]
+    assert index.query(symbol='000002') == [LINES[1], LINES[2]]
+    assert index.query(symbol='300750') == [LINES[1]]
+    assert index.query(symbol='600519') == [LINES[0]]
+    assert index.query(symbol='000001', levels=['WARNING'], limit=1) == [LINES[3]]
+
+
+def test_labelled_numbers_are_not_symbols(tmp_path):
+    log = tmp_path / 'app.log'
+    write(log, LINES, 'w')
+    index = LogIndex(str(log))
+    index.update()
+    for value in ('123456', '100000', '200000', '300000'):
+        assert index.query(symbol=value) == []
+
+
+def test_incremental_update_and_partial_symbol_records(tmp_path):
+    log = tmp_path / 'app.log'
+    write(log, LINES[:2], 'w')
+    index = LogIndex(str(log))
+    index.update()
+    # 模拟写代码索引后、写行索引前崩溃：多出一条指向不存在的行的记录和半条记录
+    with open(index.symbol_index_path, 'ab') as f:
+        f.write(np.array([(2, 1)], dtype=LogIndex.SYMBOL_DTYPE).tobytes() + b'\x00' * 5)
+    write(log, LINES[2:])
+    assert index.update() == 2
+    assert index.query(symbol='000001') == [LINES[1], LINES[3]]
+    assert index.query(limit=10) == LINES
+
+
+def test_rebuilds_index_without_symbol_file(tmp_path):
+    log = tmp_path / 'app.log'
+    write(log, LINES, 'w')
+    index = LogIndex(str(log))
+    index.update()
+    # 旧版索引没有代码索引文件
+    (tmp_path / 'app.log.idx.sym').unlink()
+    with open(index.index_path, 'wb') as f:
+        f.write(b'\x01' * 250)
+    assert index.update() == len(LINES)
+    assert index.query(symbol='300750') == [LINES[1]]
@@ -0,0 +1,47 @@
+# tests/test_minute_bars.py
+
+import pytest
+from datetime import datetime
+from data.minute_bars import MinuteBarStore
+
+
+@pytest.fixture
+def period():
+    return '1'
+
+
+def test_weekend_top_up_is_not_a_failure(fetcher, fake_akshare):
+    first = fetcher.fetch_all_data(start_date='20240101', end_date='20240105')
+    assert fetcher.failed_symbols == {}
+    assert len(first['000001']) == 15
+
+    data = fetcher.fetch_all_data(start_date='20240101', end_date='20240107')
+    assert fetcher.failed_symbols == {}
+    assert fake_akshare.calls[-1] == ('2024-01-06', '2024-01-07')
+    assert len(data['000001']) == 15
+
+    # 已覆盖的结束日期推进到周日，再次请求不再下载
+    _, covered_end = fetcher.minute_store.load('000001')
+    assert covered_end == '20240107'
+    calls = len(fake_akshare.calls)
+    fetcher.fetch_all_data(start_date='20240101', end_date='20240107')
+    assert len(fake_akshare.calls) == calls
+
+
+def test_first_download_without_bars(fetcher):
+    bars = fetcher.minute_store.minutes('000001', end_date='20240107', start_date='20240106')
+    assert bars.empty
+    assert list(MinuteBarStore.COLUMNS) == [column for column in bars.columns if column in MinuteBarStore.COLUMNS]
+    _, covered_end = fetcher.minute_store.load('000001')
+    assert covered_end == '20240107'
+
+
+def test_today_is_not_covered(fetcher, fake_akshare):
+    today = datetime.now().strftime("%Y%m%d")
+    fetcher.minute_store.minutes('000001', end_date=today, start_date=today)
+    _, covered_end = fetcher.minute_store.load('000001')
+    assert covered_end < today
+
+    # 今天的 bar 可能尚未收盘，下次请求重新下载
+    fetcher.minute_store.minutes('000001', end_date=today)
+    assert [start for start, _ in fake_akshare.calls] == [f'{today[:4]}-{today[4:6]}-{today[6:]}'] * 2
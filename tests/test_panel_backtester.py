@@ -0,0 +1,31 @@
+# tests/test_panel_backtester.py
+
+import pandas as pd
+import pytest
+from backtest.panel_backtester import PanelBacktester
+from benchmarks.synthetic import generate_universe
+from combined_strategy.combined_strategy import CombinedStrategy
+from strategies.ma_crossover_strategy import MovingAverageCrossoverStrategy
+from strategies.rsi_strategy import RSIStrategy
+
+
+def create_strategies():
+    return [MovingAverageCrossoverStrategy(short_window=5, long_window=20, weight=0.6),
+            RSIStrategy(window=14, buy_pct=0.1, sell_pct=0.5, weight=0.4)]
+
+
+@pytest.mark.parametrize('seed, start', [(0, 0), (1, 30), (2, 0)])
+def test_vectorized_matches_point_in_time(seed, start):
+    # 中途上市和停牌使各股票的交易日不一致
+    data = generate_universe(8, 150, seed=seed, listing_fraction=0.3, suspension_rate=0.05)
+    runs = []
+    for vectorized in (False, True):
+        backtester = PanelBacktester(CombinedStrategy(create_strategies()), data, save_results=False, start=start,
+                                     vectorized=vectorized)
+        runs.append((backtester.run_backtest(), backtester))
+
+    (results, panel), (batch_results, batch) = runs
+    assert len(panel.portfolio.fills) > 0
+    assert batch.portfolio.fills.to_dicts() == panel.portfolio.fills.to_dicts()
+    pd.testing.assert_frame_equal(batch.equity, panel.equity)
+    assert batch_results == results
@@ -0,0 +1,50 @@
+# tests/test_shared_price_store.py
+
+import numpy as np
+import pytest
+import shared_price_store
+from shared_price_store import SharedPriceStore
+
+
+@pytest.fixture
+def store():
+    writer = SharedPriceStore.create(None, max_symbols=4, capacity=5)
+    yield writer
+    writer.unlink()
+
+
+def read_only(store: SharedPriceStore) -> SharedPriceStore:
+    # 同一进程内 attach 会把写者登记的共享内存从资源跟踪器中注销，这里直接在同一块内存上构建只读视图
+    return SharedPriceStore(store.block, store.max_symbols, store.capacity, writable=False)
+
+
+def test_readers_get_consistent_copies(store):
+    reader = read_only(store)
+    for t in range(7):
+        store.add_prices(1_700_000_000 + t, {'600519': 10.0 + t, '000001': 20.0 + t})
+
+    series = reader.get_series('600519')
+    all_series = reader.get_all_series()
+    store.add_price('600519', 1_700_000_100, 99.0)
+
+    # 拷贝不随之后的写入变化
+    np.testing.assert_array_equal(series.window(), [12.0, 13.0, 14.0, 15.0, 16.0])
+    np.testing.assert_array_equal(all_series['000001'].window(3), [24.0, 25.0, 26.0])
+    assert series.last_timestamp() == 1_700_000_006
+    assert reader.get_series('600519').last() == 99.0
+    np.testing.assert_array_equal(reader.snapshot('600519', 2), [16.0, 99.0])
+    assert len(reader.get_series('300750')) == 0
+
+
+def test_reader_gives_up_on_unfinished_write(store, monkeypatch):
+    monkeypatch.setattr(shared_price_store, 'SHARED_PRICE_READ_RETRIES', 3)
+    store.add_price('600519', 1_700_000_000, 10.0)
+    reader = read_only(store)
+    # 写进程在写入中途退出，序号停留在奇数
+    store.seq[0] += 1
+    with pytest.raises(TimeoutError):
+        reader.get_series('600519')
+    with pytest.raises(TimeoutError):
+        reader.snapshot('600519')
+    store.seq[0] += 1
+    assert reader.get_series('600519').last() == 10.0
@@ -0,0 +1,154 @@
+# tests/test_storage.py
+
+import json
+import pytest
+from portfolio.portfolio import Portfolio
+from storage.storage import JournalStorage, SQLiteStorage
+
+
+def trade(portfolio, n):
+    for i in range(n):
+        time = f"2024-01-02 09:{30 + i // 60:02d}:{i % 60:02d}"
+        if i % 2 == 0:
+            portfolio.buy_stock('600519', 10.0 + i, 100, time)
+        else:
+            portfolio.sell_stock('600519', 10.0 + i, 100, time)
+
+
+def test_journal_snapshot_excludes_transactions(tmp_path):
+    path = str(tmp_path / 'portfolio.json')
+    portfolio = Portfolio(initial_cash=1_000_000, storage=JournalStorage(path, snapshot_interval=4))
+    trade(portfolio, 10)
+
+    with open(path) as f:
+        text = f.read()
+    snapshot = json.loads(text)
+    assert 'transactions' not in snapshot
+    assert '\n' not in text
+    assert snapshot['journal_seq'] == 8
+
+    reloaded = Portfolio(initial_cash=1_000_000, storage=JournalStorage(path, snapshot_interval=4))
+    assert reloaded.transactions.to_dicts() == portfolio.transactions.to_dicts()
+    assert reloaded.cash == portfolio.cash
+    assert reloaded.holdings == portfolio.holdings
+
+
+def test_journal_load_skips_transaction_segment(tmp_path, monkeypatch):
+    path = str(tmp_path / 'portfolio.json')
+    writer = Portfolio(initial_cash=1_000_000, storage=JournalStorage(path, snapshot_interval=4))
+    trade(writer, 10)
+
+    reads = []
+    original = JournalStorage._read_records
+    monkeypatch.setattr(JournalStorage, '_read_records', staticmethod(
+        lambda path, name, offset=0: reads.append((path, offset)) or original(path, name, offset)))
+    storage = JournalStorage(path, snapshot_interval=4)
+    segment = storage.transactions_path
+    # 加载持仓只读取交易记录段中快照之后追加的部分（此处为空）
+    assert 'transactions' not in storage.load()
+    assert all(offset > 0 for p, offset in reads if p == segment)
+
+    portfolio = Portfolio(initial_cash=1_000_000, storage=storage)
+    portfolio.load_portfolio()
+    assert portfolio.cash == writer.cash
+    assert all(offset > 0 for p, offset in reads if p == segment)
+    # 首次访问交易记录时才完整读取一次
+    assert portfolio.transactions.to_dicts() == writer.transactions.to_dicts()
+    portfolio.load_portfolio()
+    assert len(portfolio.transactions) == 10
+    assert [offset for p, offset in reads if p == segment].count(0) == 1
+
+
+@pytest.mark.parametrize('snapshot_interval', [4, 100])
+def test_journal_crash_before_snapshot_does_not_duplicate(tmp_path, snapshot_interval):
+    path = str(tmp_path / 'portfolio.json')
+    storage = JournalStorage(path, snapshot_interval=snapshot_interval)
+    portfolio = Portfolio(initial_cash=1_000_000, storage=storage)
+    trade(portfolio, 7)
+    # 交易记录已追加到交易记录段，但快照尚未写入、日志尚未清空
+    storage._flush_transactions()
+
+    reloaded = Portfolio(initial_cash=1_000_000, storage=JournalStorage(path, snapshot_interval=snapshot_interval))
+    assert reloaded.transactions.to_dicts() == portfolio.transactions.to_dicts()
+    assert reloaded.cash == portfolio.cash
+
+
+def test_journal_reset_rewrites_transactions(tmp_path):
+    path = str(tmp_path / 'portfolio.json')
+    portfolio = Portfolio(initial_cash=1_000_000, storage=JournalStorage(path, snapshot_interval=3))
+    trade(portfolio, 7)
+    portfolio.reset_portfolio()
+    reloaded = Portfolio(initial_cash=1_000_000, storage=JournalStorage(path, snapshot_interval=3))
+    assert len(reloaded.transactions) == 0
+    assert reloaded.holdings == {} and reloaded.cash == 1_000_000
+
+    trade(portfolio, 2)
+    reloaded = Portfolio(initial_cash=1_000_000, storage=JournalStorage(path, snapshot_interval=3))
+    assert len(reloaded.transactions) == 2
+    assert reloaded.transactions.to_dicts() == portfolio.transactions.to_dicts()
+
+
+def test_journal_migrates_legacy_snapshot(tmp_path):
+    path = str(tmp_path / 'portfolio.json')
+    legacy = {'type': 'buy', 'symbol': '600519', 'price': 10.0, 'quantity': 100, 'time': '2024-01-02 09:30:00', 'cost': 1000.0}
+    with open(path, 'w') as f:
+        json.dump({'cash': 9000.0, 'holdings': {'600519': 100}, 'transactions': [legacy],
+                   'buy_lots': {'600519': [{'price': 10.0, 'quantity': 100}]}, 'latest_prices': {}, 'journal_seq': 0}, f, indent=4)
+
+    portfolio = Portfolio(initial_cash=10_000, storage=JournalStorage(path, snapshot_interval=2))
+    trade(portfolio, 2)
+
+    reloaded = Portfolio(initial_cash=10_000, storage=JournalStorage(path, snapshot_interval=2))
+    assert len(reloaded.transactions) == 3
+    assert reloaded.transactions[0] == legacy
+
+
+def test_sqlite_loads_transactions_once(tmp_path, monkeypatch):
+    path = str(tmp_path / 'portfolio.db')
+    writer = Portfolio(initial_cash=1_000_000, storage=SQLiteStorage(path))
+    trade(writer, 6)
+
+    storage = SQLiteStorage(path)
+    loads = []
+    original = storage.load_transactions
+    monkeypatch.setattr(storage, 'load_transactions', lambda: loads.append(1) or original())
+    assert 'transactions' not in storage.load()
+
+    portfolio = Portfolio(initial_cash=1_000_000, storage=storage)
+    portfolio.load_portfolio()
+    assert portfolio.count_transactions() == 6
+    assert loads == []
+    # 未读取交易记录时保存不会改动表中的交易记录
+    portfolio.save_portfolio()
+    assert storage.count_transactions() == 6
+
+    assert portfolio.transactions.to_dicts() == writer.transactions.to_dicts()
+    trade(portfolio, 2)
+    portfolio.load_portfolio()
+    assert len(portfolio.transactions) == 8
+    assert loads == [1]
+
+    # 其他进程写入交易记录后重新读取
+    writer.load_portfolio()
+    trade(writer, 2)
+    portfolio.load_portfolio()
+    assert portfolio.transactions.to_dicts() == writer.transactions.to_dicts()
+    assert loads == [1, 1]
+
+
+def test_sqlite_save_keeps_other_processes_trades(tmp_path):
+    path = str(tmp_path / 'portfolio.db')
+    stale = Portfolio(initial_cash=1_000_000, storage=SQLiteStorage(path))
+    assert len(stale.transactions) == 0
+
+    writer = Portfolio(initial_cash=1_000_000, storage=SQLiteStorage(path))
+    trade(writer, 4)
+    # 内存中的交易记录较旧的进程保存持仓，不会删除其他进程写入的交易
+    stale.latest_prices = {'600519': 12.0}
+    stale.save_portfolio()
+    assert stale.storage.count_transactions() == 4
+    assert stale.storage.load()['latest_prices'] == {'600519': 12.0}
+
+    stale.reset_portfolio()
+    assert stale.storage.count_transactions() == 0
+    assert stale.storage.load()['holdings'] == {}
@@ -0,0 +1,253 @@
+# utils/log_reader.py
+
+import os
+import re
+import logging
+import threading
+import numpy as np
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+# 与 utils/logger.py 中的格式对应："%(asctime)s [%(levelname)s] %(message)s"
+LINE_PATTERN = re.compile(rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) \[([A-Z]+)\] ')
+# 六位股票代码；排除小数和金额（￥ 之后的数字）
+SYMBOL_PATTERN = re.compile(rb'(?<![\d.])(?<!\xef\xbf\xa5)(\d{6})(?![\d.])')
+# 日志中带标签的数值字段，如 "数量: 123456"、"持有: 200000"、"价格：12.5"，匹配股票代码前先去掉
+VALUE_PATTERN = re.compile('(?:数量|持有|尝试卖出|需要|可用|价格|成本|收益)\\s*(?::|：)\\s*(?:￥)?[-\\d.,]+'.encode())
+LEVELS = {name: getattr(logging, name) for name in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')}
+
+
+def tail_lines(path: str, n: int, block_size: int = 65536) -> List[str]:
+    """
+    从文件末尾向前按块读取，返回最后 n 行，耗时只与 n 有关，与文件大小无关。
+
+    :param path: 文件路径
+    :param n: 行数
+    :param block_size: 每次向前读取的字节数
+    :return: 最后 n 行（保留换行符）
+    """
+    if n <= 0:
+        return []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        # 需要 n + 1 个换行符才能确定第 n 行的开头
+        while position > 0 and data.count(b'\n') <= n:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.splitlines(keepends=True)[-n:]
+    return [line.decode('utf-8', errors='replace') for line in lines]
+
+
+class LogIndex:
+    """
+    日志文件的旁路偏移索引，保存在 <日志文件>.idx 中。
+
+    每行日志对应一条定长记录：行起始偏移、行长度、时间（毫秒）和级别。行中提到的每个股票代码
+    在 <索引文件>.sym 中各有一条 (行号, 代码) 记录，按行号递增，一行提到多只股票时按每只都能查到。
+    update 只解析上次索引之后新增的完整行；查询在索引上做向量化过滤，再按偏移只读取命中的行，
+    因此查询耗时与返回的行数相关，而不是与日志文件的大小相关。
+    没有时间戳的行（如异常堆栈）沿用上一行的时间和级别。
+    """
+
+    DTYPE = np.dtype([
+        ('offset', np.int64),
+        ('length', np.int32),
+        ('time', np.int64),  # Unix 毫秒
+        ('level', np.int8),
+    ])
+    SYMBOL_DTYPE = np.dtype([
+        ('row', np.int64),  # 行号，即在 DTYPE 索引中的下标
+        ('symbol', np.int32),  # 六位股票代码的数值
+    ])
+    CHUNK = 65536  # 倒序扫描索引时每批的记录数
+    READ_BLOCK = 16 * 1024 * 1024  # 建立索引时每次读取的日志字节数
+
+    def __init__(self, log_path: str, index_path: Optional[str] = None):
+        """
+        :param log_path: 日志文件路径
+        :param index_path: 索引文件路径，默认为 log_path + '.idx'
+        """
+        self.log_path = log_path
+        self.index_path = index_path or log_path + '.idx'
+        self.symbol_index_path = self.index_path + '.sym'
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_records(path: str, dtype: np.dtype) -> np.ndarray:
+        if not os.path.exists(path):
+            return np.zeros(0, dtype=dtype)
+        count = os.path.getsize(path) // dtype.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+    def _load(self) -> np.ndarray:
+        return self._load_records(self.index_path, self.DTYPE)
+
+    def _load_symbols(self) -> np.ndarray:
+        return self._load_records(self.symbol_index_path, self.SYMBOL_DTYPE)
+
+    def _reset(self):
+        for path in (self.index_path, self.symbol_index_path):
+            with open(path, 'wb'):
+                pass
+
+    @staticmethod
+    def _truncate(path: str, size: int):
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+    @staticmethod
+    def line_symbols(body: bytes) -> List[int]:
+        """
+        :param body: 一行日志去掉时间和级别之后的部分
+        :return: 行中提到的全部股票代码（数值），按首次出现的顺序去重
+        """
+        return list(dict.fromkeys(int(code) for code in SYMBOL_PATTERN.findall(VALUE_PATTERN.sub(b' ', body))))
+
+    def update(self) -> int:
+        """
+        索引日志文件新增的完整行。日志文件变小（被清空或轮转）时重建索引。
+
+        :return: 新索引的行数
+        """
+        with self._lock:
+            if not os.path.exists(self.log_path):
+                return 0
+            log_size = os.path.getsize(self.log_path)
+            if os.path.exists(self.index_path) and not os.path.exists(self.symbol_index_path):
+                # 旧版索引（每行只记一个股票代码）没有代码索引文件，重建
+                self._reset()
+            for path, dtype in ((self.index_path, self.DTYPE), (self.symbol_index_path, self.SYMBOL_DTYPE)):
+                # 截掉写了一半的记录
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if size % dtype.itemsize:
+                    self._truncate(path, size - size % dtype.itemsize)
+            index = self._load()
+            rows = len(index)
+            # 代码索引先于行索引写入，去掉行索引中还没有的行
+            mentions = self._load_symbols()
+            valid_mentions = int(np.searchsorted(mentions['row'], rows, side='left'))
+            stale = valid_mentions < len(mentions)
+            del mentions
+            if stale:
+                self._truncate(self.symbol_index_path, valid_mentions * self.SYMBOL_DTYPE.itemsize)
+            if len(index):
+                last = index[-1]
+                indexed_end = int(last['offset']) + int(last['length'])
+                last_time, last_level = int(last['time']), int(last['level'])
+            else:
+                indexed_end, last_time, last_level = 0, 0, LEVELS['INFO']
+            del index
+            if log_size < indexed_end:
+                logging.info("日志文件已被截断，重建日志索引。")
+                self._reset()
+                indexed_end, last_time, last_level = 0, 0, LEVELS['INFO']
+                rows = 0
+            if log_size == indexed_end:
+                return 0
+
+            indexed = 0
+            last_stamp, last_seconds = None, 0
+            with open(self.log_path, 'rb') as log_file, open(self.index_path, 'ab') as index_file, \
+                    open(self.symbol_index_path, 'ab') as symbol_file:
+                log_file.seek(indexed_end)
+                pending = b''
+                remaining = log_size - indexed_end
+                while remaining > 0:
+                    block = log_file.read(min(self.READ_BLOCK, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    data = pending + block
+                    # 只索引以换行结尾的完整行，写了一半的行留到下一块或下次
+                    complete = data.rfind(b'\n') + 1
+                    pending = data[complete:]
+                    lines = data[:complete].splitlines(keepends=True)
+                    records = np.zeros(len(lines), dtype=self.DTYPE)
+                    mention_rows, mention_symbols = [], []
+                    for i, line in enumerate(lines):
+                        match = LINE_PATTERN.match(line)
+                        if match:
+                            # 同一秒内的多行只解析一次时间
+                            if match.group(1) != last_stamp:
+                                last_stamp = match.group(1)
+                                last_seconds = int(datetime.strptime(last_stamp.decode(), "%Y-%m-%d %H:%M:%S").timestamp())
+                            last_time = last_seconds * 1000 + int(match.group(2))
+                            last_level = LEVELS.get(match.group(3).decode(), last_level)
+                        for code in self.line_symbols(line[match.end():] if match else line):
+                            mention_rows.append(rows + indexed + i)
+                            mention_symbols.append(code)
+                        records[i] = (indexed_end, len(line), last_time, last_level)
+                        indexed_end += len(line)
+                    mentions = np.zeros(len(mention_rows), dtype=self.SYMBOL_DTYPE)
+                    mentions['row'] = mention_rows
+                    mentions['symbol'] = mention_symbols
+                    symbol_file.write(mentions.tobytes())
+                    # 写完代码索引再写行索引，中途崩溃时多出的代码记录在下次 update 时截掉
+                    symbol_file.flush()
+                    index_file.write(records.tobytes())
+                    indexed += len(records)
+            return indexed
+
+    def query(self, levels: Optional[Iterable[str]] = None, symbol: Optional[str] = None,
+              start_time: Optional[datetime] = None, end_time: Optional[datetime] = None, limit: int = 100) -> List[str]:
+        """
+        查询满足条件的最近 limit 行日志，按时间先后返回。
+
+        :param levels: 级别名称集合，如 ['WARNING', 'ERROR']，None 表示不限
+        :param symbol: 六位股票代码
+        :param start_time: 开始时间（含）
+        :param end_time: 结束时间（含）
+        :param limit: 最多返回的行数
+        :return: 日志行列表
+        """
+        index = self._load()
+        if len(index) == 0 or limit <= 0:
+            return []
+        # 时间基本单调递增，用二分查找确定区间，再从区间末尾倒序分批过滤
+        lo, hi = 0, len(index)
+        times = index['time']
+        if start_time is not None:
+            lo = int(np.searchsorted(times, int(start_time.timestamp() * 1000), side='left'))
+        if end_time is not None:
+            hi = int(np.searchsorted(times, int(end_time.timestamp() * 1000), side='right'))
+        level_codes = [LEVELS[level] for level in levels] if levels else None
+        symbol_code = int(symbol) if symbol else None
+        if symbol_code is not None:
+            # 按股票查询时倒序扫描代码索引中落在 [lo, hi) 内的记录
+            mentions = self._load_symbols()
+            mentions = mentions[:int(np.searchsorted(mentions['row'], len(index), side='left'))]
+            first = int(np.searchsorted(mentions['row'], lo, side='left'))
+            stop = int(np.searchsorted(mentions['row'], hi, side='left'))
+        else:
+            first, stop = lo, hi
+
+        selected: List[np.ndarray] = []
+        found = 0
+        while stop > first and found < limit:
+            begin = max(first, stop - self.CHUNK)
+            if symbol_code is not None:
+                chunk = mentions[begin:stop]
+                hits = chunk['row'][chunk['symbol'] == symbol_code]
+            else:
+                hits = np.arange(begin, stop)
+            if level_codes is not None:
+                hits = hits[np.isin(index['level'][hits], level_codes)]
+            selected.insert(0, hits)
+            found += len(hits)
+            stop = begin
+        if not selected:
+            return []
+        rows = np.concatenate(selected)[-limit:]
+
+        lines = []
+        with open(self.log_path, 'rb') as f:
+            for offset, length in zip(index['offset'][rows].tolist(), index['length'][rows].tolist()):
+                f.seek(offset)
+                lines.append(f.read(length).decode('utf-8', errors='replace'))
+        return lines
@@ -0,0 +1,230 @@
+# utils/metrics.py
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+from config.config import METRICS_ENABLED
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _NullSpan:
+    """关闭统计时使用的空计时器，进入和退出都不做任何事"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('registry', 'key', 'start')
+
+    def __init__(self, registry: 'Metrics', key: Tuple[str, LabelKey]):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class Stages:
+    """
+    顺序执行的多个阶段的计时器，start 下一个阶段时自动结束上一个，适合按步骤编排的流程，
+    无需把每一步都包进 with 块。
+    """
+
+    def __init__(self, registry: 'Metrics', name: str):
+        self.registry = registry
+        self.name = name
+        self.current: Optional[_Span] = None
+
+    def start(self, stage: str):
+        self.finish()
+        if self.registry.enabled:
+            self.current = self.registry.span(self.name, stage=stage)
+            self.current.__enter__()
+
+    def finish(self):
+        if self.current is not None:
+            self.current.__exit__(None, None, None)
+            self.current = None
+
+
+class Metrics:
+    """
+    轻量级的耗时与计数统计。
+
+    span 记录一段代码的调用次数、总耗时和最长耗时，inc 累加计数器，二者都可以带标签
+    （如策略名、阶段名）。关闭时 span 返回共享的空计时器、inc 直接返回，开销只有一次属性判断。
+    统计结果可以导出为 Prometheus 文本格式或 JSONL。
+    """
+
+    def __init__(self, enabled: bool = True, prefix: str = 'quant'):
+        """
+        :param enabled: 是否启用统计
+        :param prefix: 导出时的指标名前缀
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # (名称, 标签) -> [次数, 总耗时, 最长耗时]
+        self._timings: Dict[Tuple[str, LabelKey], List[float]] = {}
+        # (名称, 标签) -> 计数
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, object]) -> Tuple[str, LabelKey]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def span(self, name: str, **labels):
+        """
+        计时上下文管理器：with metrics.span('backtest.decide', strategy='RSI'): ...
+
+        :param name: 计时项名称
+        :param labels: 标签
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, self._key(name, labels))
+
+    def stages(self, name: str) -> Stages:
+        """
+        :param name: 计时项名称，各阶段以 stage 标签区分
+        """
+        return Stages(self, name)
+
+    def timed(self, name: Optional[str] = None, **labels) -> Callable:
+        """
+        函数装饰器，每次调用记录一次耗时，默认以函数的限定名为名称。
+        """
+        def decorator(func):
+            key = self._key(name or func.__qualname__, labels)
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, key):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _observe(self, key: Tuple[str, LabelKey], seconds: float):
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                self._timings[key] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                if seconds > timing[2]:
+                    timing[2] = seconds
+
+    def observe(self, name: str, seconds: float, **labels):
+        """直接记录一次耗时（秒），用于无法用 with 包裹的场景"""
+        if self.enabled:
+            self._observe(self._key(name, labels), seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        累加计数器。
+
+        :param name: 计数器名称
+        :param value: 增量
+        :param labels: 标签
+        """
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> List[Dict]:
+        """
+        :return: 每个计时项和计数器一条记录，计时项包含 count、total、mean、max（秒），计数器包含 value
+        """
+        with self._lock:
+            timings = {key: list(value) for key, value in self._timings.items()}
+            counters = dict(self._counters)
+        records = []
+        for (name, labels), (count, total, longest) in timings.items():
+            records.append({'type': 'span', 'name': name, 'labels': dict(labels), 'count': int(count),
+                            'total': total, 'mean': total / count, 'max': longest})
+        for (name, labels), value in counters.items():
+            records.append({'type': 'counter', 'name': name, 'labels': dict(labels), 'value': value})
+        return records
+
+    @staticmethod
+    def _format_labels(labels: Dict[str, str]) -> str:
+        escaped = (
+            f'{key}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for key, value in labels.items()
+        )
+        return '{' + ','.join(escaped) + '}'
+
+    def to_prometheus(self) -> str:
+        """
+        转换为 Prometheus 文本格式：计时项为 <prefix>_span_seconds 的 summary（_count、_sum）
+        以及 <prefix>_span_seconds_max，计数器为 <prefix>_events_total，名称放在 name 标签中。
+        """
+        span_metric = f'{self.prefix}_span_seconds'
+        counter_metric = f'{self.prefix}_events_total'
+        records = self.snapshot()
+        lines = [f'# HELP {span_metric} 代码段耗时（秒）', f'# TYPE {span_metric} summary']
+        spans = [r for r in records if r['type'] == 'span']
+        for r in spans:
+            labels = self._format_labels({'name': r['name'], **r['labels']})
+            lines.append(f'{span_metric}_count{labels} {r["count"]}')
+            lines.append(f'{span_metric}_sum{labels} {r["total"]:.9f}')
+        lines += [f'# HELP {span_metric}_max 代码段单次最长耗时（秒）', f'# TYPE {span_metric}_max gauge']
+        for r in spans:
+            lines.append(f'{span_metric}_max{self._format_labels({"name": r["name"], **r["labels"]})} {r["max"]:.9f}')
+        lines += [f'# HELP {counter_metric} 事件计数', f'# TYPE {counter_metric} counter']
+        for r in records:
+            if r['type'] == 'counter':
+                lines.append(f'{counter_metric}{self._format_labels({"name": r["name"], **r["labels"]})} {r["value"]}')
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path: str):
+        """
+        写入 Prometheus 文本文件（可供 node_exporter 的 textfile collector 读取），先写临时文件再替换。
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def export_jsonl(self, path: str, **context):
+        """
+        向 JSONL 文件追加一行当前的统计快照。
+
+        :param path: 文件路径
+        :param context: 附加到该行的上下文字段，如 run='live'
+        """
+        line = {'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **context, 'metrics': self.snapshot()}
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+
+# 进程内共享的统计实例
+metrics = Metrics(enabled=METRICS_ENABLED)
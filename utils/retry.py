@@ -0,0 +1,67 @@
+# utils/retry.py
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Callable, Optional, TypeVar
+from config.config import FETCH_MAX_ATTEMPTS, FETCH_BACKOFF_BASE, FETCH_BACKOFF_MAX
+from utils.metrics import metrics
+
+T = TypeVar('T')
+
+def retry_call(func: Callable[..., T], *args, max_attempts: int = FETCH_MAX_ATTEMPTS, base_delay: float = FETCH_BACKOFF_BASE,
+               max_delay: float = FETCH_BACKOFF_MAX, deadline: Optional[float] = None, description: str = '', **kwargs) -> T:
+    """
+    调用 func，失败时按带随机抖动的指数退避重试。
+
+    第 n 次失败后等待 [0, min(max_delay, base_delay * 2^n)] 之间的随机时间，
+    尝试次数用尽或超过 deadline 后抛出最后一次的异常。
+    指定 deadline 时每次尝试在单独的线程中执行，最多等待剩余的时间，
+    卡住的调用（如网络请求无响应）超时后抛出 TimeoutError，不再等待该线程结束。
+
+    :param func: 要调用的函数
+    :param max_attempts: 最大尝试次数
+    :param base_delay: 初始退避时间（秒）
+    :param max_delay: 单次退避的最长时间（秒）
+    :param deadline: 从首次调用开始计算的总时限（秒），None 表示不限
+    :param description: 日志中使用的描述
+    :return: func 的返回值
+    """
+    start = time.monotonic()
+    for attempt in range(max_attempts):
+        try:
+            if deadline is None:
+                return func(*args, **kwargs)
+            future = _call_in_thread(func, args, kwargs)
+            if wait([future], timeout=max(deadline - (time.monotonic() - start), 0.0)).done:
+                return future.result()
+        except Exception as e:
+            metrics.inc('retry.failed_attempts', func=getattr(func, '__name__', 'call'))
+            elapsed = time.monotonic() - start
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            if attempt == max_attempts - 1 or (deadline is not None and elapsed + delay >= deadline):
+                logging.warning(f"{description or func.__name__} 第 {attempt + 1} 次尝试失败，放弃重试: {e}")
+                raise
+            logging.debug(f"{description or func.__name__} 第 {attempt + 1} 次尝试失败，{delay:.2f} 秒后重试: {e}")
+            time.sleep(delay)
+            continue
+        # 调用在剩余时限内没有返回
+        metrics.inc('retry.timeouts', func=getattr(func, '__name__', 'call'))
+        logging.warning(f"{description or func.__name__} 超过 {deadline} 秒仍未完成，放弃重试")
+        raise TimeoutError(f"{description or func.__name__} 超过 {deadline} 秒仍未完成")
+
+
+def _call_in_thread(func: Callable[..., T], args: tuple, kwargs: dict) -> 'Future[T]':
+    """在新的守护线程中调用 func，超时放弃后线程不会阻止进程退出"""
+    future: Future = Future()
+
+    def run():
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"retry-{getattr(func, '__name__', 'call')}", daemon=True).start()
+    return future